@@ -0,0 +1,16 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import pyglet
+
+"""
+    Configuration of the tests (run with : python -m pytest), loaded before gym_round_bot imports pyglet.gl
+"""
+
+# render offscreen without display, must be set before pyglet.gl is imported
+pyglet.options['headless'] = True
@@ -6,3 +6,9 @@ register(
 	max_episode_steps=100,
 	reward_threshold=25.0,
 )
+
+register(
+	id='MultiRoundBot-v0',
+	entry_point='gym_round_bot.envs:MultiRoundBotEnv',
+	max_episode_steps=100,
+)
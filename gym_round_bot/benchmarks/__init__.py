@@ -0,0 +1,14 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+"""
+    This package defines benchmarks of the round bot environments, run from the command line :
+        python -m gym_round_bot.benchmarks --help (steps.py : env throughput over a matrix of configurations)
+        python -m gym_round_bot.benchmarks.micro --help (micro.py : primitives of the model and the window in isolation)
+        python -m gym_round_bot.benchmarks.memory --help (memory.py : resident memory growth per env)
+"""
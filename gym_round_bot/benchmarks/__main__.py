@@ -0,0 +1,13 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import sys
+
+from gym_round_bot.benchmarks import steps
+
+sys.exit(steps.main())
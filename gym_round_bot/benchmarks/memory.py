@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import sys
+import argparse
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+
+from gym_round_bot.benchmarks import steps
+from gym_round_bot.benchmarks import results as benchmark_results
+
+"""
+    This file measures the growth of the resident memory of a process for each additional env of a configuration
+    (see steps.BASE_CONFIG and steps.MATRIX), to size the number of envs per node, along with the memory report of
+    the last env (see RoundBotEnv.memory_report) :
+
+        python -m gym_round_bot.benchmarks.memory --envs 8 --vary obssize distractors
+"""
+
+# metrics compared to baselines (see results.compare), lower is better
+COMPARED_METRICS = OrderedDict([('rss_per_env_mb', -1), ('first_env_mb', -1)])
+
+
+def rss_mb():
+    """
+    Returns the current resident memory of the process in MB, or its peak resident memory where the current one
+    cannot be read (other systems than linux)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages*resource.getpagesize()/1024.0**2
+    except (IOError, OSError, ImportError):
+        return steps.peak_rss_mb()
+
+
+def run_memory_benchmark(config, n_envs=8, n_steps=10, seed=0):
+    """
+    Builds n_envs envs of a configuration one after the other in the current process, and measures the resident memory
+    after each one is built, reset and stepped (so that its lazy buffers are allocated)
+
+    Returns
+    -------
+    - (OrderedDict) the configuration and its name, with the resident memory before any env 'base_rss_mb', the growth for
+        the first env 'first_env_mb' (which includes one-time costs such as the OpenGL context), the mean growth for each
+        additional env 'rss_per_env_mb' (slope of a linear fit), the list of resident memories 'rss_mb' and the memory
+        report of the last env in MB by category ('report_*_mb')
+    """
+    envs = []
+    rss = [rss_mb()]
+    for i in range(n_envs):
+        env = steps.make_env(config)
+        env.seed(seed + i)
+        env.reset()
+        for action in steps.random_actions(env.controller, n_steps, seed + i):
+            env.step(action)
+        envs.append(env)
+        rss.append(rss_mb())
+    result = OrderedDict([('name', steps.config_name(config))])
+    result.update(config)
+    result['envs'] = n_envs
+    result['base_rss_mb'] = rss[0]
+    result['first_env_mb'] = rss[1] - rss[0]
+    result['rss_per_env_mb'] = float(np.polyfit(np.arange(1, n_envs+1), rss[1:], 1)[0]) if n_envs > 1 else None
+    result['rss_mb'] = rss
+    report = envs[-1].memory_report()
+    for category, value in report.items():
+        if category != 'details':
+            result['report_' + category + '_mb'] = value/1024.0**2
+    return result
+
+
+def _run_memory_benchmark(args):
+    return run_memory_benchmark(*args)
+
+
+def main(argv=None):
+    """
+    Command line entry point, returns 1 if regressions are found against the baseline, else 0
+    """
+    parser = argparse.ArgumentParser(prog='python -m gym_round_bot.benchmarks.memory',
+                                     description='Measures the resident memory growth per additional env over a matrix of configurations')
+    parser.add_argument('--envs', type=int, default=8, help='number of envs built per configuration')
+    parser.add_argument('--steps', type=int, default=10, help='number of steps performed by each env')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random starts and actions')
+    parser.add_argument('--vary', nargs='+', default=[], choices=list(steps.MATRIX.keys()), help='varied parameters (none by default)')
+    parser.add_argument('--full', action='store_true', help='benchmark the product of values of varied parameters')
+    parser.add_argument('--json', default=None, help='path of a JSON file where results are saved')
+    parser.add_argument('--csv', default=None, help='path of a CSV file where results are saved')
+    parser.add_argument('--baseline', default=None, help='path of a JSON file of baseline results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change of a metric flagged as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for config in steps.configurations(full=args.full, vary=args.vary):
+        # each configuration is measured in a new process, whose memory only holds its envs
+        try:
+            pool = multiprocessing.Pool(processes=1)
+            try:
+                result = pool.apply(_run_memory_benchmark, ((config, args.envs, args.steps, args.seed),))
+            finally:
+                pool.terminate()
+        except Exception as e:
+            # other configurations are still measured
+            result = steps.skipped_result(config, e)
+            results.append(result)
+            print(steps.format_result(result))
+            continue
+        results.append(result)
+        print(result['name'].ljust(40) + ' first env %7.1f MB  per env %7.2f MB  (report %7.2f MB)' %
+              (result['first_env_mb'], result['rss_per_env_mb'] or 0.0, result['report_total_mb']))
+    if args.json:
+        benchmark_results.save_json(results, args.json)
+    if args.csv:
+        benchmark_results.save_csv(results, args.csv)
+    if args.baseline:
+        regressions = benchmark_results.compare(results, benchmark_results.load_json(args.baseline),
+                                                metrics=COMPARED_METRICS, tolerance=args.tolerance)
+        benchmark_results.print_regressions(regressions, args.baseline)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
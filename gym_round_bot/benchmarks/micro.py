@@ -0,0 +1,306 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import sys
+import random
+import argparse
+import itertools
+import numpy as np
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError: # python 2
+    tracemalloc = None
+
+from gym_round_bot.envs import round_bot_model
+from gym_round_bot.envs.round_bot_perf import clock
+from gym_round_bot.benchmarks import results as benchmark_results
+
+"""
+    This file benchmarks in isolation the primitives which dominate the cost of steps : collisions (Model.collide)
+    over block counts and speeds, block transforms (rotation_matrices, Block.translate_and_rotate_to),
+    distractors motion (DistractorBlock._move), vertices upload (RoundBotWindow.update_shown_blocks),
+    readback (RoundBotWindow.get_image) over resolutions and multiview rendering over view counts.
+
+    Each benchmark is set up with a fixed seed and reports its time per operation in nanoseconds, and the memory
+    allocated (peak) and kept (retained) by one operation, traced with tracemalloc :
+
+        python -m gym_round_bot.benchmarks.micro --filter collide --json micro.json
+"""
+
+# metrics compared to baselines (see results.compare), lower is better
+COMPARED_METRICS = OrderedDict([('ns_per_op', -1), ('peak_bytes', -1)])
+
+# number of precomputed inputs which operations cycle through
+N_INPUTS = 256
+
+
+def _model(distractors=False, extra_blocks=0):
+    """
+    Returns a square world model without random start, with extra_blocks bricks added out of reach of the robot
+    (above the walls) so that they are tested but never collided
+    """
+    model = round_bot_model.Model(world={'name' : 'square', 'size' : [20,20]}, texture='minecraft',
+                                  random_start_pos=False, random_start_rot=False, distractors=distractors)
+    brick = round_bot_model.Block.tex_coords((0, 0), (0, 0), (0, 0))
+    for x, z in np.random.uniform(-9, 9, (extra_blocks, 2)):
+        model.add_block((x, 20.0, z, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0), texture=brick, block_type='brick')
+    return model
+
+
+def _window(model, size):
+    """
+    Returns a hidden window of size [width, height] rendering the subjective view of the model's robot
+    """
+    from gym_round_bot.envs import round_bot_window # imported here since it needs a display
+    return round_bot_window.MainWindow(model, global_pov=None, perspective=True, interactive=False, focal=65.0,
+                                       width=size[0], height=size[1], caption='micro benchmark', resizable=False, visible=False)
+
+
+def _collide(extra_blocks, speed):
+    """
+    Model.collide of motions of length speed in random directions, from the start position
+    """
+    def setup():
+        model = _model(extra_blocks=extra_blocks)
+        start = np.copy(model.robot_position)
+        angles = np.random.uniform(0, 2*np.pi, N_INPUTS)
+        motions = itertools.cycle(speed*np.stack([np.cos(angles), np.zeros(N_INPUTS), np.sin(angles)], axis=1))
+        def op():
+            model.robot_position[:] = start
+            model.collide(next(motions))
+        return op, {'blocks' : len(model.collision_blocks), 'speed' : speed}
+    return setup
+
+
+def _rotation_matrices():
+    def setup():
+        angles = itertools.cycle(np.random.uniform(-180, 180, (N_INPUTS, 3)))
+        def op():
+            round_bot_model.rotation_matrices(*next(angles))
+        return op, {}
+    return setup
+
+
+def _translate_and_rotate_to():
+    def setup():
+        block = _model().robot_block
+        poses = itertools.cycle(zip(np.random.uniform(-9, 9, (N_INPUTS, 3)), np.random.uniform(-180, 180, (N_INPUTS, 3))))
+        def op():
+            block.translate_and_rotate_to(*next(poses))
+        return op, {}
+    return setup
+
+
+def _distractor_move():
+    """
+    DistractorBlock._move of one distractor, cycling through the distractors of the world
+    """
+    def setup():
+        model = _model(distractors=True)
+        distractors = itertools.cycle(sorted(model.distractors, key=lambda b: tuple(b.position)))
+        def op():
+            next(distractors)._move(1.0)
+        return op, {'distractors' : len(model.distractors)}
+    return setup
+
+
+def _update_shown_blocks(distractors):
+    """
+    RoundBotWindow.update_shown_blocks, which uploads the vertices of all movable blocks
+    """
+    def setup():
+        model = _model(distractors=distractors)
+        window = _window(model, [64,64])
+        return window.update_shown_blocks, {'movable_blocks' : len(model.movable_blocks)}
+    return setup
+
+
+def _get_image(size):
+    def setup():
+        window = _window(_model(), [size,size])
+        window.on_draw()
+        return window.get_image, {'size' : size}
+    return setup
+
+
+def _multiview_render(views):
+    def setup():
+        window = _window(_model(), [64,64])
+        angles = [360.0*k/views for k in range(views)]
+        def op():
+            window.multiview_render(angles)
+        return op, {'views' : views}
+    return setup
+
+
+def benchmarks():
+    """
+    Returns the list of micro benchmarks as (name, setup) tuples, where setup() returns the benchmarked operation
+    (a function without arguments) and a dictionnary of parameters of the benchmark.
+    Benchmarks of window methods need a display
+    """
+    cases = []
+    for extra_blocks in [0, 100, 400]:
+        for speed in [0.5, 2.0, 8.0]:
+            cases.append(('collide extra_blocks=' + str(extra_blocks) + ' speed=' + str(speed), _collide(extra_blocks, speed)))
+    cases.append(('rotation_matrices', _rotation_matrices()))
+    cases.append(('translate_and_rotate_to', _translate_and_rotate_to()))
+    cases.append(('distractor_move', _distractor_move()))
+    for distractors in [False, True]:
+        cases.append(('window update_shown_blocks distractors=' + str(distractors), _update_shown_blocks(distractors)))
+    for size in [16, 64, 256]:
+        cases.append(('window get_image size=' + str(size), _get_image(size)))
+    for views in [1, 2, 4]:
+        cases.append(('window multiview_render views=' + str(views), _multiview_render(views)))
+    return cases
+
+
+def time_op(op, min_time=0.2, repeat=5):
+    """
+    Times an operation
+
+    Parameters
+    ----------
+    - op : (function) operation without arguments
+    - min_time : (float) minimum total duration in seconds of all repetitions, which sets the number of operations per repetition
+    - repeat : (int) number of timed repetitions
+
+    Returns
+    -------
+    - (float) best time per operation in nanoseconds over repetitions
+    - (float) median time per operation in nanoseconds over repetitions
+    - (int) number of operations per repetition
+    """
+    # find the number of operations lasting at least min_time/repeat, like timeit.Timer.autorange
+    number = 1
+    while True:
+        start = clock()
+        for i in range(number):
+            op()
+        duration = clock() - start
+        if duration >= min_time/repeat:
+            break
+        number *= 10 if duration < min_time/repeat/10 else 2
+    durations = []
+    for r in range(repeat):
+        start = clock()
+        for i in range(number):
+            op()
+        durations.append((clock() - start)/number*1e9)
+    return min(durations), float(np.median(durations)), number
+
+
+def trace_op(op, number=20):
+    """
+    Traces memory allocations of an operation with tracemalloc
+
+    Returns
+    -------
+    - (float) mean peak of memory allocated during one operation, in bytes
+    - (float) mean memory kept allocated after one operation, in bytes
+    Both are None if tracemalloc is not available
+    """
+    if tracemalloc is None:
+        return None, None
+    peaks, retained = [], []
+    for i in range(number):
+        # a new trace for each operation only counts its own allocations
+        tracemalloc.start()
+        op()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        retained.append(current)
+    return float(np.mean(peaks)), float(np.mean(retained))
+
+
+def run_benchmarks(cases, min_time=0.2, repeat=5, seed=0, allocations=True, verbose=True):
+    """
+    Runs micro benchmarks
+
+    Parameters
+    ----------
+    - cases : (list(tuple)) benchmarks as returned by benchmarks()
+    - min_time, repeat : see time_op
+    - seed : (int) seed of random and np.random, set before each benchmark setup
+    - allocations : (Bool) whether to trace allocations (see trace_op)
+    - verbose : (Bool) whether to print results as they are measured
+
+    Returns
+    -------
+    - (list(OrderedDict)) results with the 'name' and parameters of benchmarks, 'ns_per_op', 'ns_per_op_median',
+        'number' of operations per repetition, 'peak_bytes' and 'retained_bytes' (see trace_op).
+        Benchmarks which fail (e.g. window benchmarks without display) have a 'skipped' reason instead, so that
+        other benchmarks are still run
+    """
+    results = []
+    for name, setup in cases:
+        random.seed(seed)
+        np.random.seed(seed)
+        result = OrderedDict([('name', name)])
+        try:
+            op, parameters = setup()
+            result.update(parameters)
+            op() # warm up caches and lazy allocations
+            ns_per_op, ns_per_op_median, number = time_op(op, min_time=min_time, repeat=repeat)
+            peak, retained = trace_op(op) if allocations else (None, None)
+        except Exception as e:
+            if tracemalloc is not None and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            result['skipped'] = type(e).__name__ + ' : ' + str(e)
+            results.append(result)
+            if verbose:
+                print(name.ljust(48) + ' skipped : ' + result['skipped'])
+            continue
+        result.update([('ns_per_op', ns_per_op), ('ns_per_op_median', ns_per_op_median), ('number', number),
+                       ('peak_bytes', peak), ('retained_bytes', retained)])
+        results.append(result)
+        if verbose:
+            print(name.ljust(48) + ' %12.0f ns/op' % ns_per_op
+                  + ('  peak %9.0f B  retained %8.0f B' % (peak, retained) if peak is not None else ''))
+    return results
+
+
+def main(argv=None):
+    """
+    Command line entry point, returns 1 if regressions are found against the baseline, else 0
+    """
+    parser = argparse.ArgumentParser(prog='python -m gym_round_bot.benchmarks.micro',
+                                     description='Benchmarks collision, transform, vertices upload and readback primitives')
+    parser.add_argument('--filter', nargs='+', default=None, help='only run benchmarks whose name contains one of these strings')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum timed duration of each benchmark in seconds')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions')
+    parser.add_argument('--seed', type=int, default=0, help='seed set before each benchmark')
+    parser.add_argument('--no-allocations', action='store_true', help='do not trace allocations')
+    parser.add_argument('--json', default=None, help='path of a JSON file where results are saved')
+    parser.add_argument('--csv', default=None, help='path of a CSV file where results are saved')
+    parser.add_argument('--baseline', default=None, help='path of a JSON file of baseline results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change of a metric flagged as a regression')
+    args = parser.parse_args(argv)
+
+    cases = benchmarks()
+    if args.filter:
+        cases = [(name, setup) for name, setup in cases if any(f in name for f in args.filter)]
+    results = run_benchmarks(cases, min_time=args.min_time, repeat=args.repeat, seed=args.seed,
+                             allocations=not args.no_allocations)
+    if args.json:
+        benchmark_results.save_json(results, args.json)
+    if args.csv:
+        benchmark_results.save_csv(results, args.csv)
+    if args.baseline:
+        regressions = benchmark_results.compare(results, benchmark_results.load_json(args.baseline),
+                                                metrics=COMPARED_METRICS, tolerance=args.tolerance)
+        benchmark_results.print_regressions(regressions, args.baseline)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
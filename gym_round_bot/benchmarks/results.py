@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import csv
+import json
+from collections import OrderedDict
+
+"""
+    This file saves and loads benchmark results (lists of dictionnaries with a 'name' key) and compares them to baselines.
+    It does not import the env, so that benchmarks which do not need a display can use it
+"""
+
+
+def save_json(results, path):
+    """
+    Saves results in a JSON file (which can then be used as a baseline)
+    """
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_json(path):
+    """
+    Loads results saved by save_json
+    """
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def save_csv(results, path):
+    """
+    Saves results in a CSV file with one row per benchmark
+    """
+    columns = []
+    for result in results:
+        columns += [key for key in result if key not in columns]
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for result in results:
+            writer.writerow([result.get(key) for key in columns])
+
+
+def compare(results, baseline, metrics, tolerance=0.1):
+    """
+    Compares results to baseline results of the same benchmarks. Benchmarks of the baseline which are missing
+    from results or skipped in results (but not in the baseline) are reported too, since they cannot be compared
+
+    Parameters
+    ----------
+    - results, baseline : (list(dict)) results of benchmarks, matched by their 'name'
+    - metrics : (dict) compared metrics, with their direction (1 if higher is better, -1 if lower is better)
+    - tolerance : (float) relative change of a metric in the worse direction above which it is a regression
+
+    Returns
+    -------
+    - (list(OrderedDict)) regressions, with the 'name' of their benchmark, the 'metric',
+        its 'baseline' and current 'value', and the relative 'change'. Benchmarks missing or skipped in results
+        have None values and the 'reason' why they were not compared
+    """
+    references = {result['name'] : result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = references.get(result['name'])
+        if reference is None:
+            continue
+        for metric, direction in metrics.items():
+            value, reference_value = result.get(metric), reference.get(metric)
+            if value is None or not reference_value:
+                continue
+            change = (value - reference_value)/float(reference_value)
+            if change*direction < -tolerance:
+                regressions.append(OrderedDict([('name', result['name']), ('metric', metric), ('baseline', reference_value),
+                                                ('value', value), ('change', change)]))
+    compared = {result['name'] : result for result in results}
+    for reference in baseline:
+        if 'skipped' in reference:
+            continue
+        result = compared.get(reference['name'])
+        if result is None:
+            reason = 'missing from results'
+        elif 'skipped' in result:
+            reason = 'skipped : ' + result['skipped']
+        else:
+            continue
+        regressions.append(OrderedDict([('name', reference['name']), ('metric', None), ('baseline', None),
+                                        ('value', None), ('change', None), ('reason', reason)]))
+    return regressions
+
+
+def print_regressions(regressions, baseline_path):
+    """
+    Prints the regressions returned by compare
+    """
+    for regression in regressions:
+        if regression['metric'] is None:
+            print('NOT COMPARED ' + regression['name'] + ' : ' + regression['reason'])
+            continue
+        print('REGRESSION ' + regression['name'] + ' ' + regression['metric'] + ' : %g -> %g (%+.1f%%)' %
+              (regression['baseline'], regression['value'], 100.0*regression['change']))
+    print(str(len(regressions)) + ' regression(s) against ' + baseline_path)
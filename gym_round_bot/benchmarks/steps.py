@@ -0,0 +1,325 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import sys
+import random
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+from gym_round_bot.envs import round_bot_env
+from gym_round_bot.envs import round_bot_controller
+from gym_round_bot.envs.round_bot_perf import clock
+from gym_round_bot.benchmarks import results as benchmark_results
+
+"""
+    This file benchmarks the reset and step throughputs, step latencies and peak memory of RoundBotEnv
+    over a matrix of configurations. Each configuration is run in its own process (so that peak memories
+    do not add up), results are saved in JSON or CSV files and can be compared to a saved baseline :
+
+        python -m gym_round_bot.benchmarks --json baseline.json
+        python -m gym_round_bot.benchmarks --baseline baseline.json --tolerance 0.1
+
+    By default configurations vary one parameter at a time around BASE_CONFIG, use --full for the whole product of MATRIX
+"""
+
+# configuration which parameters are varied around
+BASE_CONFIG = OrderedDict([('world', 'square'),
+                           ('world_size', 20),
+                           ('texture', 'minecraft'),
+                           ('controller', 'Theta'),
+                           ('obssize', 16),
+                           ('multiview', 0), # number of views, 0 for no multiview
+                           ('position_observations', 'no'),
+                           ('distractors', False),
+                           ('sandboxes', False),
+                           ('trigger_button', False),
+                           ('normalize_observations', False),
+                           ])
+
+# benchmarked values of parameters
+MATRIX = OrderedDict([('world', ['square', 'square_1wall']),
+                      ('world_size', [20, 45]),
+                      ('texture', ['minecraft', 'graffiti', 'colours']),
+                      ('controller', ['Theta', 'Theta2', 'XZ']),
+                      ('obssize', [16, 64, 256]),
+                      ('multiview', [0, 3]),
+                      ('position_observations', ['no', 'one', 'all', 'ranges']),
+                      ('distractors', [False, True]),
+                      ('sandboxes', [False, True]),
+                      ('trigger_button', [False, True]),
+                      ('normalize_observations', [False, True]),
+                      ])
+
+# metrics compared to baselines, with their direction (1 if higher is better, -1 if lower is better)
+COMPARED_METRICS = OrderedDict([('steps_per_sec', 1),
+                                ('resets_per_sec', 1),
+                                ('step_p50_ms', -1),
+                                ('step_p99_ms', -1),
+                                ('peak_rss_mb', -1),
+                                ])
+
+
+def configurations(matrix=MATRIX, base=BASE_CONFIG, full=False, vary=None):
+    """
+    Returns the list of benchmarked configurations
+
+    Parameters
+    ----------
+    - matrix : (OrderedDict) lists of values by parameter
+    - base : (OrderedDict) values of parameters which are not varied
+    - full : (Bool) if True, returns the product of all values of varied parameters, else varies one parameter at a time
+    - vary : (list(str)) names of varied parameters, all parameters of matrix by default
+
+    Returns
+    -------
+    - (list(OrderedDict)) configurations, starting with base, without duplicates
+
+    Exceptions
+    ----------
+    - ValueError : raised if a varied parameter is not in matrix
+    """
+    vary = list(matrix.keys()) if vary is None else vary
+    for name in vary:
+        if name not in matrix:
+            raise ValueError('unknown benchmark parameter ' + name + ', parameters are : ' + str(list(matrix.keys())))
+    configs = [OrderedDict(base)]
+    if full:
+        for values in itertools.product(*[matrix[name] for name in vary]):
+            config = OrderedDict(base)
+            config.update(zip(vary, values))
+            configs.append(config)
+    else:
+        for name in vary:
+            for value in matrix[name]:
+                config = OrderedDict(base)
+                config[name] = value
+                configs.append(config)
+    # remove duplicates of base
+    unique = []
+    for config in configs:
+        if config not in unique:
+            unique.append(config)
+    return unique
+
+
+def config_name(config, base=BASE_CONFIG):
+    """
+    Returns the name of a configuration, made of its differences with base (e.g. 'obssize=64,texture=colours'), or 'base'
+    """
+    changes = [name + '=' + str(value) for name, value in config.items() if base.get(name) != value]
+    return ','.join(changes) if changes else 'base'
+
+
+def make_env(config):
+    """
+    Builds a RoundBotEnv with a configuration (see BASE_CONFIG) and a new controller
+    """
+    views = config['multiview']
+    round_bot_env.set_metadata(world={'name' : config['world'], 'size' : [config['world_size']]*2},
+                               texture=config['texture'],
+                               controller=round_bot_controller.make(name=config['controller'], dtheta=20, speed=1,
+                                                                    xzrange=[2,2], thetarange=2),
+                               obssize=[config['obssize']]*2,
+                               multiview=[360.0*k/views for k in range(views)] if views else None,
+                               position_observations=config['position_observations'],
+                               distractors=config['distractors'],
+                               sandboxes=config['sandboxes'],
+                               trigger_button=config['trigger_button'],
+                               normalize_observations=config['normalize_observations'],
+                               )
+    return round_bot_env.RoundBotEnv()
+
+
+def random_actions(controller, n, seed=0):
+    """
+    Returns a list of n random actions of a controller, drawn with a fixed seed
+    """
+    rng = np.random.RandomState(seed)
+    space = controller.action_space
+    if controller.discrete:
+        return [tuple(int(rng.randint(n_values)) for n_values in space.nvec) for i in range(n)]
+    return [rng.uniform(space.low, space.high) for i in range(n)]
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident memory of the current process in MB, or None if it cannot be measured
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux, in bytes on mac os
+    scale = 1024.0**2 if sys.platform == 'darwin' else 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/scale
+
+
+def run_benchmark(config, steps=1000, resets=20, warmup=10, seed=0):
+    """
+    Benchmarks an env built with a configuration
+
+    Parameters
+    ----------
+    - config : (OrderedDict) configuration (see BASE_CONFIG)
+    - steps : (int) number of timed steps
+    - resets : (int) number of timed resets
+    - warmup : (int) number of untimed steps performed before timed ones
+    - seed : (int) seed of random starts, actions and actuation noise
+
+    Returns
+    -------
+    - (OrderedDict) the configuration and its name, with the env loading time 'load_sec', the throughputs
+        'resets_per_sec' and 'steps_per_sec', the percentiles of step latencies 'step_p50_ms', 'step_p90_ms', 'step_p99_ms'
+        and 'step_max_ms', and the peak resident memory of the process 'peak_rss_mb'
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    start = clock()
+    env = make_env(config)
+    load_duration = clock() - start
+    env.seed(seed)
+    actions = random_actions(env.controller, warmup + steps, seed)
+
+    reset_durations = np.zeros(resets)
+    for i in range(resets):
+        start = clock()
+        env.reset()
+        reset_durations[i] = clock() - start
+
+    for action in actions[:warmup]:
+        if env.step(action)[2]:
+            env.reset()
+    step_durations = np.zeros(steps)
+    for i, action in enumerate(actions[warmup:]):
+        start = clock()
+        done = env.step(action)[2]
+        step_durations[i] = clock() - start
+        if done: # resets are not timed with steps
+            env.reset()
+    del env
+
+    result = OrderedDict([('name', config_name(config))])
+    result.update(config)
+    p50, p90, p99 = np.percentile(step_durations, [50, 90, 99])*1000.0
+    result.update([('load_sec', load_duration),
+                   ('resets_per_sec', resets/np.sum(reset_durations) if resets else None),
+                   ('steps_per_sec', steps/np.sum(step_durations)),
+                   ('step_p50_ms', p50),
+                   ('step_p90_ms', p90),
+                   ('step_p99_ms', p99),
+                   ('step_max_ms', np.max(step_durations)*1000.0),
+                   ('peak_rss_mb', peak_rss_mb()),
+                   ])
+    # python floats for json
+    return OrderedDict((key, float(value) if isinstance(value, np.floating) else value) for key, value in result.items())
+
+
+def _run_benchmark(args):
+    return run_benchmark(*args)
+
+
+def run_matrix(configs, steps=1000, resets=20, warmup=10, seed=0, isolate=True, verbose=True):
+    """
+    Benchmarks a list of configurations (see run_benchmark)
+
+    Parameters
+    ----------
+    - isolate : (Bool) whether to run each configuration in a new process, so that peak memories and OpenGL contexts
+        of configurations are independent
+    - verbose : (Bool) whether to print the results of configurations as they are measured
+    - other parameters : see run_benchmark
+
+    Returns
+    -------
+    - (list(OrderedDict)) results of configurations. Configurations which fail (e.g. cannot be loaded) have a 'skipped'
+        reason instead of metrics, so that other configurations are still benchmarked
+    """
+    results = []
+    for config in configs:
+        args = (config, steps, resets, warmup, seed)
+        try:
+            if isolate:
+                pool = multiprocessing.Pool(processes=1)
+                try:
+                    result = pool.apply(_run_benchmark, (args,))
+                finally:
+                    pool.terminate()
+            else:
+                result = run_benchmark(*args)
+        except Exception as e:
+            result = skipped_result(config, e)
+        results.append(result)
+        if verbose:
+            print(format_result(result))
+    return results
+
+
+def skipped_result(config, exception):
+    """
+    Returns the result of a configuration whose benchmark failed, with the exception as 'skipped' reason
+    """
+    result = OrderedDict([('name', config_name(config))])
+    result.update(config)
+    result['skipped'] = type(exception).__name__ + ' : ' + str(exception)
+    return result
+
+
+def format_result(result):
+    """
+    Returns a one line summary of a benchmark result
+    """
+    if 'skipped' in result:
+        return result['name'].ljust(40) + ' skipped : ' + result['skipped']
+    rss = result['peak_rss_mb']
+    return (result['name'].ljust(40) + ' %9.1f steps/s  %8.1f resets/s  p50 %7.3f ms  p99 %7.3f ms  ' %
+            (result['steps_per_sec'], result['resets_per_sec'] or 0.0, result['step_p50_ms'], result['step_p99_ms'])
+            + ('peak rss %7.1f MB' % rss if rss is not None else ''))
+
+
+def main(argv=None):
+    """
+    Command line entry point, returns 1 if regressions are found against the baseline, else 0
+    """
+    parser = argparse.ArgumentParser(prog='python -m gym_round_bot.benchmarks',
+                                     description='Benchmarks RoundBotEnv resets and steps over a matrix of configurations')
+    parser.add_argument('--steps', type=int, default=1000, help='number of timed steps per configuration')
+    parser.add_argument('--resets', type=int, default=20, help='number of timed resets per configuration')
+    parser.add_argument('--warmup', type=int, default=10, help='number of untimed steps before timed ones')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random starts and actions')
+    parser.add_argument('--vary', nargs='+', default=None, choices=list(MATRIX.keys()), help='varied parameters (all by default)')
+    parser.add_argument('--full', action='store_true', help='benchmark the product of values of varied parameters')
+    parser.add_argument('--no-isolate', action='store_true', help='run all configurations in the current process')
+    parser.add_argument('--json', default=None, help='path of a JSON file where results are saved')
+    parser.add_argument('--csv', default=None, help='path of a CSV file where results are saved')
+    parser.add_argument('--baseline', default=None, help='path of a JSON file of baseline results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change of a metric flagged as a regression')
+    args = parser.parse_args(argv)
+
+    configs = configurations(full=args.full, vary=args.vary)
+    results = run_matrix(configs, steps=args.steps, resets=args.resets, warmup=args.warmup, seed=args.seed,
+                         isolate=not args.no_isolate)
+    if args.json:
+        benchmark_results.save_json(results, args.json)
+    if args.csv:
+        benchmark_results.save_csv(results, args.csv)
+    if args.baseline:
+        regressions = benchmark_results.compare(results, benchmark_results.load_json(args.baseline),
+                                                tolerance=args.tolerance, metrics=COMPARED_METRICS)
+        benchmark_results.print_regressions(regressions, args.baseline)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,2 @@
 from gym_round_bot.envs.round_bot_env import RoundBotEnv
+from gym_round_bot.envs.round_bot_multi_env import MultiRoundBotEnv
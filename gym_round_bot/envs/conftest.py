@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import random
+import pytest
+import pyglet
+import numpy as np
+
+"""
+    Shared fixtures of the tests of the envs (pyglet renders them headless, see the root conftest.py)
+"""
+
+# interactive scripts, which run at import
+collect_ignore = ['test_env.py', 'test_model.py']
+
+
+def seeded_reset(env, seed=0):
+    """
+    Seeds the env and the global generators used by the model (start poses, distractors) and resets the env,
+    so that envs built with the same metadata perform the same episodes
+
+    Returns
+    -------
+    - the first observation of the episode
+    """
+    env.seed(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    return env.reset()
+
+
+_gl_error = [] # error of the creation of an OpenGL context, tried once
+
+
+def skip_without_gl():
+    """
+    Skips the current test if no OpenGL context can be created
+    """
+    if not _gl_error:
+        try:
+            pyglet.window.Window(width=1, height=1, visible=False).close()
+            _gl_error.append(None)
+        except Exception as e:
+            _gl_error.append(e)
+    if _gl_error[0] is not None:
+        pytest.skip('cannot create an OpenGL context : ' + str(_gl_error[0]))
+
+
+@pytest.fixture
+def gl():
+    """
+    Skips tests using it if no OpenGL context can be created
+    """
+    skip_without_gl()
+
+
+@pytest.fixture
+def random_actions():
+    """
+    Returns a function returning a list of n random actions of a controller, drawn with a fixed seed
+    """
+    def actions(controller, n, seed=0):
+        rng = np.random.RandomState(seed)
+        space = controller.action_space
+        if controller.discrete:
+            return [tuple(int(rng.randint(n_values)) for n_values in space.nvec) for i in range(n)]
+        return [rng.uniform(space.low, space.high) for i in range(n)]
+    return actions
+
+
+@pytest.fixture
+def reset():
+    """
+    Returns seeded_reset
+    """
+    return seeded_reset
+
+
+@pytest.fixture
+def make_env():
+    """
+    Returns a function building a RoundBotEnv with the given set_metadata options (with a new controller each time
+    and small observations by default). Tests using it are skipped if no OpenGL context can be created
+    """
+    from gym_round_bot.envs import round_bot_env
+    from gym_round_bot.envs import round_bot_controller
+    skip_without_gl()
+    envs = []
+
+    def make(controller=None, **metadata):
+        if controller is None:
+            controller = round_bot_controller.make(name='Theta', dtheta=20, speed=1, int_actions=False, xzrange=[1,1], thetarange=1)
+        metadata.setdefault('world', {'name':'square', 'size':[20,20]})
+        metadata.setdefault('texture', 'colours')
+        metadata.setdefault('obssize', [16,16])
+        round_bot_env.set_metadata(controller=controller, **metadata)
+        env = round_bot_env.RoundBotEnv()
+        envs.append(env)
+        return env
+
+    yield make
+    # windows are closed at once rather than when envs are collected
+    for env in envs:
+        env.close_recorder()
+        if env._window:
+            env._window.close()
+            env._window = None
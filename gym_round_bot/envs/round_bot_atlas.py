@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import json
+import numpy as np
+from collections import deque, OrderedDict
+
+from gym_round_bot.envs import round_bot_observation
+
+"""
+    This file defines observation atlases : the observations of every pose reachable by a discrete controller
+    in a static world are rendered once and stored in memory-mapped files, from which envs can then serve
+    observations without any rendering. Several processes reading the same atlas share it through the page cache.
+
+    An atlas saved with path P is made of three files :
+        - P_images.npy : (np.uint8) array of shape [n_poses, width, height, 3] of rendered images
+        - P_poses.npy : (np.float) array of shape [n_poses, 5] of quantized poses (see round_bot_observation.pose_key)
+        - P_atlas.json : atlas information (decimals of quantized poses, number of poses)
+"""
+
+def check_static_model(model, controller):
+    """
+    Raises a ValueError if the set of poses reachable by the controller's robot in the model is not finite and deterministic
+    """
+    if not controller.discrete:
+        raise ValueError('observation atlases need a discrete controller')
+    if controller.noise_ratio:
+        raise ValueError('observation atlases need a controller without noise')
+    if model.random_start_pos or model.random_start_rot:
+        raise ValueError('observation atlases need a model without random start position and rotation')
+    if model.distractors:
+        raise ValueError('observation atlases cannot be used with distractors, which move independently of the robot')
+    if any(b.block_type == 'trigger_button' for b in model.collision_blocks):
+        raise ValueError('observation atlases cannot be used with trigger buttons, which change the point of view')
+
+
+def enumerate_poses(model, controller, decimals=3, max_poses=20000):
+    """
+    Enumerates the poses reachable by the robot from its start pose, with a breadth-first search
+    over the controller's actions and the model's collision dynamics.
+
+    Moves on free ground keep the robot on a lattice of poses, but collision corrections shift it off the lattice
+    by a fraction of the overlap, so that the set of poses reachable along walls keeps slowly growing.
+    The search is thus stopped after max_poses poses, the closest to the start pose (in number of actions)
+    being enumerated first.
+
+    Parameters
+    ----------
+    - model : (round_bot_model.Model) the model, whose state is reset at the end
+    - controller : (round_bot_controller.DiscreteController) the controller of the model's robot, without noise
+    - decimals : (int) number of decimals of quantized poses
+    - max_poses : (int) maximum number of poses to enumerate
+
+    Returns
+    -------
+    - List(tuple(tuple(float), tuple(float))) list of reachable (position, rotation)
+
+    Exceptions
+    ----------
+    - ValueError : if the model or the controller are not deterministic
+    """
+    check_static_model(model, controller)
+    model.reset()
+    # the state of the robot also includes the friction of the ground, applied at next move
+    start = (tuple(model.robot_position), tuple(model.robot_rotation), 1.0)
+    poses = OrderedDict() # first (position, rotation) found for each quantized pose
+    visited = set()
+    queue = deque([start])
+    while queue:
+        position, rotation, friction = queue.popleft()
+        model.robot_position, model.robot_rotation = np.array(position), list(rotation)
+        key = round_bot_observation.pose_key(model, decimals)
+        if (key, friction) in visited:
+            continue
+        visited.add((key, friction))
+        poses.setdefault(key, (position, rotation))
+        if len(poses) >= max_poses:
+            break
+        for index in range(controller.num_actions):
+            # set the state back and perform the action
+            model.robot_position, model.robot_rotation = np.array(position), list(rotation)
+            model.current_friction = friction
+            model.strafe = [0.0, 0.0]
+            controller._act(index)
+            model.update(1.0)
+            queue.append((tuple(model.robot_position), tuple(model.robot_rotation), model.current_friction))
+    model.reset()
+    return list(poses.values())
+
+
+def bake_atlas(path, model, window, controller, decimals=3, max_poses=20000):
+    """
+    Renders once every pose reachable by the robot and saves the images and quantized poses in memory-mappable files
+
+    Parameters
+    ----------
+    - path : (str) path prefix of the atlas files
+    - model : (round_bot_model.Model) the model, whose state is reset at the end
+    - window : (round_bot_window.RoundBotWindow) the window rendering observations of the model
+    - controller : (round_bot_controller.DiscreteController) the controller of the model's robot, without noise
+    - decimals, max_poses : see enumerate_poses
+
+    Returns
+    -------
+    - (ObservationAtlas) the baked atlas
+    """
+    poses = enumerate_poses(model, controller, decimals, max_poses)
+    images = np.lib.format.open_memmap(path+'_images.npy', mode='w+', dtype=np.uint8,
+                                       shape=(len(poses), window.width, window.height, 3))
+    keys = np.zeros([len(poses), 5])
+    for i, (position, rotation) in enumerate(poses):
+        model.robot_position, model.robot_rotation = np.array(position), list(rotation)
+        # move the robot block as in RobotBlock._move
+        model.robot_block.translate_and_rotate_to(model.robot_position, np.array([0.0,-rotation[0],0.0]))
+        keys[i] = round_bot_observation.pose_key(model, decimals)
+        window.update_shown_blocks()
+        window.draw()
+        window.get_image(out=images[i])
+    images.flush()
+    del images
+    np.save(path+'_poses.npy', keys)
+    with open(path+'_atlas.json', 'w') as f:
+        json.dump({'decimals' : decimals, 'n_poses' : len(poses)}, f)
+    model.reset()
+    return ObservationAtlas(path)
+
+
+################################################################################################################################
+class ObservationAtlas(object):
+    """
+    Read-only access to the observations of an atlas baked with bake_atlas, memory-mapped from its files
+    """
+    def __init__(self, path, approximate=False):
+        """
+        Parameters
+        ----------
+        - path : (str) path prefix of the atlas files
+        - approximate : (Bool) whether poses which were not baked are given the image of the nearest baked pose
+            with the same rotation (see index), instead of raising a KeyError
+        """
+        with open(path+'_atlas.json') as f:
+            info = json.load(f)
+        self.decimals = info['decimals']
+        self.approximate = approximate
+        # images are not loaded in memory but mapped, and shared between processes through the page cache
+        self.images = np.load(path+'_images.npy', mmap_mode='r')
+        poses = np.load(path+'_poses.npy')
+        self._indices = {tuple(pose) : i for i, pose in enumerate(poses.tolist())}
+        # positions of baked poses grouped by rotation, to find the nearest baked pose of unknown poses
+        self._rotations = {}
+        for rotation in set(tuple(pose[3:]) for pose in poses.tolist()):
+            indices = np.flatnonzero(np.all(poses[:,3:] == rotation, axis=1))
+            self._rotations[rotation] = (poses[indices,:3], indices)
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._indices)
+
+    @property
+    def image_shape(self):
+        return self.images.shape[1:]
+
+    def index(self, model):
+        """
+        Returns the index in the atlas of the current pose of the model's robot.
+        With approximate, poses which were not baked (not enumerated, see enumerate_poses) are given the index
+        of the nearest baked pose with the same rotation, and counted in self.misses
+
+        Exceptions
+        ----------
+        - KeyError : if the pose was not baked and the atlas is not approximate, or if no pose with the same rotation was baked
+        """
+        key = round_bot_observation.pose_key(model, self.decimals)
+        try:
+            return self._indices[key]
+        except KeyError:
+            pass
+        if not self.approximate:
+            raise KeyError('robot pose ' + str(key) + ' is not in the observation atlas (see max_poses of bake_atlas, '
+                           + 'or approximate to read the nearest baked pose)')
+        try:
+            positions, indices = self._rotations[key[3:]]
+        except KeyError:
+            raise KeyError('robot rotation ' + str(key[3:]) + ' is not in the observation atlas')
+        self.misses += 1
+        distances = np.sum(np.square(positions - key[:3]), axis=1)
+        return indices[np.argmin(distances)]
+
+    def get_image(self, model):
+        """
+        Returns the (read-only) image of the current pose of the model's robot
+        """
+        return self.images[self.index(model)]
@@ -17,6 +17,77 @@ import copy
         and not tha actual speed (which can vary with collisions and friction)
 """
     
+##################################################################################################################################
+class GaussianNoise(object):
+    """
+    Generator of zero mean gaussian noise, drawing standard normal samples in blocks ahead of time
+    and consuming them one by one, to avoid calling the random generator at each step.
+    Unless seeded, samples are drawn from the global np.random generator, so that np.random.seed makes runs reproducible
+    """
+    def __init__(self, block_size=4096, seed=None):
+        """
+        Parameters:
+        ----------
+        - block_size : (int) number of samples drawn at each refill
+        - seed : (int or None) seed of the generator, or None to draw samples from the global np.random generator
+        """
+        self._block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """
+        Seeds the generator (None for the global np.random generator) and discards samples drawn ahead of time
+        """
+        self._random = np.random if seed is None else np.random.RandomState(seed)
+        self._samples = []
+        self._index = 0
+
+    @property
+    def block_size(self):
+        return self._block_size
+
+    @block_size.setter
+    def block_size(self, block_size):
+        """ Sets the number of samples drawn at the next refills (e.g. to draw the noise of several robots at once)
+        """
+        self._block_size = block_size
+
+    def __call__(self, std):
+        """
+        Returns a sample of a zero mean gaussian of standard deviation std (same distribution as np.random.normal(0,std))
+        """
+        if self._index >= len(self._samples):
+            # refill samples in bulk, as a python list which is faster than a np.array for indexing single values
+            self._samples = self._random.standard_normal(self._block_size).tolist()
+            self._index = 0
+        sample = self._samples[self._index]
+        self._index += 1
+        return std*sample
+
+    def sample(self, std):
+        """
+        Returns an array of samples of zero mean gaussians of standard deviations std, consuming as many samples
+        as std has values (same distribution as np.random.normal(0,std))
+
+        Parameters:
+        ----------
+        - std : (np.array) standard deviations
+
+        Returns
+        -------
+        - (np.array) float array of the shape of std
+        """
+        std = np.asarray(std, dtype=float)
+        n = std.size
+        if self._index + n > len(self._samples):
+            # refill samples in bulk, keeping those not consumed yet so that the sequence does not depend on the calls
+            self._samples = self._samples[self._index:] + self._random.standard_normal(max(self._block_size, n)).tolist()
+            self._index = 0
+        samples = np.array(self._samples[self._index:self._index+n]).reshape(std.shape)
+        self._index += n
+        return std*samples
+
+
 ##################################################################################################################################
 class Controller(object):
     def __init__(self, controllerType, xzrange, thetarange, model=None, noise_ratio=0):
@@ -29,7 +100,9 @@ class Controller(object):
         - xzrange : (int, int) x,z speed multiplication factors
         - thetarange : (int) Dtheta multiplication factors
         - model : (round_bot_model) Model controlled by the controller
-        - noise_ratio : (float) Ratio to compute additive gaussian noise standard deviation from action's speed
+        - noise_ratio : (float) Ratio to compute additive gaussian noise standard deviation from action's speed.
+            The noise is drawn from the global np.random generator (in blocks, see GaussianNoise) until the controller is
+            seeded (see seed), so that np.random.seed makes noisy runs reproducible
         
         """
         # prevent user from instantiating directly this abstract class
@@ -42,6 +115,7 @@ class Controller(object):
         self.action_meaning = '' # string to explain link between actions value and their meaning
         self._action_space = None  # the gym action space corresponding to this controller
         self.noise_ratio = noise_ratio # additive gaussian noise stdv ratio to speed
+        self._noise = GaussianNoise() # actuation noise generator, with pre-generated samples
         self._act = None # function for causing effects of actions
         self._discrete = None # whether controller is discrete, to be setubclassescontrollerType, 
 
@@ -85,6 +159,18 @@ class Controller(object):
     def discrete(self):
         return self._discrete
 
+    @property
+    def noise(self):
+        """ Returns the actuation noise generator (GaussianNoise) of the controller
+        """
+        return self._noise
+
+    def seed(self, seed=None):
+        """
+        Seeds the actuation noise generator (with None, noise is drawn from the global np.random generator)
+        """
+        self._noise.seed(seed)
+
     def step(self, action):
         """
         Controls the model's robot to perform the action
@@ -113,6 +199,11 @@ class DiscreteController(Controller):
         self._actions = {} # dictionnary to map actions number to their code meaning
         self.int_actions = int_actions
         self._reversed_actions_mapping = None # to be build with self.reverse_actions_mapping afer self._actions initializatio n
+        self._actions_indices = None # mapping from actions to their indices, built with self._build_action_tables
+        # numpy tables of actions effects indexed by actions indices, built with self._build_action_tables
+        self._strafe_table, self._speed_table, self._dtheta_table = None, None, None
+        # same tables as python lists, faster for indexing one action at each step
+        self._strafes, self._speeds, self._dthetas = None, None, None
 
     @property
     def num_actions(self):
@@ -164,15 +255,77 @@ class DiscreteController(Controller):
         actions_mapping = self.actions_mapping
         return {actions_mapping[k]:k for k in actions_mapping.keys()}
 
+    def _action_effects(self, *action):
+        """
+        Computes the effects of an action, without noise
+
+        Returns
+        -------
+        - (tuple(float, float)) strafe of the robot
+        - (float) rolling speed of the robot
+        - (float) rotation change of the robot in the xOz plane
+        """
+        raise NotImplementedError()
+
+    def _build_action_tables(self):
+        """
+        Precompiles the effects of every action into tables indexed by actions indices (see actions_mapping),
+        so that actions are performed with an index lookup. Must be called after the action space is set,
+        and again if parameters changing actions effects are modified
+        """
+        self._actions_indices = self.actions_mapping
+        self._reversed_actions_mapping = self.reverse_actions_mapping # build reversed action mapping
+        effects = [self._action_effects(*self._reversed_actions_mapping[i]) for i in range(len(self._reversed_actions_mapping))]
+        self._strafe_table = np.array([e[0] for e in effects], dtype=float)
+        self._speed_table = np.array([e[1] for e in effects], dtype=float)
+        self._dtheta_table = np.array([e[2] for e in effects], dtype=float)
+        self._strafes = self._strafe_table.tolist()
+        self._speeds = self._speed_table.tolist()
+        self._dthetas = self._dtheta_table.tolist()
+
+    def action_tables(self, indices):
+        """
+        Batch lookup of actions effects (without noise)
+
+        Parameters
+        ----------
+        - indices : (int or np.array(int)) actions indices (see actions_mapping)
+
+        Returns
+        -------
+        - (np.array) strafes of the robot, of shape indices.shape+(2,)
+        - (np.array) rolling speeds of the robot, of shape indices.shape
+        - (np.array) rotation changes of the robot in the xOz plane, of shape indices.shape
+        """
+        return self._strafe_table[indices], self._speed_table[indices], self._dtheta_table[indices]
+
+    def actions_to_indices(self, actions):
+        """
+        Converts an array of actions (as tuples of the MultiDiscrete action space) to their indices (see actions_mapping)
+
+        Parameters
+        ----------
+        - actions : (np.array(int)) array of shape [N, len(nvec)] of actions
+
+        Returns
+        -------
+        - (np.array(int)) array of shape [N] of actions indices
+        """
+        # in actions_mapping, the first component of actions varies first
+        strides = np.cumprod([1]+list(self._action_space.nvec[:-1]))
+        return np.dot(np.asarray(actions), strides)
+
     def step(self, action):
         """
         Controls the model's robot to perform the action
         Execute functions containded in action functions dictionnary
         """
         if self.int_actions:
-            # If actions are taken as int, convert them to the correct format
-            action = self._reversed_actions_mapping[action]        
-        self._act(*action)
+            index = action
+        else:
+            # If actions are not taken as int, convert them to their index
+            index = self._actions_indices[tuple(action)]
+        self._act(index)
 
 
 ##################################################################################################################################
@@ -210,7 +363,24 @@ class Theta_Controller(DiscreteController):
         self.dtheta = dtheta
         self._initial_speed = speed
         self._init()
-        self._reversed_actions_mapping = self.reverse_actions_mapping # build reversed action mapping
+        self._build_action_tables()
+
+    @property
+    def dtheta(self):
+        return self._dtheta
+
+    @dtheta.setter
+    def dtheta(self, dtheta):
+        self._dtheta = dtheta
+        if self._reversed_actions_mapping is not None:
+            # actions effects depend on dtheta
+            self._build_action_tables()
+
+    def _action_effects(self, s, d):
+        strafe = 0.0 if s-self._xzrange[0]==0 else np.sign(s-self._xzrange[0])
+        speed = self._initial_speed*(abs(s-self._xzrange[0]))
+        dth = ((d-self._thetarange)*self._dtheta)
+        return (strafe, 0.0), speed, dth
 
     def _init(self):
         """ Private initialisation of Theta_Controller
@@ -219,12 +389,12 @@ class Theta_Controller(DiscreteController):
 
         self._actions = {(s,d) for s in range(0,2*self._xzrange[0]+1) for d in range(0,2*self._thetarange+1) }
                 
-        def act(s,d):
-            self._model.strafe[0]= 0 if s-self._xzrange[0]==0 else np.sign(s-self._xzrange[0])
-            speed = self._initial_speed*(abs(s-self._xzrange[0]))
-            self._model.rolling_speed= speed + np.random.normal(0,speed*self.noise_ratio)
-            dth = ((d-self._thetarange)*self.dtheta)
-            self._model.change_robot_rotation(dth+np.random.normal(0,abs(dth)*self.noise_ratio),0)
+        def act(i):
+            self._model.strafe[0] = self._strafes[i][0]
+            speed = self._speeds[i]
+            self._model.rolling_speed= speed + self._noise(speed*self.noise_ratio)
+            dth = self._dthetas[i]
+            self._model.change_robot_rotation(dth+self._noise(abs(dth)*self.noise_ratio),0)
         self._act = act
 
         self._action_space = spaces.MultiDiscrete([2*self._xzrange[0]+1,2*self._thetarange+1])
@@ -244,15 +414,10 @@ class Theta2_Controller(Theta_Controller):
     def _init(self):
         """ Private initialisation of Theta2_Controller
         """
+        # same act function and actions effects as Theta_Controller, only the actions differ
+        super(Theta2_Controller, self)._init()
         self.action_meaning = '[s, dth] 2-tuple coding for speed between 0 and +initial_speed and dtheta between -dt and dt'
         self._actions = { (s,d) for s in range(0,self._xzrange[0]+1) for d in range(0,2*self._thetarange+1) }
-        def act(s,d):
-            self._model.strafe[0]= 0 if s-self._xzrange[0]==0 else np.sign(s-self._xzrange[0])
-            speed = self._initial_speed*abs(s-self._xzrange[0])
-            self._model.rolling_speed= speed + np.random.normal(0,speed*self.noise_ratio)
-            dth = (d-self._thetarange)*self.dtheta
-            self._model.change_robot_rotation(dth+np.random.normal(0,abs(dth)*self.noise_ratio),0)
-        self._act = act
                                     
         self._action_space = spaces.MultiDiscrete([1+self._xzrange[0],2*self._thetarange+1])
         # set missing MultiDiscrete parameter n
@@ -273,14 +438,19 @@ class XZ_Controller(DiscreteController):
         self._action_space = spaces.MultiDiscrete([2*xzrange[0]+1,2*xzrange[1]+1])
         # set missing MultiDiscrete parameter n
         self._action_space.n = self.num_actions
-        self._reversed_actions_mapping = self.reverse_actions_mapping # build reversed action mapping
+        self._build_action_tables()
+
+    def _action_effects(self, x, z):
+        strafe = (x-self._xzrange[0], z-self._xzrange[1])
+        speed = self._initial_speed*np.sqrt((x-self._xzrange[0])**2+(z-self._xzrange[1])**2)
+        return strafe, speed, 0.0
         
     def _init(self):
         self._actions = { (x,z) for x in range(0,2*self._xzrange[0]+1) for z in range(0,2*self._xzrange[1]+1)}
-        def act(x,z):
-            self._model.strafe=[x-self._xzrange[0],z-self._xzrange[1]]
-            speed = self._initial_speed*np.sqrt((x-self._xzrange[0])**2+(z-self._xzrange[1])**2)
-            self._model.rolling_speed = speed + np.random.normal(0,speed*self.noise_ratio)
+        def act(i):
+            self._model.strafe = self._strafes[i][:]
+            speed = self._speeds[i]
+            self._model.rolling_speed = speed + self._noise(speed*self.noise_ratio)
         self._act = act              
 
     @property
@@ -294,20 +464,23 @@ class XZ_Controller_Fixed(XZ_Controller):
     This class controls the robot to move on (oXZ) plan, but always looking in to the same point P
     """
     def __init__(self, model, speed, xzrange=[1,1], thetarange=2, int_actions=False, fixed_point=[0,0], noise_ratio=0):
-        super(XZ_Controller_Fixed,self).__init__('XZ fixed', model=model, speed=speed, xzrange=xzrange,
+        super(XZ_Controller_Fixed,self).__init__(model=model, speed=speed, xzrange=xzrange,
                                                  thetarange=thetarange, int_actions=int_actions, noise_ratio=noise_ratio)
+        self._controllerType = 'XZ fixed'
         self._fixed_point = fixed_point
         # set missing MultiDiscrete parameter n
         self._action_space.n = self.num_actions
     
     def _init(self):
+        # rotation is not tabulated (null dtheta) because it depends on the robot position
         self._actions = { (x,z) for x in range(0,2*self._xzrange[0]+1) for z in range(0,2*self._xzrange[1]+1) }
-        def act(x,z):
-            self._model.strafe= [x-self._xzrange[0],z-self._xzrange[1]]
-            speed = self._initial_speed*np.sqrt((x-self._xzrange[0])**2+(z-self._xzrange[1])**2)
-            self._model.rolling_speed = speed + np.random.normal(0,speed*self.noise_ratio)                        
+        def act(i):
+            self._model.strafe = self._strafes[i][:]
+            speed = self._speeds[i]
+            self._model.rolling_speed = speed + self._noise(speed*self.noise_ratio)                        
             vec = self._fixed_point-np.array(self._model.robot_position[0:3:2])
-            self._model.robot_rotation[0] = 90+np.degrees( np.arctan2( vec[1], vec[0] )  )
+            # assign a new rotation since the model's one can be its (immutable) start rotation
+            self._model.robot_rotation = np.array([90+np.degrees( np.arctan2( vec[1], vec[0] )  ), self._model.robot_rotation[1]])
         self._act = act
 
 
@@ -331,7 +504,7 @@ class XZc_Controller(ContinuousController):
         def act(x, z):
             self._model.strafe=[x,z]
             speed = self._initial_speed*np.sqrt((x)**2+(z)**2)
-            self._model.rolling_speed = speed + np.random.normal(0,speed*self.noise_ratio)
+            self._model.rolling_speed = speed + self._noise(speed*self.noise_ratio)
         self._act = act
 
     @property
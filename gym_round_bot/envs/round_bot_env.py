@@ -15,19 +15,29 @@ from gym.utils import seeding
 from gym_round_bot.envs import round_bot_window
 from gym_round_bot.envs import round_bot_model
 from gym_round_bot.envs import round_bot_controller
+from gym_round_bot.envs import round_bot_observation
+from gym_round_bot.envs import round_bot_atlas
+from gym_round_bot.envs import round_bot_perf
+from gym_round_bot.envs import round_bot_recorder
 
 import numpy as np
 import copy
+import itertools
+import numbers
+import os
+from collections import OrderedDict
 
 
 class RoundBotEnv(gym.Env):
 
     metadata = {'render.modes': ['human', 'rgb_array']}
+    _ids = itertools.count() # IDs of envs in the process, used in traces
                     
     def __init__(self):
         """
         Inits the attributes to None.        
         """        
+        self.id = next(RoundBotEnv._ids)
         self._world = None        
         self._texture = None        
         self._model = None
@@ -45,8 +55,25 @@ class RoundBotEnv(gym.Env):
         self._normalize_observations = None
         self._normalize_rewards = None
         self._observation_transformation = None
+        self._observation_pipeline = None
         self._position_observations = None
+        self._range_rays = None # number of rays of range observations
+        self._range_fov = None # field of view of range observations
         self._get_observation = None # function to get current observation (which transforms and reshapes it if asked)
+        self._perform_render = None # function to render the current state of the model
+        self._action_repeat = None
+        self._max_pool_frames = None
+        self._frame_stack = None # ring buffer of last observations if asked
+        self._stack_observation = None # function to add current observation to frame stack
+        self._reset_frame_stack = None # function to fill frame stack with first observation
+        self._observation_cache = None # cache of observations keyed on robot poses if asked
+        self._observation_atlas = None # atlas of pre-rendered observations if asked, replacing the window
+        self._observation_channels = None # image channels of observations (rgb, depth, segmentation)
+        self._palette_indexer = None # mapping from rgb images to palette indices if asked
+        self._cameras = None # cameras rendered together in an offscreen framebuffer if asked
+        self._perf_timer = None # timer of step phases if asked
+        self._trace = None # writer of step phases events in a trace file if asked
+        self._recorder = None # recorder of trajectories in chunked files if asked
         self._sandboxes = None
         self._trigger_buttonutton = None
         self._distractors = None
@@ -56,6 +83,8 @@ class RoundBotEnv(gym.Env):
         """
         Cleans the env object before env deletion        
         """
+        self.close_trace()
+        self.close_recorder()
         if self._monitor_window:
             self.delete_monitor_window()
         if self._window:
@@ -66,11 +95,32 @@ class RoundBotEnv(gym.Env):
 
     @property
     def action_space(self):
+        """ Returns the action space built once by the controller, shared and read-only (see copy_action_space)
+        """
         # self.action_space is self._controller.action_space
-        return copy.deepcopy(self._controller.action_space)
+        return self._controller.action_space
 
     @property
     def observation_space(self):
+        """ Returns the observation space built once at loading, shared and read-only (see copy_observation_space)
+        """
+        return self._observation_space
+
+    @property
+    def palette(self):
+        """ Returns the (read-only) uint8 array of shape [n_colors, 3] of RGB colors indexed by palette observations,
+            or None without palette observations (see set_metadata)
+        """
+        return self._palette_indexer.palette if self._palette_indexer else None
+
+    def copy_action_space(self):
+        """ Returns a modifiable deep copy of the action space
+        """
+        return copy.deepcopy(self._controller.action_space)
+
+    def copy_observation_space(self):
+        """ Returns a modifiable deep copy of the observation space
+        """
         return copy.deepcopy(self._observation_space)
 
     @property
@@ -108,26 +158,45 @@ class RoundBotEnv(gym.Env):
     def step(self, action):
         """
         Perform one step
+
+        The action is repeated self._action_repeat times : the controller and the model are updated at every
+        repetition but the observation is rendered only once at the end (or at the last two repetitions
+        if self._max_pool_frames is set). Rewards are summed over repetitions, which stop as soon as done is reached.
         """
-        # perform action
-        self._controller.step(action)
-     
-        # update and get observation
-        self._perform_udpate()
-        self._current_observation = self._get_observation()
-
-        # get reward :
-        reward = self._model.current_reward
-        # update self._reward_count
-        self._reward_count += reward
-        # check if done
-        done = ((self._crash_stop and reward < 0) or
-               (self._reward_stop and reward > 0) or
-               (self._reward_count_stop and self._reward_count <= self._reward_count_stop))        
+        reward = 0.0
+        pooled_observation = None
+        for i in range(self._action_repeat):
+            # perform action
+            self._controller.step(action)
+            # update model only, rendering is done after the last repetition
+            self._model.update(1.0)
+
+            # get reward :
+            sub_reward = self._model.current_reward
+            reward += sub_reward
+            # update self._reward_count
+            self._reward_count += sub_reward
+            # check if done
+            done = ((self._crash_stop and sub_reward < 0) or
+                   (self._reward_stop and sub_reward > 0) or
+                   (self._reward_count_stop and self._reward_count <= self._reward_count_stop))
+            if done:
+                break
+            # render the before last frame if it has to be max pooled with the last one
+            if self._max_pool_frames and i == self._action_repeat-2:
+                # copy since the observation may be a buffer overwritten by the next observation
+                pooled_observation = np.copy(self._observe())
+
+        # render and get observation
+        observation = self._observe()
+        if pooled_observation is not None:
+            observation = np.maximum(observation, pooled_observation)
+        self._current_observation = self._stack_observation(observation)
         
         # normalize rewards if asked
         if self._normalize_rewards:
-            reward = reward/self._model.max_reward # normalize values in [-1,1] float range
+            # normalize values in [-1,1] float range per repetition, i.e. [-action_repeat,action_repeat] for summed rewards
+            reward = reward/self._model.max_reward
         # no info
         info={}
         return self._current_observation, reward, done, info
@@ -144,8 +213,8 @@ class RoundBotEnv(gym.Env):
         self._reward_count=0.0
         self.unwrapped._model.speed_continuous = np.array([0, 0], dtype=float)
         
-        # get observation
-        self._current_observation = self._get_observation()
+        # render the reset pose and get observation
+        self._current_observation = self._reset_frame_stack(self._observe())
 
         return self._current_observation
         
@@ -156,6 +225,8 @@ class RoundBotEnv(gym.Env):
             # reshape as line
             return self._current_observation
         elif mode == 'human':
+            if not self._window:
+                raise ValueError('human render mode needs a window, which is not built with observation_atlas nor ranges observations')
             # this slows down rendering with a factor 10 !
             # TODO : show current observation on screen (potentially fusionned image, and not only last render !)
             if not self._window.visible:
@@ -166,6 +237,8 @@ class RoundBotEnv(gym.Env):
 
     def seed(self, seed=None):
         seed = seeding.np_random(seed)
+        # seed the actuation noise of the controller
+        self._controller.seed(seed[1] % 2**32)
         return [seed]
 
     def _load(self):
@@ -180,7 +253,9 @@ class RoundBotEnv(gym.Env):
             raise(Exception('Error: unknown or uncompatible world \'' + metadata['world']['name'] + '\' for environnement round_bot'))
         if not metadata['texture'] in self.compatible_textures:
             raise(Exception('Error: unknown or uncompatible texture \'' + metadata['texture'] + '\' for environnement round_bot'))
-        
+        # check that options can be used together before building anything
+        self._check_metadata(metadata)
+
         ## shared settings
         self._world = metadata['world']
         self._texture = metadata['texture']
@@ -202,6 +277,8 @@ class RoundBotEnv(gym.Env):
         self._crash_stop = metadata['crash_stop']
         self._reward_count_stop = metadata['reward_count_stop']
         self._reward_stop = metadata['reward_stop']
+        self._action_repeat = metadata['action_repeat']
+        self._max_pool_frames = metadata['max_pool_frames']
 
         # save controller and plug it to model :
         self._controller = metadata['controller']
@@ -210,23 +287,35 @@ class RoundBotEnv(gym.Env):
         self._normalize_observations = metadata['normalize_observations']     
         self._observation_transformation = metadata['observation_transformation']     
         self._position_observations = metadata['position_observations']
+        self._range_rays = metadata['range_rays']
+        self._range_fov = metadata['range_fov']
+        channels = metadata['observation_channels'] or ['rgb']
+        self._observation_channels = [channel for channel in ['rgb', 'depth', 'segmentation'] if channel in channels]
+        self._cameras = metadata['cameras'] or None
 
         shape = self.obssize
         self.obs_dim = shape[0]*shape[1]*3
 
 
-        # build main window
-        self._window = round_bot_window.MainWindow(  self._model,
-                                                global_pov=metadata['global_pov'],
-                                                perspective = metadata['perspective'],
-                                                interactive=False,
-                                                focal=metadata['focal'],
-                                                width=metadata['obssize'][0],
-                                                height=metadata['obssize'][1],
-                                                caption='Round bot in '+self._world['name']+' world',
-                                                resizable=False,
-                                                visible=metadata['visible']
-                                                )
+        # load observation atlas if asked
+        if metadata['observation_atlas']:
+            self._load_observation_atlas(metadata)
+
+        # build main window, except with observation atlas and range observations, which are not rendered
+        if not self._observation_atlas and self._position_observations != 'ranges':
+            self._window = round_bot_window.MainWindow(  self._model,
+                                                    global_pov=metadata['global_pov'],
+                                                    perspective = metadata['perspective'],
+                                                    interactive=False,
+                                                    focal=metadata['focal'],
+                                                    static_background=metadata['static_background'],
+                                                    skip_unchanged_frames=metadata['skip_unchanged_frames'],
+                                                    width=metadata['obssize'][0],
+                                                    height=metadata['obssize'][1],
+                                                    caption='Round bot in '+self._world['name']+' world',
+                                                    resizable=False,
+                                                    visible=metadata['visible']
+                                                    )
 
         # build secondary observation window if asked
         if metadata['winsize']:
@@ -242,76 +331,610 @@ class RoundBotEnv(gym.Env):
             # plug monitor_window to window
             self._window.add_follower(self._monitor_window)
 
+        # time step phases if asked, before functions using instrumented methods are built
+        self._perf_timer = self._build_perf_timer(metadata['perf_stats'], metadata['trace_path'], metadata['trace_buffer_size'])
+
+        # set the cameras rendered in one pass if asked
+        if self._cameras:
+            self._window.set_cameras(self._cameras)
+
+        # set the layout in which images are read if asked
+        if metadata['image_layout']:
+            self._window.set_image_layout(**metadata['image_layout'])
+
         # observation are RGB images of rendered world (as line arrays)
-        if self._position_observations == 'no':
+        if self._cameras:
+            # images of cameras are returned in a dictionnary
+            self._observation_space = spaces.Dict(OrderedDict(
+                [(name, spaces.Box(low=0, high=255, shape=image.shape, dtype=np.uint8))
+                 for name, image in self._window.render_cameras().items()]))
+        elif self._position_observations == 'no' and metadata['image_layout']:
+            # images are returned in their layout
+            if not self._normalize_observations:
+                self._observation_space = spaces.Box(low=0, high=255, shape=self._window.image_shape, dtype=np.uint8)
+            else:
+                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=self._window.image_shape, dtype=np.float32)
+        elif self._position_observations == 'no':
             if not self._normalize_observations:
                 self._observation_space = spaces.Box(low=0, high=255, shape=[1, metadata['obssize'][0]*metadata['obssize'][1]*3],dtype=np.uint8)
             else:
-                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[1, metadata['obssize'][0]*metadata['obssize'][1]*3],dtype=np.float)
+                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[1, metadata['obssize'][0]*metadata['obssize'][1]*3],dtype=np.float32)
         elif self._position_observations == 'one':
             if not self._normalize_observations:
                 w=self._model.world_info['width']
-                self._observation_space = spaces.Box(low=-w, high=w, shape=[1, 6],dtype=np.float)
+                self._observation_space = spaces.Box(low=-w, high=w, shape=[1, 6],dtype=np.float64)
             else:
-                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[1, 6],dtype=np.float)            
+                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[1, 6],dtype=np.float64)            
         elif self._position_observations == 'all':
             n_moving_blocks = len(self._model.movable_blocks)
             if not self._normalize_observations:
                 w=self._model.world_info['width']
-                self._observation_space = spaces.Box(low=-w, high=w, shape=[n_moving_blocks, 6],dtype=np.float)
+                self._observation_space = spaces.Box(low=-w, high=w, shape=[n_moving_blocks, 6],dtype=np.float64)
             else:
-                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[n_moving_blocks, 6],dtype=np.float)            
-        else:
-            raise ValueError('position_observations possible values : no, all, one')
+                self._observation_space = spaces.Box(low=-1.0, high=1.0, shape=[n_moving_blocks, 6],dtype=np.float64)            
+        elif self._position_observations == 'ranges':
+            if not self._normalize_observations:
+                self._observation_space = spaces.Box(low=0.0, high=self._range_max(), shape=[1, self._range_rays],dtype=np.float64)
+            else:
+                self._observation_space = spaces.Box(low=0.0, high=1.0, shape=[1, self._range_rays],dtype=np.float64)
 
         self._multiview = metadata['multiview'] # if not None, observations will be fusion of subjective view with given relative xOz angles
 
         ## build self._get_observation function, which gets current observation (which transforms and reshapes it if asked)
         # observation getter
+        self._observation_pipeline = self._build_observation_pipeline(metadata['observation_pipeline'])
+        if self._observation_pipeline and metadata['observation_pipeline']:
+            pipeline = self._observation_pipeline
+            self._observation_space = spaces.Box(low=pipeline.output_low, high=pipeline.output_high,
+                                                 shape=pipeline.output_shape, dtype=pipeline.output_dtype)
+        self._palette_indexer = self._build_palette_indexer(metadata)
+        if self._palette_indexer:
+            self._observation_space = spaces.Box(low=0, high=len(self.palette)-1, shape=self._image_shape()[:-1], dtype=np.uint8)
         self._get_observation = self._build_observation_getter()
-        self._perform_udpate = self._build_update()
+        if self._observation_channels != ['rgb']:
+            self._observation_space = self._build_channels_space()
+        self._perform_render = self._build_render()
+        if not self._window:
+            # observations are read from the atlas or computed from the model, nothing has to be rendered
+            self._observe = self._get_observation
+        self._build_observation_cache(metadata['observation_cache'], metadata['observation_cache_decimals'])
+        self._build_frame_stack(metadata['frame_stack'])
+        # spaces are shared by properties instead of being copied at each access, so prevent their modification
+        _freeze_space(self._observation_space)
+        _freeze_space(self._controller.action_space)
+        if metadata['record_path']:
+            self._build_recorder(metadata['record_path'], metadata['record_chunk_size'])
+        if self._perf_timer:
+            self._perf_timer.instrument(self, '_get_observation', 'observation')
+            self._perf_timer.instrument(self, 'reset', 'reset')
+            self.step = self._perf_timer.wrap_step(self.step, metadata['perf_stats_info'])
        
 
-    def _build_update(self):
+    def _check_metadata(self, metadata):
+        """
+        Checks the values of options and that options asked in metadata can be used together (see set_metadata)
+
+        Parameters
+        ----------
+        - metadata : (dict) metadata of the env (see set_metadata)
+
+        Exceptions
+        ----------
+        - ValueError : if an option has an unvalid value or cannot be used with another asked option
+        """
+        image_observations = metadata['position_observations'] == 'no'
+        simple_images = image_observations and metadata['multiview'] is None
+        # observations are not rendered in a window with observation atlas and range observations
+        window = not metadata['observation_atlas'] and metadata['position_observations'] != 'ranges'
+        channels = metadata['observation_channels'] or ['rgb']
+        layout = metadata['image_layout'] or {}
+
+        # values of options
+        if not metadata['position_observations'] in ['no', 'one', 'all', 'ranges']:
+            raise ValueError('position_observations possible values : no, all, one, ranges')
+        if not (isinstance(metadata['action_repeat'], numbers.Integral) and metadata['action_repeat'] >= 1):
+            raise ValueError('action_repeat must be an int >= 1')
+        if metadata['frame_stack'] and not (isinstance(metadata['frame_stack'], numbers.Integral)
+                                                       and metadata['frame_stack'] >= 1):
+            raise ValueError('frame_stack must be None or an int >= 1')
+        if any(not channel in ['rgb', 'depth', 'segmentation'] for channel in channels) or len(set(channels)) != len(channels):
+            raise ValueError('observation_channels possible values : rgb, depth, segmentation (without duplicates)')
+        if metadata['cameras']:
+            for name, camera in metadata['cameras'].items():
+                if not 'size' in camera:
+                    raise ValueError('camera ' + str(name) + ' has no size')
+
+        # options needing a main window or simple image observations
+        if metadata['winsize'] and not window:
+            raise ValueError('winsize needs a main window, which is not built with observation_atlas nor ranges observations')
+        if layout and (metadata['multiview'] is not None or not window):
+            raise ValueError('image_layout cannot be used with multiview, observation_atlas nor ranges observations')
+        if metadata['max_pool_frames'] and not image_observations:
+            raise ValueError('max_pool_frames can only be used with image observations')
+
+        # observation atlas
+        if metadata['observation_atlas']:
+            if not simple_images:
+                raise ValueError('observation_atlas can only be used with simple image observations')
+            if metadata['winsize'] or metadata['observation_cache']:
+                raise ValueError('observation_atlas cannot be used with winsize or observation_cache')
+        elif metadata['observation_atlas_approximate']:
+            raise ValueError('observation_atlas_approximate needs an observation_atlas')
+
+        # observation cache
+        if metadata['observation_cache']:
+            if not image_observations:
+                raise ValueError('observation_cache can only be used with image observations')
+            if metadata['distractors']:
+                raise ValueError('observation_cache cannot be used with distractors, which move independently of the robot')
+
+        # observation channels
+        if set(channels) != set(['rgb']):
+            if not simple_images or metadata['observation_atlas']:
+                raise ValueError('depth and segmentation observation channels can only be used with simple image observations')
+            if len(channels) > 1 and (metadata['frame_stack'] or metadata['max_pool_frames'] or metadata['observation_cache']):
+                raise ValueError('observations with several channels cannot be used with frame_stack, max_pool_frames nor observation_cache')
+
+        # cameras
+        if metadata['cameras']:
+            if not simple_images or metadata['observation_atlas']:
+                raise ValueError('cameras cannot be used with position_observations, multiview (see cameras multiview) nor observation_atlas')
+            if (metadata['observation_pipeline'] or metadata['normalize_observations'] or layout
+                or metadata['palette_observations'] or channels != ['rgb']):
+                raise ValueError('cameras cannot be used with observation_pipeline, normalize_observations, image_layout, '
+                                 + 'palette_observations nor observation_channels')
+            if metadata['frame_stack'] or metadata['max_pool_frames'] or metadata['observation_cache']:
+                raise ValueError('cameras cannot be used with frame_stack, max_pool_frames nor observation_cache')
+
+        # palette observations
+        if metadata['palette_observations']:
+            if metadata['texture'] != 'colours':
+                raise ValueError('palette_observations can only be used with colours texture')
+            if (not image_observations or metadata['observation_pipeline'] or metadata['normalize_observations']
+                or metadata['observation_transformation']):
+                raise ValueError('palette_observations cannot be used with position_observations, observation_pipeline, '
+                                 + 'normalize_observations nor observation_transformation')
+            if metadata['max_pool_frames']:
+                raise ValueError('palette_observations cannot be used with max_pool_frames (indices are not ordered)')
+            if metadata['observation_atlas']:
+                raise ValueError('palette_observations cannot be used with observation_atlas (images are not rendered with the palette)')
+            if layout.get('grayscale') or layout.get('channel_first'):
+                raise ValueError('palette_observations need rgb images with channels last (see image_layout)')
+
+        # recorded observations
+        if metadata['record_path'] and (metadata['cameras'] or len(channels) > 1):
+            raise ValueError('record_path cannot be used with dictionnary observations (cameras, several observation_channels)')
+
+    def _build_render(self):
+        """
+        Builds the function rendering the current state of the model in the window
+        """
+        # multiview and cameras rendering is done directly by the observation getter, and nothing is rendered without window
+        if not self._window or self._cameras:
+            return lambda : None
+        elif not self._multiview:
+            return self._window.draw
+        else:
+            return lambda : None
+
+    def _build_frame_stack(self, k):
+        """
+        Builds the ring buffer stacking the k last observations if asked, and the functions using it.
+        If observations are raw images, they are rendered straight into the next slot of the ring buffer
+        """
+        if not k:
+            self._stack_observation = lambda observation : observation
+            self._reset_frame_stack = lambda observation : observation
+            return
+
+        frame = self._get_observation()
+        self._frame_stack = round_bot_observation.FrameStack(k, frame.shape, frame.dtype)
+        self._reset_frame_stack = self._frame_stack.reset
+        raw_images = (self._position_observations == 'no' and not self._observation_pipeline
+                      and not self._observation_transformation and self._multiview is None
+                      and self._observation_cache is None and not self._observation_atlas
+                      and self._observation_channels == ['rgb'] and not self._palette_indexer)
+        if raw_images and not self._max_pool_frames:
+            self._get_observation = lambda : self._window.get_image(out=self._frame_stack.next_frame)
+            self._stack_observation = lambda observation : self._frame_stack.append()
+        else:
+            self._stack_observation = self._frame_stack.append
+        self._observation_space = spaces.Box(low=np.min(self._observation_space.low), high=np.max(self._observation_space.high),
+                                             shape=(k,)+frame.shape, dtype=self._observation_space.dtype)
+
+    def _build_observation_cache(self, max_bytes, decimals):
+        """
+        Builds the cache of observations keyed on the quantized robot pose and the window point of view, if asked.
+        The cache can only be used when the rendered scene is determined by these keys, and is cleared whenever blocks are
+        added, removed, shown or hidden (see round_bot_model.Model.structure_version)
+        """
+        if not max_bytes:
+            return
+        self._observation_cache = round_bot_observation.ObservationCache(max_bytes)
+        cache = self._observation_cache
+        render_observation = self._observe
+        model = self._model
+        structure_version = [model.structure_version] # version of the scene structure of cached observations
+
+        def observe():
+            if model.structure_version != structure_version[0]:
+                # cached observations cannot be valid for the new scene
+                cache.clear()
+                structure_version[0] = model.structure_version
+            # the point of view can be switched by a trigger button
+            key = (round_bot_observation.pose_key(self._model, decimals), self._window.global_pov)
+            observation = cache.get(key)
+            if observation is None:
+                observation = render_observation()
+                cache.put(key, observation)
+            else:
+                # keep monitoring windows up to date
+                self._window.update_shown_blocks()
+                self._window.step_followers(1.0)
+            return observation
+        self._observe = observe
+
+    def _load_observation_atlas(self, metadata):
+        """
+        Loads the observation atlas from which observations are read instead of being rendered, and checks
+        that the env's model and controller allow it (see round_bot_atlas.check_static_model)
+        """
+        round_bot_atlas.check_static_model(self._model, self._controller)
+        self._observation_atlas = round_bot_atlas.ObservationAtlas(metadata['observation_atlas'],
+                                                                   approximate=metadata['observation_atlas_approximate'])
+        if tuple(self._observation_atlas.image_shape) != (metadata['obssize'][0], metadata['obssize'][1], 3):
+            raise ValueError('observation_atlas images shape ' + str(self._observation_atlas.image_shape) + ' does not match obssize')
+
+    def bake_observation_atlas(self, path, decimals=3, max_poses=20000):
+        """
+        Renders once every pose reachable by the robot with the env's controller and saves them as an atlas,
+        which can then be used with set_metadata's observation_atlas (see round_bot_atlas.bake_atlas)
+
+        Parameters
+        ----------
+        - path : (str) path prefix of the atlas files
+        - decimals : (int) number of decimals of quantized poses
+        - max_poses : (int) maximum number of enumerated poses (see round_bot_atlas.enumerate_poses)
+
+        Returns
+        -------
+        - (round_bot_atlas.ObservationAtlas) the baked atlas
+        """
+        if not self._window:
+            raise ValueError('cannot bake an observation atlas without window')
+        return round_bot_atlas.bake_atlas(path, self._model, self._window, self._controller, decimals, max_poses)
+
+    def render_poses(self, poses, out=None):
+        """
+        Renders the views of the robot at given poses directly, without any physics nor controller
+        (see RoundBotWindow.render_poses), for instance to generate pose-supervised datasets
+
+        Parameters
+        ----------
+        - poses : (np.array) array of shape [N, 5] of robot positions and rotations [x, y, z, rx, ry]
+        - out : (np.array) optional uint8 array of shape [N, height, width, 3] in which images are written
+
+        Returns
+        -------
+        - (np.array) uint8 array of shape [N, height, width, 3] of rendered images, with rows from the top
+        """
+        if not self._window:
+            raise ValueError('cannot render poses without window')
+        return self._window.render_poses(poses, out)
+
+    def _build_perf_timer(self, window, trace_path, trace_buffer_size):
         """
-        Builds the function performing updates
+        Builds the timer of step phases if asked (with its trace writer if asked), and replaces the methods of the controller,
+        the model and the window by timed versions (in these instances only). Without timer, nothing is replaced
+        and steps are not slowed down
+
+        Returns
+        -------
+        - (round_bot_perf.PhaseTimer) the timer, or None if not asked
+        """
+        if not window and not trace_path:
+            return None
+        if trace_path:
+            self._trace = round_bot_perf.TraceWriter(trace_path.format(pid=os.getpid(), env=self.id), tid=self.id,
+                                                     name='env ' + str(self.id), buffer_size=trace_buffer_size)
+        timer = round_bot_perf.PhaseTimer(1000 if window is True or window is False else window, trace=self._trace)
+        timer.instrument(self._controller, 'step', 'act')
+        timer.instrument(self._model, 'update', 'update')
+        timer.instrument(self._model, 'collide', 'collide')
+        if self._window:
+            timer.instrument(self._window, 'update_shown_blocks', 'vertices')
+            timer.instrument(self._window, 'step_followers', 'followers')
+            # renderings which read their images back include the readback duration
+            for method in ['on_draw', 'multiview_render', 'render_cameras']:
+                timer.instrument(self._window, method, 'draw')
+            for method in ['get_image', 'get_depth', 'get_segmentation']:
+                timer.instrument(self._window, method, 'readback')
+        return timer
+
+    def _build_recorder(self, path, chunk_size):
+        """
+        Replaces reset and step (in this instance) by versions recording their observations, actions, rewards, dones
+        and robot poses with a round_bot_recorder.TrajectoryRecorder, built at the first reset from its observation.
+        Rows of resets have 'firsts' set to True and null actions. Recorded steps raise a ValueError before the first reset
+        """
+        path = path.format(pid=os.getpid(), env=self.id)
+        reset, step = self.reset, self.step
+        model = self._model
+        action_space = self._controller.action_space
+        null_action = np.zeros(1 if getattr(self._controller, 'int_actions', False) else action_space.shape[0], dtype=np.float32)
+
+        def recorded_reset():
+            observation = reset()
+            if self._recorder is None:
+                fields = OrderedDict([('observations', (np.shape(observation), np.asarray(observation).dtype)),
+                                      ('actions', (null_action.shape, null_action.dtype)),
+                                      ('rewards', ((), np.float32)),
+                                      ('dones', ((), np.bool_)),
+                                      ('firsts', ((), np.bool_)),
+                                      ('positions', ((3,), np.float64)),
+                                      ('rotations', ((2,), np.float64)),
+                                      ])
+                self._recorder = round_bot_recorder.TrajectoryRecorder(path, fields, chunk_size=chunk_size)
+            self._recorder.append(observation, null_action, 0.0, False, True, model.robot_position, model.robot_rotation)
+            return observation
+
+        def recorded_step(action):
+            if self._recorder is None:
+                raise ValueError('reset must be called before step when recording (see record_path)')
+            observation, reward, done, info = step(action)
+            self._recorder.append(observation, action, reward, done, False, model.robot_position, model.robot_rotation)
+            return observation, reward, done, info
+
+        self.reset, self.step = recorded_reset, recorded_step
+
+    def close_recorder(self):
+        """
+        Writes the remaining rows of the recording (see set_metadata's record_path), stops its writer thread and closes it
+        """
+        if self._recorder is not None:
+            self._recorder.close()
+
+    def get_physics_counters(self):
+        """
+        Returns copies of the counters of the physics hot path (see round_bot_model.PHYSICS_COUNTERS), of the last update
+        of the model ('step', i.e the last repetition of the last action) and since the creation of the env ('total')
+        """
+        return {'step' : dict(self._model.physics_counters), 'total' : dict(self._model.physics_totals)}
+
+    def close_trace(self):
+        """
+        Writes the remaining events of the trace (see set_metadata's trace_path) and closes its file
+        """
+        if self._trace:
+            self._trace.close()
+
+    def get_perf_stats(self, reset=False):
+        """
+        Returns the statistics of durations of step phases (see round_bot_perf.PhaseTimer.stats), or None without perf_stats
+        nor trace_path.
+        Phases are 'act' (controller), 'update' (model, without collisions), 'collide', 'vertices' (upload of movable blocks),
+        'followers' (monitor windows), 'draw', 'readback', 'observation' (post-processing of images or positions),
+        'step' (total duration of steps) and 'reset'. Durations of phases exclude the durations of phases nested in them
+
+        Parameters
+        ----------
+        - reset : (Bool) whether to discard recorded durations after computing statistics
+        """
+        if not self._perf_timer:
+            return None
+        stats = self._perf_timer.stats()
+        if reset:
+            self._perf_timer.reset()
+        return stats
+
+    def observation_cache_stats(self):
+        """
+        Returns the statistics of the observation cache (hits, misses, hit_rate, size, nbytes), or None if there is no cache
+        """
+        return self._observation_cache.stats if self._observation_cache is not None else None
+
+    def memory_report(self):
+        """
+        Returns the memory used by the env, by category, in bytes
+
+        Returns
+        -------
+        - (OrderedDict) with :
+            'model_blocks' : blocks of the model (objects, vertices and other arrays, see round_bot_model.Model.memory_report)
+            'vertex_data' : vertex buffers of the windows, kept in host memory and copied on the GPU
+            'textures' : textures of the windows (on the GPU, and in host memory with software rendering)
+            'framebuffers' : offscreen framebuffers of the windows (cameras and render_poses) on the GPU
+            'observation_buffers' : arrays of the current observation, frame stack, observation pipeline and getters,
+                and buffers in which windows read images back
+            'caches' : observation cache and static backgrounds of windows
+            'total' : sum of categories
+            'details' : numbers of 'blocks', 'vertex_lists', 'textures' and 'windows', 'duplicate_texture_bytes'
+                (textures loaded again from an already loaded image) and 'mapped_atlas_bytes' (observation atlas images,
+                memory-mapped and shared by processes through the page cache, not counted in total)
+        """
+        windows = [w for w in [self._window, self._monitor_window] if w]
+        model = self._model.memory_report()
+        window_reports = [w.memory_report() for w in windows]
+        def windows_sum(key):
+            return sum(report[key] for report in window_reports)
+        buffers = [b for w in windows for b in w.image_buffers()]
+        roots = [self._current_observation, self._frame_stack, self._observation_pipeline, self._palette_indexer,
+                 self._get_observation, self._observe, self._stack_observation] + buffers
+        exclude = [self, self._model, self._controller, self._observation_cache, self._observation_atlas,
+                   self._perf_timer, self._trace] + windows
+        report = OrderedDict([('model_blocks', model['block_bytes']),
+                              ('vertex_data', windows_sum('vertex_bytes')),
+                              ('textures', windows_sum('texture_bytes')),
+                              ('framebuffers', windows_sum('framebuffer_bytes')),
+                              ('observation_buffers', round_bot_perf.array_bytes(roots, exclude)),
+                              ('caches', windows_sum('background_bytes')
+                                         + (self._observation_cache.nbytes if self._observation_cache is not None else 0)),
+                              ])
+        report['total'] = sum(report.values())
+        report['details'] = OrderedDict([('blocks', model['blocks']),
+                                         ('vertex_lists', windows_sum('vertex_lists')),
+                                         ('textures', windows_sum('textures')),
+                                         ('windows', len(windows)),
+                                         ('duplicate_texture_bytes', windows_sum('duplicate_texture_bytes')),
+                                         ('mapped_atlas_bytes', self._observation_atlas.images.nbytes if self._observation_atlas else 0),
+                                         ])
+        return report
+
+    def _observe(self):
+        """
+        Renders the current state of the model (which must already be updated) and returns the observation
         """
-        # update model and window
         # Use dt = 1.0 for updating doesn't change computation speed
         # Instead dt = 1.0 means that a speed of X will produce a X units displacement
-        if not self._multiview:
-            return lambda : self._window.step(1.0)
-        else:
-            return lambda : self._window.update(1.0)
+        self._window.update_shown_blocks()
+        self._window.step_followers(1.0)
+        self._perform_render()
+        return self._get_observation()
 
     def _build_observation_getter(self):
         """
         Builds the function for getting observation, given following initiliazation parameters : 
-            self._position_observations , self._normalize_observations, and self._position_observations
-        This way of doing allows clarity and fast processing of step function by avoiding calls to if statements and lambda functions
+            self._position_observations, self._multiview, self._normalize_observations, self._observation_pipeline
+            and self._observation_transformation
+        This way of doing allows clarity and fast processing of step function by avoiding calls to if statements
         """
-        if self._position_observations == 'all':
-            to_eval = 'self._model.position_observation(True)'
-        elif self._position_observations == 'one':
-            to_eval = 'self._model.position_observation(False)' 
-        elif self._multiview is not None:      
-            to_eval = 'self._window.multiview_render(self._multiview)'
-        else: # observations are arrays of positions of mobable blocks           
-            to_eval = 'self._window.get_image()'
-        
-        if self._normalize_observations:
-            if self._position_observations!='no':
+        if self._position_observations == 'ranges':
+            n_rays, fov, max_range = self._range_rays, self._range_fov, self._range_max()
+            get_ranges = lambda : self._model.range_observation(n_rays, fov, max_range)
+            if self._normalize_observations:
+                get_observation = lambda : get_ranges()/max_range
+            else:
+                get_observation = get_ranges
+        elif self._position_observations != 'no':
+            all_positions = (self._position_observations == 'all')
+            get_positions = lambda : self._model.position_observation(all_positions)
+            if self._normalize_observations:
                 w=self._model.world_info['width']
                 d=self._model.world_info['depth']
                 m = max(w,d)
-                to_eval += '/' + str([m,m,m,360.0,360.0]) # normalize position with m and rotation with 360                
+                # normalize position with m and rotation with 360
+                scale = np.array([m,m,m,360.0,360.0,360.0] if all_positions else [m,m,m,360.0,360.0])
+                get_observation = lambda : get_positions()/scale
+            else:
+                get_observation = get_positions
+        else:
+            pipeline = self._observation_pipeline
+            if self._cameras:
+                get_observation = self._window.render_cameras
+            elif self._observation_atlas:
+                atlas = self._observation_atlas
+                get_image = lambda : atlas.get_image(self._model)
+                get_observation = get_image if not pipeline else lambda : pipeline(get_image())
+            elif self._multiview is not None:
+                get_image = lambda : self._window.multiview_render(self._multiview)
+                get_observation = get_image if not pipeline else lambda : pipeline(get_image())
+            elif pipeline:
+                # read pixels in a preallocated buffer consumed by the pipeline
+                image = np.empty(self._window.image_shape, dtype=np.uint8)
+                get_observation = lambda : pipeline(self._window.get_image(out=image))
             else:
-                to_eval += '*2.0/255.0 - 1.0' # normalize from int [0:255] range to float [-1:1] range
+                get_observation = self._window.get_image
+            if self._palette_indexer:
+                indexer = self._palette_indexer
+                get_rgb = get_observation
+                get_observation = lambda : indexer(get_rgb())
+            if self._observation_channels != ['rgb']:
+                get_observation = self._build_channels_getter(get_observation)
 
         if self._observation_transformation:
-            to_eval = 'self._observation_transformation(' + to_eval + ')'
-        to_eval = 'lambda : ' + to_eval
-        return eval(to_eval,{'self':self}) # pass self as variable
+            transformation = self._observation_transformation
+            get_transformed = get_observation
+            get_observation = lambda : transformation(get_transformed())
+        return get_observation
+
+    def _build_channels_getter(self, get_rgb):
+        """
+        Builds the function getting the observation channels from the last drawn frame, given the function getting rgb images.
+        Several channels are returned in a dictionnary
+        """
+        # channels are read in this order since the segmentation overwrites rgb colors
+        getters = OrderedDict([('rgb', get_rgb),
+                               ('depth', self._window.get_depth),
+                               ('segmentation', self._window.get_segmentation)])
+        getters = [(channel, getters[channel]) for channel in self._observation_channels]
+        if len(getters) == 1:
+            return getters[0][1]
+        return lambda : OrderedDict([(channel, get_channel()) for channel, get_channel in getters])
+
+    def _build_channels_space(self):
+        """
+        Builds the observation space of observation channels, from the space of rgb observations
+        """
+        shape = self._window.channel_shape
+        near, far = self._window.clip_planes()
+        channel_spaces = OrderedDict([('rgb', self._observation_space),
+                                      ('depth', spaces.Box(low=near, high=far, shape=shape, dtype=np.float32)),
+                                      ('segmentation', spaces.Box(low=0, high=max(round_bot_window.SEGMENTATION_IDS.values()),
+                                                                  shape=shape, dtype=np.uint8))])
+        channel_spaces = [(channel, channel_spaces[channel]) for channel in self._observation_channels]
+        if len(channel_spaces) == 1:
+            return channel_spaces[0][1]
+        return spaces.Dict(OrderedDict(channel_spaces))
+
+    def _image_shape(self):
+        """
+        Returns the shape of rendered (or pre-rendered) images
+        """
+        if self._observation_atlas:
+            return tuple(self._observation_atlas.image_shape)
+        elif self._multiview is not None:
+            return (self._window.height, self._window.width, 3)
+        else:
+            return tuple(self._window.image_shape)
+
+    def _build_palette_indexer(self, metadata):
+        """
+        Builds the mapping from rendered rgb images to palette indices if asked
+
+        Returns
+        -------
+        - (round_bot_observation.PaletteIndexer) the mapping, or None if not asked
+        """
+        if not metadata['palette_observations']:
+            return None
+        # rendered colors are then exactly colors of the palette
+        self._window.set_texture_filter(nearest=True)
+        palette = round_bot_window.texture_palette(self._model)
+        if len(palette) > 256:
+            raise ValueError('palette_observations need at most 256 rendered colors, the textures of the world have '
+                             + str(len(palette)) + ' (e.g. trigger button)')
+        return round_bot_observation.PaletteIndexer(palette)
+
+    def _range_max(self):
+        """
+        Returns the range of rays of range observations without intersection, i.e the diagonal of the world
+        """
+        return float(np.hypot(self._model.world_info['width'], self._model.world_info['depth']))
+
+    def _build_observation_pipeline(self, steps):
+        """
+        Builds the pipeline post-processing image observations, with given steps and the normalization if asked
+
+        Returns
+        -------
+        - (round_bot_observation.ObservationPipeline) the pipeline, or None if there is no step
+        """
+        user_steps = list(steps) if steps else []
+        steps = list(user_steps)
+        step_names = [step if isinstance(step, str) else step[0] for step in steps]
+        if self._normalize_observations and not 'normalize' in step_names:
+            # normalize from int [0:255] range to float [-1:1] range
+            steps.append(('normalize',))
+        if self._position_observations != 'no' or not steps:
+            return None
+        if self._observation_atlas:
+            input_shape = self._observation_atlas.image_shape
+        elif self._multiview is not None:
+            input_shape = [self._window.height, self._window.width, 3]
+        else:
+            input_shape = self._window.image_shape
+        # observations are copied only when the pipeline is not explicitly asked, for backward compatibility
+        return round_bot_observation.ObservationPipeline(steps, input_shape, np.uint8, copy=not user_steps)
 
     def message(self, message):
         """
@@ -326,6 +949,8 @@ class RoundBotEnv(gym.Env):
         """
         if not (height > 0 and width > 0):
             raise ValueError('unvalid dimensions for monitor window')
+        if not self._window:
+            raise ValueError('cannot add a monitor window without main window (see observation_atlas)')
         if not self._monitor_window:
             self._monitor_window = round_bot_window.SecondaryWindow(
                                         self._model,
@@ -355,6 +980,23 @@ class RoundBotEnv(gym.Env):
             self._monitor_window = None
 
 
+def _freeze_space(space):
+    """
+    Makes the arrays defining a gym space read-only, so that the space can be shared instead of copied
+
+    Parameters
+    ----------
+    - space : (gym.spaces.Space) the space to freeze, in place
+    """
+    for name in ['low', 'high', 'nvec']:
+        array = getattr(space, name, None)
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    for subspace in getattr(space, 'spaces', {}) or {}:
+        # tuple spaces contain a list of spaces and dict spaces an ordered dict of spaces
+        _freeze_space(space.spaces[subspace] if isinstance(space.spaces, dict) else subspace)
+
+
 def set_metadata(world={'name':'square','size':[20,20]},
                 world_spec=[20,20],
                 texture='minecraft',
@@ -377,7 +1019,29 @@ def set_metadata(world={'name':'square','size':[20,20]},
                 distractors = False,
                 sandboxes=False,
                 trigger_button=False,
-                robot_diameter=2
+                robot_diameter=2,
+                action_repeat=1,
+                max_pool_frames=False,
+                frame_stack=None,
+                observation_pipeline=None,
+                observation_cache=None,
+                observation_cache_decimals=3,
+                observation_atlas=None,
+                observation_atlas_approximate=False,
+                static_background=False,
+                skip_unchanged_frames=False,
+                observation_channels=None,
+                range_rays=16,
+                range_fov=360.0,
+                image_layout=None,
+                palette_observations=False,
+                cameras=None,
+                perf_stats=False,
+                perf_stats_info=False,
+                trace_path=None,
+                trace_buffer_size=10000,
+                record_path=None,
+                record_chunk_size=10000,
                 ):
     """ static module method for setting loading variables before call to gym.make
 
@@ -397,17 +1061,84 @@ def set_metadata(world={'name':'square','size':[20,20]},
         - reward_count_stop: (int or False) If not False, stop when the sum of rewards (before normalization) reaches this value.
         - reward_stop : (Bool) Wether to stop when reaching positive reward            
         - random_start : (Bool) Randomly start from start positions or not
-        - normalize_observations : (Bool) Rescale observations from (int)[0:255] range to (float)[-1:1] with X -> X * 2.0/255 -1.0
+        - normalize_observations : (Bool) Rescale observations from (int)[0:255] range to (float32)[-1:1] with X -> X * 2.0/255 -1.0
         - normalize_rewards : (Bool) Rescale rewards to (float)[-1:1] range by dividing rewards by world's highest abs reward value
+            (per repetition, see action_repeat)
         - observation_transformation : (function) apply observation_transformation function to observations after normalization
         - position_observations: (str) ['no','one','all'] 
             no : disable option
             all : observations are not images (np.array([w,h,c])) but [X, Y, Z, rx, ry, rz] np.arrays of every moving blocks in the scene
             one : observations are not images (np.array([w,h,c])) but [X, Y, Z, rx, ry, rz] np.arrays of robot_block only
+            ranges : observations are not images but [1, range_rays] np.arrays of distances measured by a horizontal range sensor
+                (lidar) on the robot, computed from the model without rendering (see Model.range_observation).
+                Normalized ranges are divided by the diagonal of the world. No window is built, so that winsize,
+                image_layout and the human render mode cannot be used
         - distractors (Bool) : whether to add visual distractors on walls or not
         - sandboxes (Bool): whether to add sandboxes on the ground or not (slowing down the robot when crossed)
         - trigger_button (Bool): whether to add a trigger button 
         - robot_diameter (float): the radius of the robot block (half of diameter)
+        - action_repeat (int): number of times each action is repeated in a step. The model is updated at every
+            repetition but the observation is rendered only once, rewards are summed and repetitions stop when done
+            (normalized rewards, summed over repetitions, are in [-action_repeat, action_repeat])
+        - max_pool_frames (Bool): whether to return the pixel-wise maximum of the last two repetitions' frames
+            (only for image observations and action_repeat > 1)
+        - frame_stack (int or None): if not None, observations are the stacks of the frame_stack last observations,
+            kept in a preallocated ring buffer. Warning : returned stacks are views overwritten by next steps, copy them to keep them
+        - observation_pipeline (list(tuple) or None): steps post-processing image observations in preallocated buffers,
+            before observation_transformation. Ex: [('crop',(0,64,0,64)), ('resize',(32,32)), ('grayscale',), ('normalize','float16'), ('channel_first',)]
+            See round_bot_observation.ObservationPipeline. If normalize_observations is True a normalize step is appended if missing.
+            Warning : returned observations are buffers overwritten by next steps, copy them to keep them
+        - observation_cache (int or None): if not None, maximum number of bytes of a LRU cache of image observations keyed
+            on the robot pose (rounded to observation_cache_decimals) and the point of view, which skips rendering on hits.
+            Useful with lattice-valued controllers (XZ, XZF) without noise. Incompatible with distractors.
+            Cached observations are read-only. See RoundBotEnv.observation_cache_stats
+        - observation_cache_decimals (int): number of decimals of robot position and rotation in observation_cache keys
+        - observation_atlas (str or None): if not None, path prefix of an atlas baked with RoundBotEnv.bake_observation_atlas
+            from which observations are read instead of being rendered (no window nor OpenGL is used).
+            Needs a discrete controller without noise, no random start, no distractors nor trigger button.
+            Observations are read-only views of the atlas. Poses which were not baked raise a KeyError (see observation_atlas_approximate)
+        - observation_atlas_approximate (Bool): if True, poses which were not baked in the observation_atlas (e.g. beyond its
+            max_poses) are given the observation of the nearest baked pose with the same rotation instead of raising a KeyError
+        - static_background (Bool): with global_pov, static blocks (ground, walls, areas) are rendered once in a cached background,
+            and only movable blocks (robot, distractors) are rendered at each step over it
+        - skip_unchanged_frames (Bool): if True, the main window is not drawn nor read back again when the scene did not change
+            since the last observation (e.g null action or motion cancelled by a collision, without distractors),
+            and a copy of the last observation is returned instead
+        - observation_channels (list(str) or None): image channels read from the same rendered frame, among 'rgb' (default),
+            'depth' (float32 distances to the camera plane, between the clipping planes of the window) and 'segmentation'
+            (uint8 block types, see round_bot_window.SEGMENTATION_IDS). Depth and segmentation are shaped as [width, height, 1].
+            Segmentation costs a second draw pass of the shown blocks with flat colors (see round_bot_window.RoundBotWindow.get_segmentation).
+            With several channels, observations are dictionnaries of channels
+        - range_rays (int): number of rays of range observations (see position_observations)
+        - range_fov (float): field of view in degrees of range observations, centered on the robot's heading
+        - image_layout (dict or None): layout in which OpenGL reads image observations, with keys (all False by default) :
+            'flip' (rows ordered from the top of the image), 'channel_first' ([channels, height, width] instead of
+            [height, width, channels]) and 'grayscale' (single luminance channel, three times less bytes to read).
+            See RoundBotWindow.set_image_layout. If None, images are shaped as [width, height, 3] with rows from the bottom
+        - palette_observations (Bool): with colours texture, observations are uint8 images of indices in the palette of
+            rendered colors (RoundBotEnv.palette, index 0 is the sky) instead of RGB images, three times smaller.
+            Textures are then filtered with nearest texels, so that rendered colors are exactly colors of the palette
+        - cameras (dict or None): if not None, observations are dictionnaries of uint8 images [height, width, 3] (rows from the top)
+            rendered by several cameras from the same scene, in one offscreen pass and one read back. Cameras are given by names,
+            with keys 'size' ([width, height]), 'global_pov', 'perspective', 'focal' (as above, subjective perspective view of
+            the window's focal by default) and 'multiview' (list of angles of subjective views fused side by side).
+            Ex: {'ego':{'size':[64,64]}, 'top':{'size':[32,32],'global_pov':True}}. See RoundBotWindow.set_cameras.
+            Static_background and skip_unchanged_frames are not used by cameras
+        - perf_stats (Bool or int): if not False, durations of step phases (controller, model update and collisions, vertices
+            upload, drawing, readback, observation post-processing, monitor windows) are timed and kept in rolling windows
+            of perf_stats durations (1000 if True), see RoundBotEnv.get_perf_stats. If False, nothing is timed
+        - perf_stats_info (Bool): with perf_stats, the durations of phases of each step are added in its info['perf']
+        - trace_path (str or None): if not None, path of a Chrome trace file (chrome://tracing, Perfetto) in which the phases
+            of steps and resets are written as events, with the process ID and the env ID (RoundBotEnv.id) as thread ID.
+            '{pid}' and '{env}' in the path are replaced by these IDs, so that envs can write their own files
+            (see round_bot_perf.merge_traces). The file is complete once closed (see RoundBotEnv.close_trace)
+        - trace_buffer_size (int): number of trace events kept in memory before being written
+        - record_path (str or None): if not None, path prefix of files in which the rows (observation, action, reward, done,
+            first, robot position and rotation) of resets and steps are streamed by a background thread, in preallocated chunks
+            of record_chunk_size rows, with bounded memory. '{pid}' and '{env}' in the path are replaced as in trace_path.
+            Needs array observations, and a reset before the first step (which raises a ValueError otherwise). Read recordings with round_bot_recorder.TrajectoryReader,
+            they are complete once closed (see RoundBotEnv.close_recorder)
+        - record_chunk_size (int): number of rows of each chunk file of recordings
     """
     RoundBotEnv.metadata['world'] = world
     RoundBotEnv.metadata['texture'] = texture
@@ -431,6 +1162,28 @@ def set_metadata(world={'name':'square','size':[20,20]},
     RoundBotEnv.metadata['sandboxes'] = sandboxes
     RoundBotEnv.metadata['trigger_button'] = trigger_button
     RoundBotEnv.metadata['robot_diameter'] = robot_diameter
+    RoundBotEnv.metadata['action_repeat'] = action_repeat
+    RoundBotEnv.metadata['max_pool_frames'] = max_pool_frames
+    RoundBotEnv.metadata['frame_stack'] = frame_stack
+    RoundBotEnv.metadata['observation_pipeline'] = observation_pipeline
+    RoundBotEnv.metadata['observation_cache'] = observation_cache
+    RoundBotEnv.metadata['observation_cache_decimals'] = observation_cache_decimals
+    RoundBotEnv.metadata['observation_atlas'] = observation_atlas
+    RoundBotEnv.metadata['observation_atlas_approximate'] = observation_atlas_approximate
+    RoundBotEnv.metadata['static_background'] = static_background
+    RoundBotEnv.metadata['skip_unchanged_frames'] = skip_unchanged_frames
+    RoundBotEnv.metadata['observation_channels'] = observation_channels
+    RoundBotEnv.metadata['range_rays'] = range_rays
+    RoundBotEnv.metadata['range_fov'] = range_fov
+    RoundBotEnv.metadata['image_layout'] = image_layout
+    RoundBotEnv.metadata['palette_observations'] = palette_observations
+    RoundBotEnv.metadata['cameras'] = cameras
+    RoundBotEnv.metadata['perf_stats'] = perf_stats
+    RoundBotEnv.metadata['perf_stats_info'] = perf_stats_info
+    RoundBotEnv.metadata['trace_path'] = trace_path
+    RoundBotEnv.metadata['trace_buffer_size'] = trace_buffer_size
+    RoundBotEnv.metadata['record_path'] = record_path
+    RoundBotEnv.metadata['record_chunk_size'] = record_chunk_size
 
     
 
@@ -11,13 +11,27 @@ import random
 import copy
 import time
 import math
+import itertools
 from gym_round_bot.envs import round_bot_worlds
+from gym_round_bot.envs import round_bot_perf
 import numpy as np
+from collections import OrderedDict
 
 """
     This file defines the environment's Model (also Block class)
 """
 
+# counters of the physics hot path, maintained by Model.update and Model.collide (see Model.physics_counters) :
+#   - sub_motions : sub motions performed to check collisions
+#   - block_tests : overlap tests of the robot with collision blocks
+#   - contacts / crossable_contacts : overlaps with non crossable / crossable blocks
+#   - triggers : trigger buttons triggered
+#   - distractor_bounces : bounces of distractors against their bounding boxes
+PHYSICS_COUNTERS = ['sub_motions', 'block_tests', 'contacts', 'crossable_contacts', 'triggers', 'distractor_bounces']
+
+# numbers blocks in their order of creation (see Block.creation_index)
+_block_counter = itertools.count()
+
 def rotation_matrices(rx,ry,rz):
     """
     Return numpy rotation matrices along x,y,z    
@@ -32,6 +46,39 @@ def rotation_matrices(rx,ry,rz):
     return Rx, Ry, Rz
 
 
+def ray_ranges(origins, angles, boxes_min, boxes_max, max_range):
+    """
+    Computes the distances from origins to the first intersected box along horizontal rays, with a slab test
+    broadcast over all origins, rays and boxes at once
+
+    Parameters
+    ----------
+    - origins : (np.array) array of shape [B, 2] of x, z ray origins (e.g. positions of robots of several models)
+    - angles : (np.array) array of shape [B, N] of rays angles in radians in plane xOz
+    - boxes_min, boxes_max : (np.array) arrays of shape [M, 2] of x, z minimal and maximal corners of boxes
+    - max_range : (float) range of rays without intersection
+
+    Returns
+    -------
+    - (np.array) array of shape [B, N] of ranges, at most max_range
+    """
+    origins = np.asarray(origins, dtype=float)[:,np.newaxis,np.newaxis,:] # [B,1,1,2]
+    angles = np.asarray(angles, dtype=float)
+    directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1)[:,:,np.newaxis,:] # [B,N,1,2]
+    if len(boxes_min) == 0:
+        return np.full(angles.shape, float(max_range))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / directions
+        t1 = (boxes_min - origins) * inverse # [B,N,M,2]
+        t2 = (boxes_max - origins) * inverse
+    # entering and exiting distances of rays in boxes (nan when a ray lies on a slab border is ignored)
+    t_enter = np.nanmax(np.minimum(t1, t2), axis=-1)
+    t_exit = np.nanmin(np.maximum(t1, t2), axis=-1)
+    hit = t_exit >= np.maximum(t_enter, 0.0)
+    distances = np.where(hit, np.maximum(t_enter, 0.0), max_range) # rays starting inside a box have a null range
+    return np.minimum(np.min(distances, axis=-1), max_range)
+
+
 
 
 
@@ -67,6 +114,9 @@ class Block(object):
         if not friction > 0.0 and friction <= 1.0:
             raise ValueError('Block friction must be in range ]0,1] ')
         self.friction = friction
+        # blocks are drawn in their order of creation, which does not depend on the hash order of the model's sets,
+        # so that overlapping faces (e.g. coplanar tops of crossing walls) are rendered the same way by every window
+        self.creation_index = next(_block_counter)
 
         # return reward when collided
         self.collision_reward = collision_reward
@@ -440,9 +490,11 @@ class DistractorBlock(Block):
         if any( collision ):
            # collision detected, speed is inversed in the collision axis
            self._speed[collision] *= -1
+           return True
         else:
             # if no collision, validate new position
             self.position = new_position
+            return False
 
 ################################################################################################        
 class FlatDistractorBlock(DistractorBlock, FlatBlock):
@@ -495,11 +547,17 @@ class TriggerButtonBlock(BoundingBoxBlock):
         Parameter:
         ----------
         inCollision (bool) : True if block is collided, false if it is not
+
+        Returns
+        -------
+        (bool) : True if the button was triggered
         """
         # trigger the button only if the block is newly under collision
-        if not self.inCollision and inCollision :
+        triggered = not self.inCollision and inCollision
+        if triggered:
             self.trigger()
         self.inCollision = inCollision
+        return triggered
 
 
 
@@ -538,6 +596,13 @@ class Model(object):
         """
         # reference to windows
         self.windows = set()
+        # counter of scene changes, incremented whenever the rendering of the scene may change
+        # (robot pose, distractors, shown blocks, point of view), so that windows can skip unchanged frames
+        self.scene_version = 0
+        self._versioned_pose = None # robot pose at last increment of scene_version
+        # counter of structural changes of the scene (blocks added, removed, shown or hidden), which are not
+        # captured by the robot pose, so that observations cached before such a change can be discarded
+        self.structure_version = 0
         # A set of all visible blocks
         self.visible_blocks = set()
         # A set of all collision blocks
@@ -571,6 +636,11 @@ class Model(object):
         self.acceleration = None
         # maximum absolute possible reward in model, used for normalization
         self.max_reward=0.0
+        # x, z corners of blocks stopping range sensor rays, built when needed by range_observation
+        self._range_boxes = None
+        # counters of the physics hot path (see PHYSICS_COUNTERS) of the last update, and since the creation of the model
+        self.physics_counters = OrderedDict((name, 0) for name in PHYSICS_COUNTERS)
+        self.physics_totals = OrderedDict((name, 0) for name in PHYSICS_COUNTERS)
         # load world        
         self.load_world(world, texture, robot_diameter, distractors, sandboxes, trigger_button)
         self.flying, self.collided, self.current_reward = False, False, 0.0
@@ -602,7 +672,8 @@ class Model(object):
             self.robot_position[1] = start_area.y
 
         else:
-            self.robot_position = self.start_position
+            # copy since robot_position is modified in place when moving
+            self.robot_position = np.array(self.start_position)
 
         # First element is rotation of the player in the x-z plane (ground
         # plane) measured from the z-axis down. The second is the rotation
@@ -628,6 +699,9 @@ class Model(object):
 
         self.flying = False   
         self.collided = False     
+        # move the robot's block to its start pose (see RobotBlock._move), so that it is not rendered at its former pose
+        self.robot_block.translate_and_rotate_to(self.robot_position, np.array([0.0,-self.robot_rotation[0],0.0]))
+        self.scene_version += 1
 
     def add_block(self, components, texture=None, block_type='brick', visible=True, crossable=False, collision_reward=0.0, boundingBox=None, speed=1.):
         """ Add a block to the model depending on its type
@@ -688,6 +762,13 @@ class Model(object):
         if block.visible:
             self.visible_blocks.add(block)
 
+        # show the block in already opened windows
+        for w in self.windows:
+            self.show_block(block, w)
+        self.scene_version += 1
+        self.structure_version += 1
+        self._range_boxes = None
+
         # update max_reward value
         self.max_reward = max(self.max_reward, abs(block.collision_reward))
 
@@ -712,6 +793,9 @@ class Model(object):
         
         if block is self.robot_block:
             del self.robot_block
+        self.scene_version += 1
+        self.structure_version += 1
+        self._range_boxes = None
    
     def show_block(self, block, window):
         """ Show the block in given window
@@ -719,11 +803,13 @@ class Model(object):
         window.show_block(block)
         # the window object decides whether to actually show the block or not
         # depending on the block type, its option visible and so on
+        self.scene_version += 1
+        self.structure_version += 1
 
     def show_visible_blocks(self, window):
         """ Show all visible blocks at once
         """
-        for block in self.visible_blocks:
+        for block in sorted(self.visible_blocks, key=lambda b : b.creation_index):
             self.show_block(block, window)
     
 
@@ -733,7 +819,9 @@ class Model(object):
         """
         for w in self.windows:
             w.hide_block(block)
-        
+        self.scene_version += 1
+        self.structure_version += 1
+
 
     def get_motion_vector(self):
         """
@@ -788,15 +876,33 @@ class Model(object):
         - dt (float): The change in time since the last call.
         """
 
+        counters = self.physics_counters
+        for name in counters:
+            counters[name] = 0
         ### perform the absolute displacement of all moving blocks
         for b in self.movable_blocks :            
             # each block has its own moving policy (controled by actions, deterministic, semi-deterministic or stochastic)
             if b is self.robot_block:                
                 b._move(self, dt) # the robot blocks needs access to the model to know how to move
-            else :
-                b._move(dt)
+            elif b._move(dt): # distractors return whether they bounced
+                counters['distractor_bounces'] += 1
+        self._add_physics_totals()
+
+        ### increment the scene version if the robot moved or if distractors (which always move) exist
+        pose = (tuple(self.robot_position), tuple(self.robot_rotation))
+        if self.distractors or pose != self._versioned_pose:
+            self._versioned_pose = pose
+            self.scene_version += 1
        
 
+    def _add_physics_totals(self):
+        """
+        Adds the physics counters of the last update to the totals
+        """
+        totals = self.physics_totals
+        for name, count in self.physics_counters.items():
+            totals[name] += count
+
     def collide(self, motion_vector):
         """ Checks to see if the cylindric robot at the given new x,y,z position with given diameter and height
                 is colliding with any blocks in the world.
@@ -814,6 +920,8 @@ class Model(object):
         self.current_reward=0.0
         self.current_friction = 1.0
         collided=False
+        counters = self.physics_counters
+        n_blocks = len(self.collision_blocks)
 
         # compute the number of sub_motions to compute to check collisions and avoid wall crossing
         # don't know why need to put +1 but it works better
@@ -824,12 +932,15 @@ class Model(object):
             sub_motion_vector = (m*1.0/sub_motions)*motion_vector
             # reset collision reward for each new sub motion
             self.current_reward = 0
+            counters['sub_motions'] += 1
+            counters['block_tests'] += n_blocks
 
             for block in self.collision_blocks:
                 new_overlap = (block.dimensions+self.robot_block.dimensions)/2.0 - np.abs(self.robot_position+sub_motion_vector - block.position)
                 if all( new_overlap > 0):
                     try:
-                        block.collide(True) # signal to the block it has been collided
+                        if block.collide(True): # signal to the block it has been collided
+                            counters['triggers'] += 1
                     except NotImplementedError:
                         pass
                     # get block collision reward to be used in RL envs
@@ -846,8 +957,10 @@ class Model(object):
                         #  update motion_vector to cancel this collision
                         sub_motion_vector -= new_overlap * (old_overlap<0) * np.sign(motion_vector) *1.1
                         collided = True
+                        counters['contacts'] += 1
                     else:
                         self.under_collision_blocks.add(block) # add this block to the set of block currently under collision
+                        counters['crossable_contacts'] += 1
                 else:
                     try:
                         self.under_collision_blocks.remove(block)
@@ -863,6 +976,20 @@ class Model(object):
         return collided
 
 
+    def memory_report(self):
+        """
+        Returns the host memory used by the blocks of the model
+
+        Returns
+        -------
+        - (OrderedDict) the number of 'blocks' (including bounding boxes) and their 'block_bytes' (objects, attributes,
+            vertices and other arrays, texture coordinates, see round_bot_perf.object_bytes)
+        """
+        blocks = set().union(self.visible_blocks, self.collision_blocks, self.movable_blocks, self.start_areas,
+                             self.reward_blocks, self.distractors)
+        blocks.update([b._boundingBox for b in self.distractors])
+        return OrderedDict([('blocks', len(blocks)), ('block_bytes', sum(round_bot_perf.object_bytes(b) for b in blocks))])
+
     def load_world(self, world, texture, robot_diameter, distractors, sandboxes, trigger_button):
         """ Loads the world passed as string parameter
         """
@@ -915,9 +1042,312 @@ class Model(object):
             #only robot block
             return copy.deepcopy(np.reshape(np.concatenate( [self.robot_position, self.robot_rotation] ),[1,-1]) )
 
+    def range_observation(self, n_rays, fov, max_range):
+        """
+        Returns the ranges measured by a horizontal range sensor (lidar) on the robot, without any rendering.
+        Rays are stopped by non crossable collision blocks overlapping the height of the robot
+
+        parameters
+        ----------
+        - n_rays : (int) number of rays, evenly spread over the field of view
+        - fov : (float) field of view in degrees, centered on the robot's heading (360 for all around)
+        - max_range : (float) range of rays without intersection
+
+        returns
+        -------
+        np.array : array of shape [1, n_rays] of ranges, from the left to the right of the robot
+        """
+        if self._range_boxes is None:
+            # collision blocks do not move, so their corners are computed once
+            y, h = self.robot_position[1], self.robot_height
+            blocks = [b for b in self.collision_blocks if not b.crossable and abs(b.position[1]-y) < (b.dimensions[1]+h)/2.0]
+            centers = np.array([[b.position[0], b.position[2]] for b in blocks]).reshape(-1,2)
+            halves = np.array([[b.dimensions[0], b.dimensions[2]] for b in blocks]).reshape(-1,2)/2.0
+            self._range_boxes = (centers-halves, centers+halves)
+        # heading of the robot is the direction of forward motion (see get_motion_vector)
+        heading = self.robot_rotation[0] - 90.0
+        if fov >= 360.0:
+            offsets = np.arange(n_rays) * 360.0/n_rays - 180.0
+        else:
+            offsets = np.linspace(-fov/2.0, fov/2.0, n_rays)
+        angles = np.radians(heading + offsets)[np.newaxis,:]
+        origins = np.array([[self.robot_position[0], self.robot_position[2]]])
+        return ray_ranges(origins, angles, self._range_boxes[0], self._range_boxes[1], max_range)
+
     def switch_pov(self):
         """
         Switches point of view between subjective and global in windows
         """
         for w in self.windows:
             w.switch_pov()
+        self.scene_version += 1
+
+
+##################################################################################################################################################
+##################################################################################################################################################
+class MultiRobotModel(Model):
+
+    def __init__(self, n_robots=2, world={'name':'square','size':[20,20]}, texture='minecraft', robot_diameter=2, random_start_pos=True, random_start_rot=False, distractors=False, sandboxes=False, trigger_button=False):
+        """
+
+        Model of several robots sharing the same world, whose geometry and textures are loaded only once.
+        The state of robots is kept in arrays of shape [n_robots, ...] and their collisions, with the world's blocks
+        and with each other, are resolved for all robots at once. The first robot is also the model's robot_block
+        (robot_position and robot_rotation are views of its row in robots arrays), so that windows and observations
+        of Model can be used unchanged for it.
+
+        Robots are moved with set_robots_commands and update. Rewards of robots are those of their last update, also when
+        they do not move (Model keeps its current_reward then). Trigger buttons are not available, since they switch
+        the point of view of all windows
+
+        Parameters
+        ----------
+        - n_robots : (int) number of robots
+        - other parameters : see Model.__init__
+
+        Exceptions
+        ----------
+        - ValueError : if n_robots < 1 or if the world has trigger buttons
+        """
+        if n_robots < 1:
+            raise ValueError('n_robots must be at least 1')
+        self.n_robots = n_robots
+        self.robot_blocks = [] # robot blocks, in the order of robots arrays
+        # collision blocks as arrays, built when needed by collide_robots
+        self._collision_arrays = None
+        # robots states
+        self.robots_position = np.zeros([n_robots, 3])
+        self.robots_rotation = np.zeros([n_robots, 2])
+        self.robots_strafe = np.zeros([n_robots, 2])
+        self.robots_speed = np.zeros(n_robots) # rolling speeds
+        self.robots_friction = np.ones(n_robots) # frictions of ground under robots, applied at next move
+        self.robots_reward = np.zeros(n_robots) # collision rewards of last update
+        self.robots_collided = np.zeros(n_robots, dtype=bool) # whether robots collided at last update
+        super(MultiRobotModel,self).__init__(world=world, texture=texture, robot_diameter=robot_diameter, random_start_pos=random_start_pos,
+                                             random_start_rot=random_start_rot, distractors=distractors, sandboxes=sandboxes, trigger_button=trigger_button)
+
+    @property
+    def robot_position(self):
+        return self.robots_position[0]
+
+    @robot_position.setter
+    def robot_position(self, position):
+        self.robots_position[0] = position
+
+    @property
+    def robot_rotation(self):
+        return self.robots_rotation[0]
+
+    @robot_rotation.setter
+    def robot_rotation(self, rotation):
+        self.robots_rotation[0] = rotation
+
+    def load_world(self, world, texture, robot_diameter, distractors, sandboxes, trigger_button):
+        """ Loads the world passed as string parameter, with its robot, and adds the other robots
+        """
+        super(MultiRobotModel,self).load_world(world, texture, robot_diameter, distractors, sandboxes, trigger_button)
+        if any(b.block_type == 'trigger_button' for b in self.collision_blocks):
+            raise ValueError('MultiRobotModel cannot be used with trigger buttons, which switch the point of view of all windows')
+        robot = self.robot_block
+        for _ in range(self.n_robots-1):
+            self.add_block( list(robot.position)+list(robot.dimensions)+list(robot.rotation), texture=robot.texture, block_type='robot')
+
+    def add_block(self, components, texture=None, block_type='brick', visible=True, crossable=False, collision_reward=0.0, boundingBox=None, speed=1.):
+        """ Add a block to the model depending on its type (see Model.add_block).
+            Robot blocks are added to self.robot_blocks, the first one staying the model's robot_block
+        """
+        robot_block = getattr(self, 'robot_block', None)
+        block = super(MultiRobotModel,self).add_block(components, texture=texture, block_type=block_type, visible=visible, crossable=crossable,
+                                                      collision_reward=collision_reward, boundingBox=boundingBox, speed=speed)
+        if block_type == 'robot':
+            self.robot_blocks.append(block)
+            if robot_block:
+                self.robot_block = robot_block
+        self._collision_arrays = None
+        return block
+
+    def remove_block(self, block):
+        """ Remove the block (robots cannot be removed)
+        """
+        if block in self.robot_blocks:
+            raise ValueError('robots cannot be removed from a MultiRobotModel')
+        super(MultiRobotModel,self).remove_block(block)
+        self._collision_arrays = None
+
+    def reset(self):
+        """
+        Sets robots back to start positions and rotations. With random_start_pos, robots positions are sampled
+        in starting areas without overlapping each other, else robots are placed on a grid centered on the start position
+        """
+        w = self.robot_block.w
+        if self.random_start_pos:
+            positions = []
+            for _ in range(self.n_robots):
+                for _ in range(1000):
+                    Model.reset(self) # samples the position of the first robot
+                    position = np.array(self.robot_position)
+                    if all(np.any(np.abs(p-position) >= w) for p in positions):
+                        break
+                else:
+                    raise ValueError('cannot place ' + str(self.n_robots) + ' robots in starting areas without overlaps')
+                positions.append(position)
+            self.robots_position[:] = positions
+        else:
+            Model.reset(self)
+            side = int(np.ceil(np.sqrt(self.n_robots)))
+            grid = (np.arange(self.n_robots) % side, np.arange(self.n_robots) // side)
+            self.robots_position[:] = self.start_position
+            self.robots_position[:,0] += 1.5*w*(grid[0]-(side-1)/2.0)
+            self.robots_position[:,2] += 1.5*w*(grid[1]-(side-1)/2.0)
+            # robots moving from overlapping positions could not be stopped by collisions
+            centers, reaches, crossable = self._get_collision_arrays()[:3]
+            overlaps = np.all(reaches - np.abs(self.robots_position[:,np.newaxis,:] - centers) > 0, axis=2) & ~crossable
+            if np.any(overlaps):
+                raise ValueError('cannot place ' + str(self.n_robots) + ' robots around the start position without overlapping blocks')
+        self.robots_rotation[:] = self.start_rotation
+        if self.random_start_rot:
+            self.robots_rotation[:,0] = np.random.random(self.n_robots)*360-180
+        self.robots_strafe[:] = 0.0
+        self.robots_speed[:] = self.rolling_speed
+        self.robots_friction[:] = 1.0
+        self.robots_reward[:] = 0.0
+        self.robots_collided[:] = False
+        self._update_robot_blocks()
+
+    def _update_robot_blocks(self):
+        """ Moves robots blocks to robots positions and rotations (see RobotBlock._move)
+        """
+        for block, position, rotation in zip(self.robot_blocks, self.robots_position, self.robots_rotation[:,0]):
+            block.translate_and_rotate_to(position, np.array([0.0,-rotation,0.0]))
+        self.scene_version += 1
+
+    def set_robots_commands(self, strafes, speeds, dthetas):
+        """
+        Sets the commands of all robots for the next update, for instance from a discrete controller's action tables
+        (see round_bot_controller.DiscreteController.action_tables)
+
+        Parameters
+        ----------
+        - strafes : (np.array) array of shape [n_robots, 2] of robots strafes (see Model.reset)
+        - speeds : (np.array) array of shape [n_robots] of robots rolling speeds
+        - dthetas : (np.array) array of shape [n_robots] of rotation changes of robots in the xOz plane, applied immediately
+        """
+        self.robots_strafe[:] = strafes
+        self.robots_speed[:] = speeds
+        self.robots_rotation[:,0] = (self.robots_rotation[:,0]+dthetas+180.0)%360.0 -180.0
+
+    def get_robots_motion_vectors(self):
+        """
+        Returns the array of shape [n_robots, 3] of current motion directions of robots (see Model.get_motion_vector)
+        """
+        strafes = self.robots_strafe
+        angles = np.radians(self.robots_rotation[:,0] + np.degrees(np.arctan2(strafes[:,0], strafes[:,1])))
+        moving = np.any(strafes != 0.0, axis=1)
+        return np.stack([np.cos(angles)*moving, np.zeros(self.n_robots), np.sin(angles)*moving], axis=1)
+
+    def update(self, dt):
+        """
+        Moves distractors and all robots given their commands, resolving their collisions at once
+
+        Parameters
+        ----------
+        - dt (float): The change in time since the last call.
+        """
+        counters = self.physics_counters
+        for name in counters:
+            counters[name] = 0
+        for b in self.distractors:
+            if b._move(dt):
+                counters['distractor_bounces'] += 1
+        motion_vectors = self.get_robots_motion_vectors() * (dt*self.robots_speed*self.robots_friction)[:,np.newaxis]
+        self.collide_robots(motion_vectors)
+        self._update_robot_blocks()
+        self._add_physics_totals()
+
+    def _get_collision_arrays(self):
+        """
+        Returns the arrays of centers, half sums of dimensions with robots, crossable, collision rewards
+        and frictions of collision blocks
+        """
+        if self._collision_arrays is None:
+            # collision blocks do not move, so their arrays are built once
+            blocks = list(self.collision_blocks)
+            self._collision_arrays = (np.array([b.position for b in blocks]).reshape(-1,3),
+                                      (np.array([b.dimensions for b in blocks]).reshape(-1,3)+self.robot_block.dimensions)/2.0,
+                                      np.array([b.crossable for b in blocks], dtype=bool),
+                                      np.array([b.collision_reward for b in blocks], dtype=float),
+                                      np.array([b.friction for b in blocks], dtype=float))
+        return self._collision_arrays
+
+    def collide_robots(self, motion_vectors):
+        """
+        Moves all robots along their motion vectors, stopped by non crossable collision blocks and by each other,
+        and sets robots rewards, frictions and collision states. This is the vectorized Model.collide for all robots :
+        sub motions are performed for all robots at once, against all blocks and all other robots, and robots stop
+        at their first collision
+
+        Parameters
+        ----------
+        - motion_vectors : (np.array) array of shape [n_robots, 3] of robots motions
+        """
+        centers, reaches, crossable, rewards, frictions = self._get_collision_arrays()
+        dimensions = self.robot_block.dimensions
+        positions = self.robots_position
+        signs = np.sign(motion_vectors)
+        # overlaps before moving tell on which dimensions collisions happen, for blocks [K,B,3] and robots [K,K,3]
+        old_blocks_overlaps = reaches - np.abs(positions[:,np.newaxis,:] - centers)
+        old_robots_overlaps = dimensions - np.abs(positions[:,np.newaxis,:] - positions)
+        others = ~np.eye(self.n_robots, dtype=bool)
+
+        friction = np.ones(self.n_robots)
+        reward = np.zeros(self.n_robots)
+        collided = np.zeros(self.n_robots, dtype=bool)
+        sub_motion_vectors = np.zeros_like(motion_vectors)
+        sub_motions = int(np.max(np.ceil(np.abs(motion_vectors)/dimensions)))+1
+        counters = self.physics_counters
+        for m in range(1,sub_motions+1):
+            # robots which collided stay at their last sub motion
+            sub_motion_vectors[~collided] = (m*1.0/sub_motions)*motion_vectors[~collided]
+            new_positions = positions + sub_motion_vectors
+            blocks_overlaps = reaches - np.abs(new_positions[:,np.newaxis,:] - centers)
+            hits = np.all(blocks_overlaps > 0, axis=2) & ~collided[:,np.newaxis]
+            # as in Model.collide, negative rewards beat positive ones which sum up
+            hits_rewards = np.where(hits, rewards, 0.0)
+            negative = np.min(hits_rewards, axis=1, initial=0.0)
+            reward[~collided] = np.where(negative < 0, negative, np.sum(np.maximum(hits_rewards, 0.0), axis=1))[~collided]
+            friction = np.minimum(friction, np.min(np.where(hits, frictions, 1.0), axis=1, initial=1.0))
+            # cancel overlaps on dimensions which were not overlapping before the move (blocks only touching included)
+            blocking = hits & ~crossable
+            corrections = np.max(blocks_overlaps*(blocking[:,:,np.newaxis] & (old_blocks_overlaps <= 0)), axis=1, initial=0.0)
+            robots_overlaps = dimensions - np.abs(new_positions[:,np.newaxis,:] - new_positions)
+            contacts = np.all(robots_overlaps > 0, axis=2) & others
+            corrections = np.maximum(corrections, np.max(robots_overlaps*(contacts[:,:,np.newaxis] & (old_robots_overlaps <= 0)),
+                                                         axis=1, initial=0.0))
+            new_collided = (np.any(blocking, axis=1) | np.any(contacts, axis=1)) & ~collided
+            # robots which already collided are not tested anymore
+            counters['sub_motions'] += 1
+            counters['block_tests'] += int(np.sum(~collided))*len(centers)
+            counters['contacts'] += int(np.sum(blocking)) + int(np.sum(contacts[~collided]))
+            counters['crossable_contacts'] += int(np.sum(hits & crossable))
+            sub_motion_vectors[new_collided] -= (corrections*signs*1.1)[new_collided]
+            collided |= new_collided
+            if np.all(collided):
+                break
+
+        # corrections may push robots into other blocks or robots, in which case they stay at their previous position
+        for _ in range(self.n_robots):
+            new_positions = positions + sub_motion_vectors
+            blocked = np.any(np.all(reaches - np.abs(new_positions[:,np.newaxis,:] - centers) > 0, axis=2) & ~crossable, axis=1)
+            blocked |= np.any(np.all(dimensions - np.abs(new_positions[:,np.newaxis,:] - new_positions) > 0, axis=2) & others, axis=1)
+            blocked &= np.any(sub_motion_vectors != 0.0, axis=1)
+            if not np.any(blocked):
+                break
+            sub_motion_vectors[blocked] = 0.0
+            collided |= blocked
+
+        self.robots_position += sub_motion_vectors
+        self.robots_friction[:] = friction
+        self.robots_reward[:] = reward
+        self.robots_collided[:] = collided
+        self.current_reward = float(np.sum(reward))
+        self.collided = bool(np.any(collided))
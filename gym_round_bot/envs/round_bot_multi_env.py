@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import gym
+
+from gym import spaces
+from gym.utils import seeding
+
+from gym_round_bot.envs import round_bot_window
+from gym_round_bot.envs import round_bot_model
+from gym_round_bot.envs import round_bot_controller
+
+import numpy as np
+
+"""
+    This file defines a multi-agent environment : several robots share one MultiRobotModel (the world's geometry
+    and textures are loaded once), are moved at once with the action tables of a discrete controller, and their
+    subjective views are rendered by one window in one pass (see RoundBotWindow.set_cameras)
+"""
+
+
+class MultiRoundBotEnv(gym.Env):
+
+    metadata = {'render.modes': ['rgb_array']}
+
+    def __init__(self):
+        """
+        Inits the attributes to None.
+        """
+        self._world = None
+        self._texture = None
+        self._n_robots = None
+        self._model = None
+        self._window = None
+        self._controller = None
+        self._action_space = None
+        self._observation_space = None
+        self._current_observation = None
+        self._crash_stop = None
+        self._reward_stop = None
+        self._normalize_rewards = None
+        self._load() # load with metadata variables
+
+    def __del__(self):
+        """
+        Cleans the env object before env deletion
+        """
+        if self._window:
+            try:
+                self._window.close()
+            except ImportError: # happens sometimes
+                pass
+
+    @property
+    def n_robots(self):
+        return self._n_robots
+
+    @property
+    def action_space(self):
+        """ Returns the space of tuples of actions of every robot, in the controller's action space
+        """
+        return self._action_space
+
+    @property
+    def observation_space(self):
+        return self._observation_space
+
+    @property
+    def controller(self):
+        return self._controller
+
+    @property
+    def ground_truth(self):
+        """ Returns current ground truth, i.e robots positions and rotations. Warning : return copy and not the object
+        """
+        return np.copy(self._model.robots_position), np.copy(self._model.robots_rotation)
+
+    def step(self, actions):
+        """
+        Performs one step of all robots
+
+        Parameters
+        ----------
+        - actions : (tuple) actions of every robot, as ints if the controller has int_actions else as tuples
+
+        Returns
+        -------
+        - (np.array) uint8 array of shape [n_robots, height, width, 3] of subjective views of robots (rows from the top).
+            Warning : it is a buffer overwritten by next steps, copy it to keep it
+        - (np.array) array of shape [n_robots] of rewards of robots
+        - (Bool) whether any robot is done
+        - (dict) info, with 'robots_done' and 'robots_collided' arrays of shape [n_robots]
+        """
+        if self._controller.int_actions:
+            indices = np.asarray(actions, dtype=int)
+        else:
+            indices = self._controller.actions_to_indices(actions)
+        strafes, speeds, dthetas = self._controller.action_tables(indices)
+        noise_ratio = self._controller.noise_ratio
+        if noise_ratio:
+            # noise of speeds and rotations of all robots, drawn at once from the controller's pre-generated samples
+            noise = self._controller.noise.sample(np.abs(np.stack([speeds, dthetas]))*noise_ratio)
+            speeds = speeds + noise[0]
+            dthetas = dthetas + noise[1]
+        self._model.set_robots_commands(strafes, speeds, dthetas)
+        self._model.update(1.0)
+
+        rewards = np.copy(self._model.robots_reward)
+        dones = ((rewards < 0) & bool(self._crash_stop)) | ((rewards > 0) & bool(self._reward_stop))
+        if self._normalize_rewards:
+            rewards /= self._model.max_reward # normalize values in [-1,1] float range
+        self._current_observation = self._observe()
+        info = {'robots_done' : dones, 'robots_collided' : np.copy(self._model.robots_collided)}
+        return self._current_observation, rewards, bool(np.any(dones)), info
+
+    def reset(self):
+        """
+        Resets the state of the environment, returning an initial observation (see step)
+        """
+        self._model.reset()
+        self._current_observation = self._observe()
+        return self._current_observation
+
+    def render(self, mode='rgb_array', close=False):
+        if mode == 'rgb_array':
+            return self._current_observation
+        else:
+            raise ValueError('Unknown render mode: '+mode)
+
+    def seed(self, seed=None):
+        seed = seeding.np_random(seed)
+        # seed the actuation noise of the controller, shared by robots
+        self._controller.seed(seed[1] % 2**32)
+        return [seed]
+
+    def _observe(self):
+        """
+        Renders the subjective views of all robots (the model must already be updated)
+        """
+        self._window.update_shown_blocks()
+        return self._window.render_cameras(as_array=True)
+
+    def _load(self):
+        """
+        Loads a world into environnement with metadata vars
+
+        Parameters used in metadata for loading :
+            -> see in set_metada method
+        """
+        metadata = MultiRoundBotEnv.metadata
+        controller = metadata['controller']
+        if not controller.discrete or controller.controllerType == 'XZ fixed':
+            # rotations of XZ fixed controllers depend on robot positions and are not tabulated
+            raise ValueError('MultiRoundBotEnv needs a discrete controller with action tables (Theta, Theta2 or XZ)')
+
+        self._world = metadata['world']
+        self._texture = metadata['texture']
+        self._n_robots = metadata['n_robots']
+        self._controller = controller
+        # the controller's noise blocks hold the noise of the speeds and rotations of all robots for 2048 steps
+        controller.noise.block_size = 2*self._n_robots*2048
+        self._crash_stop = metadata['crash_stop']
+        self._reward_stop = metadata['reward_stop']
+        self._normalize_rewards = metadata['normalize_rewards']
+        self._model = round_bot_model.MultiRobotModel(n_robots=self._n_robots,
+                                                      world=metadata['world'],
+                                                      texture=metadata['texture'],
+                                                      robot_diameter=metadata['robot_diameter'],
+                                                      random_start_pos=metadata['random_start'],
+                                                      random_start_rot=('Theta' in controller.controllerType),
+                                                      distractors=metadata['distractors'],
+                                                      sandboxes=metadata['sandboxes'],
+                                                      trigger_button=metadata['trigger_button'],
+                                                      )
+        # one hidden window renders the subjective views of all robots
+        self._window = round_bot_window.MainWindow(self._model,
+                                                   global_pov=None,
+                                                   perspective=True,
+                                                   interactive=False,
+                                                   focal=metadata['focal'],
+                                                   width=metadata['obssize'][0],
+                                                   height=metadata['obssize'][1],
+                                                   caption='Round bots in '+self._world['name']+' world',
+                                                   resizable=False,
+                                                   visible=False
+                                                   )
+        # zero padded names keep cameras in the order of robots
+        self._window.set_cameras({'robot_'+str(k).zfill(len(str(self._n_robots))) : {'size' : metadata['obssize'], 'robot' : k}
+                                  for k in range(self._n_robots)})
+
+        self._action_space = spaces.Tuple([controller.action_space]*self._n_robots)
+        self._observation_space = spaces.Box(low=0, high=255, shape=(self._n_robots, metadata['obssize'][1], metadata['obssize'][0], 3),
+                                             dtype=np.uint8)
+
+
+def set_metadata(n_robots=2,
+                world={'name':'square','size':[20,20]},
+                texture='minecraft',
+                controller=round_bot_controller.make(name='Theta',dtheta=20,speed=1,int_actions=False,xzrange=[2,2],thetarange=2),
+                obssize=[16,16],
+                focal=65.0,
+                crash_stop=False,
+                reward_stop=False,
+                random_start=True,
+                normalize_rewards=False,
+                distractors=False,
+                sandboxes=False,
+                trigger_button=False,
+                robot_diameter=2,
+                ):
+    """ static module method for setting loading variables before call to gym.make('MultiRoundBot-v0')
+
+        parameters :
+        -----------
+        - n_robots : (int) number of robots sharing the world
+        - controller : (round_bot_controller.DiscreteController) controller whose action tables move all robots (Theta, Theta2 or XZ).
+            It is not plugged to the model and can thus be shared by several envs
+        - obssize : (list(int)) [width, height] of subjective views of robots
+        - crash_stop, reward_stop : (Bool) whether robots are done when crashing in a wall / when reaching positive reward
+        - trigger_button : (Bool) trigger buttons are not available (see round_bot_model.MultiRobotModel) :
+            loading the env raises a ValueError if True
+        - other parameters : see round_bot_env.set_metadata
+    """
+    MultiRoundBotEnv.metadata['n_robots'] = n_robots
+    MultiRoundBotEnv.metadata['world'] = world
+    MultiRoundBotEnv.metadata['texture'] = texture
+    MultiRoundBotEnv.metadata['controller'] = controller
+    MultiRoundBotEnv.metadata['obssize'] = obssize
+    MultiRoundBotEnv.metadata['focal'] = focal
+    MultiRoundBotEnv.metadata['crash_stop'] = crash_stop
+    MultiRoundBotEnv.metadata['reward_stop'] = reward_stop
+    MultiRoundBotEnv.metadata['random_start'] = random_start
+    MultiRoundBotEnv.metadata['normalize_rewards'] = normalize_rewards
+    MultiRoundBotEnv.metadata['distractors'] = distractors
+    MultiRoundBotEnv.metadata['sandboxes'] = sandboxes
+    MultiRoundBotEnv.metadata['trigger_button'] = trigger_button
+    MultiRoundBotEnv.metadata['robot_diameter'] = robot_diameter
+
+
+set_metadata() # loading with default values
@@ -0,0 +1,345 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import numpy as np
+from collections import OrderedDict
+
+"""
+    This file defines helpers for building observations from rendered frames (no OpenGL here)
+"""
+
+################################################################################################################################
+class FrameStack(object):
+    """
+    Stack of the last k observations kept in a preallocated ring buffer.
+
+    The buffer holds 2*k frames and each frame is written twice (at slot i and i+k), so that the k last frames
+    are always available as a contiguous view of the buffer, ordered from oldest to newest, without any concatenation.
+    """
+    def __init__(self, k, frame_shape, dtype):
+        """
+        Parameters
+        ----------
+        - k : (int) number of stacked frames
+        - frame_shape : (tuple(int)) shape of one frame
+        - dtype : (np.dtype) type of frames
+        """
+        if not k >= 1:
+            raise ValueError('FrameStack must stack at least one frame')
+        self._k = k
+        self._buffer = np.zeros((2*k,)+tuple(frame_shape), dtype=dtype)
+        self._index = 0 # slot of the next frame
+
+    @property
+    def k(self):
+        return self._k
+
+    @property
+    def next_frame(self):
+        """
+        Slot in which the next frame can be written directly before calling append() without frame
+        """
+        return self._buffer[self._index]
+
+    @property
+    def stacked(self):
+        """
+        Returns the view of the k last frames, ordered from oldest to newest.
+        Warning : the view is overwritten by next appends, use materialize() to keep a copy
+        """
+        return self._buffer[self._index:self._index+self._k]
+
+    def materialize(self):
+        """
+        Returns a contiguous copy of the k last frames, which is not modified by next appends
+        """
+        return self.stacked.copy()
+
+    def append(self, frame=None):
+        """
+        Appends a frame to the stack
+
+        Parameters
+        ----------
+        - frame : (np.array) frame to append. If None, the frame is assumed to be already written in next_frame
+
+        Returns
+        -------
+        - (np.array) the view of the k last frames
+        """
+        slot = self._buffer[self._index]
+        if frame is not None:
+            slot[...] = frame
+        # mirror the frame so that the k last frames stay contiguous
+        self._buffer[self._index+self._k] = slot
+        self._index = (self._index+1) % self._k
+        return self.stacked
+
+    def reset(self, frame):
+        """
+        Fills the whole stack with the same frame (typically the first observation of an episode)
+
+        Returns
+        -------
+        - (np.array) the view of the k last frames
+        """
+        # copy first since frame may be a view of the buffer itself
+        self._buffer[...] = np.array(frame, copy=True)
+        self._index = 0
+        return self.stacked
+
+
+################################################################################################################################
+class ObservationPipeline(object):
+    """
+    Composable post-processing of image observations.
+
+    The pipeline is compiled once for a given input shape and type : every step writes into its own preallocated
+    buffer, so that no full-frame temporary array is created at each call.
+    Steps are given as tuples (name, arg1, ...) or as names only, and are applied in the given order :
+        - ('crop', (start0, stop0, start1, stop1)) : crops the two first axes (no copy)
+        - ('resize', (size0, size1)) : nearest neighbour resizing of the two first axes
+        - ('grayscale',) : luminance of the RGB channels, keeping a channel axis of size 1
+        - ('normalize', dtype, low, high) : rescales uint8 values from [0:255] to [low:high] with a lookup table.
+            Defaults are 'float32', -1.0, 1.0 ('float16' halves memory again)
+        - ('channel_first',) : transposes [dim0, dim1, channels] frames to [channels, dim0, dim1]
+    """
+    def __init__(self, steps, input_shape, input_dtype=np.uint8, copy=False):
+        """
+        Parameters
+        ----------
+        - steps : (list(tuple or str)) steps of the pipeline (see class description)
+        - input_shape : (tuple(int)) shape of the frames given to the pipeline
+        - input_dtype : (np.dtype) type of the frames given to the pipeline
+        - copy : (Bool) whether to return a copy of the last buffer instead of the buffer itself,
+            which is overwritten at next call
+        """
+        self._functions = []
+        shape, dtype = tuple(input_shape), np.dtype(input_dtype)
+        # bounds of values, only changed by normalization
+        self.output_low, self.output_high = 0, 255
+        for step in steps:
+            if isinstance(step, str):
+                step = (step,)
+            name, args = step[0], step[1:]
+            try:
+                build = getattr(self, '_build_'+name)
+            except AttributeError:
+                raise ValueError('Unknown observation pipeline step : ' + str(name))
+            function, shape, dtype = build(shape, dtype, *args)
+            self._functions.append(function)
+        self._copy = copy
+        self.output_shape = shape
+        self.output_dtype = dtype
+
+    def __call__(self, frame):
+        """
+        Applies the pipeline to frame and returns the result
+        """
+        for function in self._functions:
+            frame = function(frame)
+        return frame.copy() if self._copy else frame
+
+    @staticmethod
+    def _build_crop(shape, dtype, box):
+        start0, stop0, start1, stop1 = box
+        if not (0 <= start0 < stop0 <= shape[0] and 0 <= start1 < stop1 <= shape[1]):
+            raise ValueError('crop box ' + str(box) + ' does not fit frames of shape ' + str(shape))
+        function = lambda frame : frame[start0:stop0, start1:stop1]
+        return function, (stop0-start0, stop1-start1)+shape[2:], dtype
+
+    @staticmethod
+    def _build_resize(shape, dtype, size):
+        # nearest neighbour indices along the two first axes
+        indices0 = (np.arange(size[0]) * shape[0] // size[0]).astype(np.intp)
+        indices1 = (np.arange(size[1]) * shape[1] // size[1]).astype(np.intp)
+        rows = np.empty((size[0], shape[1])+shape[2:], dtype=dtype)
+        out = np.empty((size[0], size[1])+shape[2:], dtype=dtype)
+        def function(frame):
+            np.take(frame, indices0, axis=0, out=rows)
+            return np.take(rows, indices1, axis=1, out=out)
+        return function, out.shape, dtype
+
+    @staticmethod
+    def _build_grayscale(shape, dtype):
+        if len(shape) != 3 or shape[2] != 3:
+            raise ValueError('grayscale step needs RGB frames of shape [dim0, dim1, 3]')
+        luminance = np.empty(shape[:2], dtype=np.float32)
+        channel = np.empty(shape[:2], dtype=np.float32)
+        out = np.empty(shape[:2]+(1,), dtype=dtype)
+        # round to nearest value for integer types (truncated when cast)
+        offset = 0.5 if np.issubdtype(dtype, np.integer) else 0.0
+        def function(frame):
+            np.multiply(frame[:,:,0], 0.299, out=luminance)
+            np.multiply(frame[:,:,1], 0.587, out=channel)
+            np.add(luminance, channel, out=luminance)
+            np.multiply(frame[:,:,2], 0.114, out=channel)
+            np.add(luminance, channel, out=luminance)
+            np.add(luminance, offset, out=luminance)
+            np.copyto(out[:,:,0], luminance, casting='unsafe')
+            return out
+        return function, out.shape, dtype
+
+    def _build_normalize(self, shape, dtype, out_dtype='float32', low=-1.0, high=1.0):
+        if dtype != np.uint8:
+            raise ValueError('normalize step needs uint8 frames')
+        self.output_low, self.output_high = low, high
+        lookup_table = (low + np.arange(256)*(high-low)/255.0).astype(out_dtype)
+        out = np.empty(shape, dtype=out_dtype)
+        function = lambda frame : np.take(lookup_table, frame, out=out)
+        return function, shape, out.dtype
+
+    @staticmethod
+    def _build_channel_first(shape, dtype):
+        if len(shape) != 3:
+            raise ValueError('channel_first step needs frames of shape [dim0, dim1, channels]')
+        out = np.empty((shape[2], shape[0], shape[1]), dtype=dtype)
+        def function(frame):
+            out[...] = frame.transpose(2, 0, 1)
+            return out
+        return function, out.shape, dtype
+
+
+################################################################################################################################
+def pose_key(model, decimals=3):
+    """
+    Returns the quantized pose of the model's robot, usable as a dictionnary key
+
+    Parameters
+    ----------
+    - model : (round_bot_model.Model) the model
+    - decimals : (int) number of decimals kept in position and rotation values
+
+    Returns
+    -------
+    - (tuple(float)) x, y, z position and two rotation angles of the robot, rounded
+    """
+    x, y, z = model.robot_position
+    rx, ry = model.robot_rotation
+    return (round(x, decimals), round(y, decimals), round(z, decimals), round(rx, decimals), round(ry, decimals))
+
+
+################################################################################################################################
+class ObservationCache(object):
+    """
+    Least recently used cache of observations, with a memory cap.
+    Cached observations are read-only copies
+    """
+    def __init__(self, max_bytes):
+        """
+        Parameters
+        ----------
+        - max_bytes : (int) maximum number of bytes of cached observations. Least recently used ones are evicted above it
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the observation cached with key, or None if there is none
+        """
+        try:
+            observation = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # reinsert as most recently used
+        self._entries[key] = observation
+        self.hits += 1
+        return observation
+
+    def put(self, key, observation):
+        """
+        Caches a read-only copy of observation with key, evicting least recently used observations if needed
+        """
+        observation = np.array(observation, copy=True)
+        observation.flags.writeable = False
+        old_observation = self._entries.pop(key, None)
+        if old_observation is not None:
+            self.nbytes -= old_observation.nbytes
+        self._entries[key] = observation
+        self.nbytes += observation.nbytes
+        while self.nbytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """
+        Removes all cached observations (statistics are kept)
+        """
+        self._entries.clear()
+        self.nbytes = 0
+
+    @property
+    def stats(self):
+        """
+        Returns a dictionnary of cache statistics
+        """
+        requests = self.hits + self.misses
+        return {'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : self.hits/float(requests) if requests else 0.0,
+                'size' : len(self._entries),
+                'nbytes' : self.nbytes,
+                }
+
+
+################################################################################################################################
+class PaletteIndexer(object):
+    """
+    Maps RGB frames to frames of indices in a palette of colors, one uint8 index per pixel.
+
+    Pixels whose color is exactly in the palette are mapped with a binary search on packed colors, the other ones
+    (if any, e.g. blended colors) are mapped to the nearest color of the palette
+    """
+    def __init__(self, palette):
+        """
+        Parameters
+        ----------
+        - palette : (np.array) uint8 array of shape [n_colors, 3] of distinct RGB colors, with n_colors <= 256
+        """
+        palette = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+        if not 0 < len(palette) <= 256:
+            raise ValueError('palette must have between 1 and 256 colors')
+        self.palette = palette
+        self.palette.flags.writeable = False
+        codes = self._pack(palette)
+        if len(np.unique(codes)) != len(codes):
+            raise ValueError('palette colors must be distinct')
+        self._order = np.argsort(codes).astype(np.uint8)
+        self._sorted_codes = codes[self._order]
+
+    @staticmethod
+    def _pack(colors):
+        """
+        Packs RGB colors of shape [..., 3] into int32 codes of shape [...]
+        """
+        colors = colors.astype(np.int32)
+        return (colors[...,0] << 16) | (colors[...,1] << 8) | colors[...,2]
+
+    def __call__(self, frame):
+        """
+        Returns the uint8 frame of palette indices of the RGB frame of shape [..., 3], with shape [...]
+        """
+        codes = self._pack(frame)
+        positions = np.searchsorted(self._sorted_codes, codes)
+        np.minimum(positions, len(self._sorted_codes)-1, out=positions)
+        indices = self._order[positions]
+        unknown = self._sorted_codes[positions] != codes
+        if unknown.any():
+            # map colors which are not in the palette to the nearest one
+            colors = frame[unknown].astype(np.int32)
+            distances = np.sum(np.square(colors[:,np.newaxis,:] - self.palette.astype(np.int32)), axis=-1)
+            indices[unknown] = np.argmin(distances, axis=1)
+        return indices
@@ -0,0 +1,337 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+from collections import OrderedDict
+
+"""
+    This file defines performance instrumentation helpers. They are only built when asked, by replacing methods
+    of instrumented objects with timed versions, so that uninstrumented code runs unchanged.
+    It also defines helpers measuring the host memory used by objects (see RoundBotEnv.memory_report)
+"""
+
+# monotonic clock with the highest available resolution (time.perf_counter does not exist in python 2)
+clock = getattr(time, 'perf_counter', time.time)
+
+
+################################################################################################################################
+class PhaseTimer(object):
+    """
+    Times phases of the step loop and keeps the last durations of each phase in a rolling window,
+    from which statistics and histograms are computed on demand.
+    Phases can be nested : durations of phases exclude the durations of phases called during them.
+    Phases can also be traced as events of a TraceWriter, with their whole durations
+    """
+    def __init__(self, window=1000, trace=None):
+        """
+        Parameters
+        ----------
+        - window : (int) number of last durations kept for each phase
+        - trace : (TraceWriter) writer of phases events, None for no trace
+        """
+        self.window = window
+        self.trace = trace
+        self._durations = OrderedDict() # ring buffers of durations by phase
+        self._counts = OrderedDict() # number of durations recorded by phase
+        self._nested = 0.0 # duration of phases nested in the current one
+        self._step_durations = {} # durations of phases in the current step
+
+    def _record(self, phase, duration):
+        """
+        Records the duration of a phase
+        """
+        try:
+            count = self._counts[phase]
+        except KeyError:
+            # python lists are faster than np.arrays for setting single values
+            self._durations[phase] = [0.0]*self.window
+            count = 0
+        self._durations[phase][count % self.window] = duration
+        self._counts[phase] = count + 1
+        step_durations = self._step_durations
+        step_durations[phase] = step_durations[phase] + duration if phase in step_durations else duration
+
+    def wrap(self, phase, function):
+        """
+        Returns a timed version of function, whose durations are recorded in phase
+        """
+        record = self._record
+        if self.trace is None:
+            def timed(*args, **kwargs):
+                nested = self._nested
+                self._nested = 0.0
+                start = clock()
+                result = function(*args, **kwargs)
+                duration = clock() - start
+                record(phase, duration - self._nested)
+                self._nested = nested + duration
+                return result
+        else:
+            event = self.trace.event
+            def timed(*args, **kwargs):
+                nested = self._nested
+                self._nested = 0.0
+                start = clock()
+                result = function(*args, **kwargs)
+                duration = clock() - start
+                record(phase, duration - self._nested)
+                event(phase, start, duration)
+                self._nested = nested + duration
+                return result
+        return timed
+
+    def instrument(self, instance, method, phase):
+        """
+        Replaces a method of instance by its timed version (only in this instance), if instance has this method
+
+        Returns
+        -------
+        - (Bool) whether the method was instrumented
+        """
+        function = getattr(instance, method, None)
+        if function is None:
+            return False
+        setattr(instance, method, self.wrap(phase, function))
+        return True
+
+    def wrap_step(self, step, in_info=False):
+        """
+        Returns a timed version of the step function of an env, whose total durations are recorded in the 'step' phase
+        (including nested phases). If in_info is True, the durations of the phases of each step are added in its info['perf']
+        """
+        def timed_step(action):
+            self._step_durations = {}
+            self._nested = 0.0
+            start = clock()
+            observation, reward, done, info = step(action)
+            duration = clock() - start
+            self._record('step', duration)
+            if self.trace is not None:
+                self.trace.event('step', start, duration)
+            self._nested = 0.0
+            if in_info:
+                info['perf'] = self._step_durations
+            # phases timed until the next step (e.g. reset) are not added to the durations handed out with this step
+            self._step_durations = {}
+            return observation, reward, done, info
+        return timed_step
+
+    def reset(self):
+        """
+        Discards all recorded durations
+        """
+        self._durations.clear()
+        self._counts.clear()
+
+    def stats(self, bins=None):
+        """
+        Returns statistics of the durations (in seconds) kept for each phase
+
+        Parameters
+        ----------
+        - bins : (np.array) edges of histograms bins, by default log-spaced from 0.1 microsecond to 1 second
+
+        Returns
+        -------
+        - (OrderedDict) by phase, dictionnaries with the total number of recorded durations 'count', and for the
+            kept durations 'mean', 'p50', 'p90', 'p99', 'max' and 'histogram' (counts in bins)
+        """
+        if bins is None:
+            bins = np.logspace(-7, 0, 29)
+        stats = OrderedDict()
+        for phase, durations in self._durations.items():
+            count = self._counts[phase]
+            durations = np.array(durations[:min(count, self.window)])
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+            stats[phase] = {'count' : count, 'mean' : float(np.mean(durations)),
+                            'p50' : float(p50), 'p90' : float(p90), 'p99' : float(p99), 'max' : float(np.max(durations)),
+                            'histogram' : np.histogram(durations, bins)[0], 'bins' : bins}
+        return stats
+
+
+################################################################################################################################
+class TraceWriter(object):
+    """
+    Writes events in a Chrome trace file (JSON array format, readable by chrome://tracing and Perfetto).
+    Events are buffered and written by blocks of buffer_size events, so that memory stays bounded whatever the length of the trace.
+    Timestamps are taken on the wall clock, so that traces of several processes can be merged (see merge_traces)
+    """
+    def __init__(self, path, pid=None, tid=0, name=None, buffer_size=10000):
+        """
+        Parameters
+        ----------
+        - path : (str) path of the trace file, overwritten
+        - pid : (int) process ID of events, the ID of the current process by default
+        - tid : (int) thread ID of events, e.g. the ID of an env in the process
+        - name : (str) name of the thread shown in trace viewers
+        - buffer_size : (int) number of events kept in memory before being written
+        """
+        self._file = None
+        self.path = path
+        self.pid = os.getpid() if pid is None else pid
+        self.tid = tid
+        self.buffer_size = buffer_size
+        # offset from the clock of events to the wall clock, in microseconds
+        self._offset = (time.time() - clock())*1e6
+        self._buffer = []
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._first = True
+        # events common parts, formatted once
+        self._suffix = ',"pid":' + str(self.pid) + ',"tid":' + str(self.tid) + '}'
+        if name is not None:
+            self._buffer.append('{"name":"thread_name","ph":"M","args":{"name":' + json.dumps(name) + '}' + self._suffix)
+
+    def event(self, name, start, duration, args=None):
+        """
+        Adds a complete event (begin and end in one event)
+
+        Parameters
+        ----------
+        - name : (str) name of the event, without characters to escape in JSON
+        - start : (float) start of the event in seconds, on round_bot_perf.clock
+        - duration : (float) duration of the event in seconds
+        - args : (dict) optional arguments of the event, serializable in JSON
+        """
+        event = ('{"name":"' + name + '","ph":"X","ts":' + repr(start*1e6 + self._offset) + ',"dur":' + repr(duration*1e6)
+                 + (',"args":' + json.dumps(args) if args else '') + self._suffix)
+        self._buffer.append(event)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def counter(self, name, values, timestamp=None):
+        """
+        Adds a counter event, shown as a graph of values in trace viewers
+
+        Parameters
+        ----------
+        - name : (str) name of the counter
+        - values : (dict) values of the counter by series name
+        - timestamp : (float) time of the values in seconds on round_bot_perf.clock, now by default
+        """
+        timestamp = clock() if timestamp is None else timestamp
+        self._buffer.append('{"name":"' + name + '","ph":"C","ts":' + repr(timestamp*1e6 + self._offset)
+                            + ',"args":' + json.dumps(values) + self._suffix)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered events in the trace file
+        """
+        if not self._buffer or self._file is None:
+            return
+        self._file.write(('\n' if self._first else ',\n') + ',\n'.join(self._buffer))
+        self._file.flush()
+        self._first = False
+        self._buffer = []
+
+    def close(self):
+        """
+        Writes buffered events and closes the trace file, which is then a valid JSON array
+        """
+        if self._file is None:
+            return
+        self.flush()
+        self._file.write('\n]\n')
+        self._file.close()
+        self._file = None
+
+    def __del__(self):
+        self.close()
+
+
+def merge_traces(paths, path):
+    """
+    Merges trace files (e.g. of several processes or envs) in one trace file
+
+    Parameters
+    ----------
+    - paths : (list(str)) paths of the trace files to merge, which must be closed
+    - path : (str) path of the merged trace file
+    """
+    with open(path, 'w') as merged:
+        merged.write('[')
+        first = True
+        for trace_path in paths:
+            with open(trace_path) as f:
+                events = json.load(f)
+            for event in events:
+                merged.write(('\n' if first else ',\n') + json.dumps(event))
+                first = False
+        merged.write('\n]\n')
+
+
+def _owner(array):
+    """
+    Returns the array owning the memory of a numpy array (the array itself if it is not a view), or None if its memory
+    is memory-mapped
+    """
+    while isinstance(array.base, np.ndarray) and not isinstance(array, np.memmap):
+        array = array.base
+    if isinstance(array, np.memmap) or (array.base is not None and type(array.base).__name__ == 'mmap'):
+        return None
+    return array
+
+
+def array_bytes(roots, exclude=()):
+    """
+    Returns the number of bytes of numpy arrays reachable from roots, through containers, closures of functions,
+    bound methods and attributes of objects of this package (so that buffers preallocated in closures are found).
+    Each memory buffer is counted once, and memory-mapped arrays are not counted
+
+    Parameters
+    ----------
+    - roots : (list) explored objects
+    - exclude : (list) objects which are not explored (e.g. the model when measuring observation buffers)
+    """
+    seen = set(id(o) for o in exclude)
+    owners = {}
+    stack = list(roots)
+    while stack:
+        o = stack.pop()
+        if o is None or id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            owner = _owner(o)
+            if owner is not None:
+                owners[id(owner)] = owner.nbytes
+        elif isinstance(o, dict):
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)) or type(o).__name__ == 'deque':
+            stack.extend(o)
+        elif hasattr(o, '__func__') and hasattr(o, '__self__'): # bound method
+            stack.extend([o.__self__, o.__func__])
+        elif hasattr(o, '__code__'): # function
+            stack.extend(cell.cell_contents for cell in (o.__closure__ or ()))
+        elif type(o).__module__.startswith('gym_round_bot') and hasattr(o, '__dict__'):
+            stack.extend(o.__dict__.values())
+    return sum(owners.values())
+
+
+def object_bytes(o):
+    """
+    Returns the number of bytes of an object, its attributes dictionnary and the values of its attributes which are
+    numpy arrays (their own memory), or lists and tuples (with their items), without following other objects
+    """
+    size = sys.getsizeof(o)
+    attributes = getattr(o, '__dict__', None)
+    if attributes is None:
+        return size
+    size += sys.getsizeof(attributes)
+    for value in attributes.values():
+        if isinstance(value, np.ndarray):
+            size += sys.getsizeof(value) # includes the data of arrays owning their memory
+        elif isinstance(value, (list, tuple)):
+            size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return size
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import json
+import atexit
+import weakref
+import threading
+import numpy as np
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+"""
+    This file defines a recorder streaming trajectories (rows of fixed-shape fields such as observations, actions, rewards)
+    to chunked memory-mappable files, and a reader giving random access to recorded rows without loading whole files.
+
+    A recording saved with path P is made of :
+        - P_index.json : fields (shapes and dtypes), chunk size and number of rows of each chunk
+        - P_<chunk>_<field>.npy : (np.array) array of shape [chunk_size]+field_shape of each field in each chunk,
+            preallocated (only the first rows given by the index are valid in the last chunk)
+
+    Rows are copied in blocks kept in memory, written to chunk files by a background thread. Only max_blocks blocks
+    exist at once : appending rows waits for the writer when all blocks are full, so that memory stays bounded
+"""
+
+_replace = getattr(os, 'replace', os.rename) # os.replace does not exist in python 2
+
+# recorders which are not closed yet, closed at exit while their writer threads still run
+# (daemon threads are stopped before objects are deleted at the end of the interpreter)
+_open_recorders = weakref.WeakSet()
+
+@atexit.register
+def _close_recorders():
+    for recorder in list(_open_recorders):
+        recorder.close()
+
+
+def _chunk_path(path, chunk, field):
+    return path + '_' + str(chunk).zfill(5) + '_' + field + '.npy'
+
+
+################################################################################################################################
+class TrajectoryRecorder(object):
+    """
+    Streams rows of fields to chunked memory-mappable files (see module description)
+    """
+    def __init__(self, path, fields, chunk_size=10000, block_size=256, max_blocks=4):
+        """
+        Parameters
+        ----------
+        - path : (str) path prefix of the recording files, overwritten
+        - fields : (OrderedDict) shape (tuple) and dtype of each field, in the order of values given to append
+        - chunk_size : (int) number of rows of each chunk file
+        - block_size : (int) number of rows copied in memory before being written by the background thread
+        - max_blocks : (int) maximum number of blocks in memory
+        """
+        self.path = path
+        self.fields = OrderedDict((name, (tuple(shape), np.dtype(dtype))) for name, (shape, dtype) in fields.items())
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self._chunk_rows = [] # number of rows written in each chunk
+        self._chunk = None # memory-mapped arrays of fields of the current chunk
+        self._error = None # exception raised in the writer thread
+        self._closed = False
+        self._free_blocks = queue.Queue()
+        for i in range(max_blocks):
+            self._free_blocks.put([np.empty((block_size,)+shape, dtype=dtype) for shape, dtype in self.fields.values()])
+        self._full_blocks = queue.Queue()
+        self._block = self._free_blocks.get()
+        self._block_rows = 0
+        self.rows = 0 # number of appended rows
+        self._write_index()
+        self._writer = threading.Thread(target=self._write_blocks, name='trajectory recorder ' + path)
+        self._writer.daemon = True
+        self._writer.start()
+        _open_recorders.add(self)
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, *values):
+        """
+        Appends a row, with one value by field in the order of fields. Values are copied
+        """
+        block, row = self._block, self._block_rows
+        for array, value in zip(block, values):
+            array[row] = value
+        self._block_rows = row + 1
+        self.rows += 1
+        if self._block_rows == self.block_size:
+            self._send_block()
+
+    def _send_block(self):
+        """
+        Sends the current block to the writer thread and takes a free block, waiting for one if there is none
+        """
+        if self._error is not None:
+            raise self._error
+        self._full_blocks.put((self._block, self._block_rows))
+        self._block = self._free_blocks.get()
+        self._block_rows = 0
+
+    def _write_blocks(self):
+        """
+        Writes blocks to chunk files until a None block is received (runs in the writer thread)
+        """
+        while True:
+            block, rows = self._full_blocks.get()
+            try:
+                if block is None:
+                    return
+                if self._error is None:
+                    self._write_block(block, rows)
+            except Exception as e:
+                self._error = e
+            finally:
+                if block is not None:
+                    self._free_blocks.put(block)
+                self._full_blocks.task_done()
+
+    def _write_block(self, block, rows):
+        """
+        Copies the first rows of a block to chunk files, opening new chunks when needed
+        """
+        written = 0
+        while written < rows:
+            if self._chunk is None:
+                self._chunk = [np.lib.format.open_memmap(_chunk_path(self.path, len(self._chunk_rows), name), mode='w+',
+                                                         dtype=dtype, shape=(self.chunk_size,)+shape)
+                               for name, (shape, dtype) in self.fields.items()]
+                self._chunk_rows.append(0)
+            start = self._chunk_rows[-1]
+            n = min(rows - written, self.chunk_size - start)
+            for chunk_array, block_array in zip(self._chunk, block):
+                chunk_array[start:start+n] = block_array[written:written+n]
+            self._chunk_rows[-1] += n
+            written += n
+            if self._chunk_rows[-1] == self.chunk_size:
+                self._flush_chunk()
+                self._chunk = None
+
+    def _flush_chunk(self):
+        """
+        Writes the current chunk to its files and updates the index
+        """
+        if self._chunk is not None:
+            for array in self._chunk:
+                array.flush()
+        self._write_index()
+
+    def _write_index(self):
+        """
+        Writes the index file, atomically so that readers never read a partial index
+        """
+        index = {'fields' : OrderedDict((name, {'shape' : list(shape), 'dtype' : dtype.str}) for name, (shape, dtype) in self.fields.items()),
+                 'chunk_size' : self.chunk_size,
+                 'chunks' : list(self._chunk_rows),
+                 'rows' : sum(self._chunk_rows)}
+        with open(self.path + '_index.json.tmp', 'w') as f:
+            json.dump(index, f)
+        _replace(self.path + '_index.json.tmp', self.path + '_index.json')
+
+    def flush(self):
+        """
+        Writes all appended rows to the chunk files and updates the index, waiting for the writer thread
+        """
+        if self._closed:
+            return
+        if self._block_rows:
+            self._send_block()
+        self._full_blocks.join() # the writer thread is then idle
+        if self._error is not None:
+            raise self._error
+        self._flush_chunk()
+
+    def close(self):
+        """
+        Writes all appended rows and stops the writer thread
+        """
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            _open_recorders.discard(self)
+            self._full_blocks.put((None, 0))
+            self._writer.join()
+            self._chunk = None
+
+    def __del__(self):
+        if getattr(self, '_writer', None) is not None:
+            self.close()
+
+
+################################################################################################################################
+class TrajectoryReader(object):
+    """
+    Reads rows recorded by a TrajectoryRecorder, with memory-mapped chunk files opened when first read
+    """
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        - path : (str) path prefix of the recording files
+        """
+        self.path = path
+        with open(path + '_index.json') as f:
+            index = json.load(f, object_pairs_hook=OrderedDict)
+        self.fields = OrderedDict((name, (tuple(field['shape']), np.dtype(field['dtype']))) for name, field in index['fields'].items())
+        self.chunk_size = index['chunk_size']
+        self.chunk_rows = index['chunks']
+        self.rows = index['rows']
+        self._chunks = {} # memory-mapped arrays of opened chunks
+
+    def __len__(self):
+        return self.rows
+
+    def chunk(self, chunk):
+        """
+        Returns the read-only memory-mapped arrays of the valid rows of each field in a chunk
+
+        Returns
+        -------
+        - (OrderedDict) arrays of shape [rows]+field_shape by field
+        """
+        try:
+            return self._chunks[chunk]
+        except KeyError:
+            rows = self.chunk_rows[chunk]
+            arrays = OrderedDict((name, np.load(_chunk_path(self.path, chunk, name), mmap_mode='r')[:rows]) for name in self.fields)
+            self._chunks[chunk] = arrays
+            return arrays
+
+    def __getitem__(self, key):
+        """
+        Reads rows
+
+        Parameters
+        ----------
+        - key : (int, slice or array of ints) indices of rows
+
+        Returns
+        -------
+        - (OrderedDict) values of fields by name, of the row if key is an int, else arrays of rows
+        """
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.rows
+            if not 0 <= key < self.rows:
+                raise IndexError('row ' + str(key) + ' out of recording of ' + str(self.rows) + ' rows')
+            chunk = self.chunk(key // self.chunk_size)
+            return OrderedDict((name, array[key % self.chunk_size]) for name, array in chunk.items())
+        indices = np.arange(self.rows)[key]
+        rows = OrderedDict((name, np.empty((len(indices),)+shape, dtype=dtype)) for name, (shape, dtype) in self.fields.items())
+        chunks = indices // self.chunk_size
+        for chunk in np.unique(chunks):
+            selected = (chunks == chunk)
+            for name, array in self.chunk(chunk).items():
+                rows[name][selected] = array[indices[selected] % self.chunk_size]
+        return rows
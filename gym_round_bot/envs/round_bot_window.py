@@ -12,9 +12,8 @@ import numpy as np
 from sys import platform
 import copy
 
-import scipy.misc
-
-from collections import deque
+from collections import deque, OrderedDict
+from ctypes import byref
 from pyglet import image
 from pyglet.gl import *
 from pyglet.graphics import TextureGroup
@@ -24,6 +23,66 @@ from pyglet.window import key, mouse
 """
     This file defines the environnement's window and renderer
 """
+
+# identifiers of block types in segmentation images (0 is the background)
+SEGMENTATION_IDS = {'brick':1, 'sandbox':2, 'trigger_button':3, 'start':4, 'reward':5, 'distractor':6, 'robot':7}
+# texture of blocks of each type, as keys of the model's texture_paths
+TEXTURE_SOURCES = OrderedDict([('brick', 'brick'), ('sandbox', 'brick'), ('trigger_button', 'brick'),
+                               ('start', 'visualisation'), ('reward', 'visualisation'),
+                               ('distractor', 'distractors'), ('robot', 'robot')])
+# color of 'clear', i.e. the sky, in rgba
+CLEAR_COLOR = (0.2, 0.2, 0.2, 1)
+
+
+def texture_palette(model, n=4):
+    """
+    Returns the exact palette of colors which can be rendered with the textures of the model's visible blocks, with nearest
+    texels filtering (see RoundBotWindow.set_texture_filter) and without fog nor lighting : the clear color, then the colors
+    of the texels of the texture squares mapped on blocks
+
+    Parameters
+    ----------
+    - model : (round_bot_model.Model) the model, whose texture_paths are given by block types (see TEXTURE_SOURCES)
+    - n : (int) number of texture squares along each side of texture images (see round_bot_model.Block.tex_coord)
+
+    Returns
+    -------
+    - (np.array) uint8 array of shape [n_colors, 3] of distinct RGB colors
+    """
+    # texture squares mapped on the faces of blocks, by texture path
+    squares = OrderedDict()
+    for block in sorted(model.visible_blocks, key=lambda b : b.creation_index):
+        path = model.texture_paths[TEXTURE_SOURCES[block.block_type]]
+        for face in np.reshape(np.array(block.texture, dtype=float), [-1, 8]):
+            squares.setdefault(path, set()).add((int(round(face[0]*n)), int(round(face[1]*n))))
+    colors = [np.round(np.array(CLEAR_COLOR[:3])*255).astype(np.uint8)[np.newaxis,:]]
+    for path, path_squares in squares.items():
+        texture = image.load(path).get_image_data()
+        # rows of image data are ordered from the bottom, as texture coordinates
+        pixels = np.frombuffer(texture.get_data('RGB', texture.width*3), dtype=np.uint8).reshape(texture.height, texture.width, 3)
+        h, w = texture.height//n, texture.width//n
+        for x, y in sorted(path_squares):
+            colors.append(np.unique(pixels[y*h:(y+1)*h, x*w:(x+1)*w].reshape(-1,3), axis=0))
+    colors = np.concatenate(colors)
+    # keep the first occurence of each color, so that the clear color has index 0
+    _, first = np.unique(colors, axis=0, return_index=True)
+    return colors[np.sort(first)]
+
+
+def _window_config():
+    """
+    Returns the OpenGL config of windows, with exactly 8 bits by color channel and without multisampling, as the offscreen
+    framebuffers of cameras and render_poses, so that all renderings of a scene give the same images. Returns None
+    (pyglet's default config) if the display has no such config
+    """
+    screen = pyglet.canvas.get_display().get_default_screen()
+    configs = [config for config in screen.get_matching_configs(Config(red_size=8, green_size=8, blue_size=8, depth_size=24))
+               if (config.red_size, config.green_size, config.blue_size) == (8, 8, 8) and not config.sample_buffers]
+    if not configs:
+        return None
+    # prefer double buffered configs, as pyglet's default config
+    return max(configs, key=lambda config : bool(config.double_buffer))
+
 ################################################################################################################################
 class RoundBotWindow(pyglet.window.Window):
 ################################################################################################################################
@@ -31,7 +90,9 @@ class RoundBotWindow(pyglet.window.Window):
         Abstract class for rendering in a window with pyglet
     """
 
-    def __init__(self, model, global_pov=None, perspective=True, interactive=False, focal=65.0, *args, **kwargs):
+    def __init__(self, model, global_pov=None, perspective=True, interactive=False, focal=65.0, static_background=False, skip_unchanged_frames=False, *args, **kwargs):
+        if kwargs.get('config') is None:
+            kwargs['config'] = _window_config()
         super(RoundBotWindow, self).__init__(*args, **kwargs)
         """
         Parameters
@@ -42,6 +103,9 @@ class RoundBotWindow(pyglet.window.Window):
         - perspective : (Bool) camera projection mode
         - interactive : (Bool) wether user can interact with window or not (use : take control of the robot for debug)
         - focal : (float) camera projective focal length
+        - static_background : (Bool) whether to render static blocks only once in global point of view (see draw_static_background)
+        - skip_unchanged_frames : (Bool) whether to skip drawing and reading back frames when the model's scene_version
+            has not changed since the last frame
         - *args : (tuple) args of parent Class pyglet.window.Window
         - **kwargs : (dict) kwargs of parent Class pyglet.window.Window
         """
@@ -76,21 +140,30 @@ class RoundBotWindow(pyglet.window.Window):
         # Mapping from shown blocks to textures
         self.shown = dict()
         # A Batch is a collection of vertex lists for batched rendering.
+        # Static blocks and movable blocks (robot, distractors) are kept in two batches
         self.batch = pyglet.graphics.Batch()
+        self.movable_batch = pyglet.graphics.Batch()
+        # cached rendering of static blocks in global point of view, as (color, depth) arrays
+        self.static_background = static_background
+        self._background = None
+        # scene versions of the drawn frame and of the last read image (None if unknown), and copy of the last read image
+        self.skip_unchanged_frames = skip_unchanged_frames
+        self._frame_version = None
+        self._image_version = None
+        self._last_image = None
+        # layout of images read by get_image (see set_image_layout)
+        self._image_layout = None
+        # cameras rendered in an offscreen framebuffer (see set_cameras)
+        self._cameras = None
+        self._camera_buffer = None
+        self._camera_framebuffer = None
+        # tiles grid, offscreen framebuffer and read back buffer of render_poses
+        self._poses_framebuffer = None
         # A TextureGroup manages an OpenGL texture.
         self.texture_groups = dict()
-        # brick texture group
-        self.texture_groups['brick'] = TextureGroup(image.load(self.model.texture_paths['brick']).get_texture())
-        self.texture_groups['sandbox'] = TextureGroup(image.load(self.model.texture_paths['brick']).get_texture())
-        self.texture_groups['trigger_button'] = TextureGroup(image.load(self.model.texture_paths['brick']).get_texture())
-
-        # visualisation texture group
-        self.texture_groups['start'] = TextureGroup(image.load(self.model.texture_paths['visualisation']).get_texture())
-        self.texture_groups['reward'] = TextureGroup(image.load(self.model.texture_paths['visualisation']).get_texture())
-
-        # other texture groups
-        self.texture_groups['distractor'] = TextureGroup(image.load(self.model.texture_paths['distractors']).get_texture())
-        self.texture_groups['robot'] = TextureGroup(image.load(self.model.texture_paths['robot']).get_texture())
+        # one texture group by block type, with the texture of its source (see TEXTURE_SOURCES)
+        for block_type, source in TEXTURE_SOURCES.items():
+            self.texture_groups[block_type] = TextureGroup(image.load(self.model.texture_paths[source]).get_texture())
 
         # set persepctive rendering aspect ratio (usefull to change for multiview render)
         self.aspect_ratio = self.width / float(self.height)
@@ -114,6 +187,12 @@ class RoundBotWindow(pyglet.window.Window):
     def update(self, dt):
 
         self._update(dt)
+        self.update_shown_blocks()
+
+    def update_shown_blocks(self):
+        """
+        Uploads the vertices of shown movable blocks to the batch, without updating the model
+        """
         # try update on all movable blocks
         for block in self.model.movable_blocks:
             try: # use of try except instead of if statement here for computational optimization
@@ -126,7 +205,17 @@ class RoundBotWindow(pyglet.window.Window):
         Performs manually a drawing step
         """
         self.update(dt)
-        self.on_draw()       
+        self.draw()
+
+    def draw(self):
+        """
+        Draws the current state of the model, without updating it
+        """
+        version = self.model.scene_version
+        if self.skip_unchanged_frames and version == self._frame_version:
+            return # the frame already drawn is the same
+        self.on_draw()
+        self._frame_version = version
         if self.visible: 
             self.dispatch_events() # slows down rendering with a factor 10 on OSX
             self.flip()
@@ -149,7 +238,13 @@ class RoundBotWindow(pyglet.window.Window):
         """ Add block the shown dict
         """
         if self._show_block(block): # decide whether to show the block or not depending on the window
-            self.shown[block] = self.batch.add(24, GL_QUADS, self.texture_groups[block.block_type],
+            if block.movable:
+                batch = self.movable_batch
+            else:
+                batch = self.batch
+                self.invalidate_static_background()
+            self._frame_version = None
+            self.shown[block] = batch.add(24, GL_QUADS, self.texture_groups[block.block_type],
                 ('v3f/static', block.vertices),
                 ('t2f/static', list(block.texture))
                 )   
@@ -163,25 +258,243 @@ class RoundBotWindow(pyglet.window.Window):
     def hide_block(self, block):
         """ Remove block from shown dict
         """
-        self.shown.pop(block)
+        vertex_list = self.shown.pop(block, None)
+        if vertex_list is not None: # the block may not be shown in this window
+            vertex_list.delete() # remove it from its batch
+            self._frame_version = None
+            if not block.movable:
+                self.invalidate_static_background()
+
+    def set_texture_filter(self, nearest=True):
+        """
+        Sets the filtering of the textures of blocks : nearest texels, so that rendered colors are exactly colors of texels
+        (see texture_palette), or linear interpolation of texels (pyglet's default)
+        """
+        mode = GL_NEAREST if nearest else GL_LINEAR
+        self.switch_to()
+        for group in self.texture_groups.values():
+            glBindTexture(group.texture.target, group.texture.id)
+            glTexParameteri(group.texture.target, GL_TEXTURE_MIN_FILTER, mode)
+            glTexParameteri(group.texture.target, GL_TEXTURE_MAG_FILTER, mode)
+            glBindTexture(group.texture.target, 0)
+        self._frame_version = None
+        self.invalidate_static_background()
+
+    def invalidate_static_background(self):
+        """
+        Discards the cached rendering of static blocks, which is rendered again at next draw
+        """
+        self._background = None
+
+    def draw_static_background(self):
+        """
+        Draws the static blocks in global point of view from the cached background, with its depth so that movable blocks
+        can be drawn over it. The background is rendered and read back first if it is not cached
+        """
+        width, height = self.width, self.height
+        if self._background is None:
+            self.set_3d()
+            glColor3d(1, 1, 1)
+            self.batch.draw()
+            color = np.empty([height, width, 3], dtype=np.uint8)
+            depth = np.empty([height, width], dtype=np.float32)
+            glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, color.ctypes.data)
+            glReadPixels(0, 0, width, height, GL_DEPTH_COMPONENT, GL_FLOAT, depth.ctypes.data)
+            self._background = (color, depth)
+            return
+        color, depth = self._background
+        glWindowPos2i(0, 0)
+        # write colors without depth, then depths without colors
+        glDisable(GL_DEPTH_TEST)
+        glDrawPixels(width, height, GL_RGB, GL_UNSIGNED_BYTE, color.ctypes.data)
+        glEnable(GL_DEPTH_TEST) # depth is only written with depth test enabled
+        glDepthFunc(GL_ALWAYS)
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glDrawPixels(width, height, GL_DEPTH_COMPONENT, GL_FLOAT, depth.ctypes.data)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+        glDepthFunc(GL_LESS)
+
+    def on_resize(self, width, height):
+        """
+        Called by pyglet when the window is resized
+        """
+        self.invalidate_static_background()
+        self._frame_version = self._image_version = None
+        self._last_image = None # reallocated at next read
+        return super(RoundBotWindow, self).on_resize(width, height)
 
-    def get_image(self,reshape=True):
+    def set_image_layout(self, flip=False, channel_first=False, grayscale=False):
+        """
+        Sets the layout of images returned by get_image, which are then read by OpenGL directly in this layout.
+        Without layout, images are shaped as [width, height, 3] with rows read from the bottom (for backward compatibility)
+
+        Parameters
+        ----------
+        - flip : (Bool) whether rows are ordered from the top of the window (the scene is rendered upside down,
+            so that OpenGL reads it from the top)
+        - channel_first : (Bool) whether images are shaped as [channels, height, width] instead of [height, width, channels]
+        - grayscale : (Bool) whether images have a single luminance channel (0.299*R + 0.587*G + 0.114*B) instead of RGB
+        """
+        self._image_layout = (flip, channel_first, grayscale)
+        self._frame_version = self._image_version = None
+        self._last_image = None
+        self.invalidate_static_background()
+
+    @property
+    def image_shape(self):
+        """
+        Shape of images returned by get_image (see set_image_layout)
+        """
+        if self._image_layout is None:
+            return (self.width, self.height, 3)
+        flip, channel_first, grayscale = self._image_layout
+        channels = 1 if grayscale else 3
+        return (channels, self.height, self.width) if channel_first else (self.height, self.width, channels)
+
+    @property
+    def channel_shape(self):
+        """
+        Shape of single channel images returned by get_depth and get_segmentation, in the layout of images
+        """
+        if self._image_layout is None:
+            return (self.width, self.height, 1)
+        return (1, self.height, self.width) if self._image_layout[1] else (self.height, self.width, 1)
+
+    def _read_pixels(self, address):
+        """
+        Reads the pixels of the frame at given memory address, in the layout of images
+        """
+        width, height = self.width, self.height
+        if self._image_layout is None:
+            glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, address)
+            return
+        flip, channel_first, grayscale = self._image_layout
+        if grayscale:
+            # luminance is computed by the pixel transfer as the sum of scaled color components
+            glPixelTransferf(GL_RED_SCALE, 0.299)
+            glPixelTransferf(GL_GREEN_SCALE, 0.587)
+            glPixelTransferf(GL_BLUE_SCALE, 0.114)
+            glReadPixels(0, 0, width, height, GL_LUMINANCE, GL_UNSIGNED_BYTE, address)
+            glPixelTransferf(GL_RED_SCALE, 1.0)
+            glPixelTransferf(GL_GREEN_SCALE, 1.0)
+            glPixelTransferf(GL_BLUE_SCALE, 1.0)
+        elif channel_first:
+            # one plane per color component
+            for i, component in enumerate([GL_RED, GL_GREEN, GL_BLUE]):
+                glReadPixels(0, 0, width, height, component, GL_UNSIGNED_BYTE, address + i*width*height)
+        else:
+            glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, address)
+
+    def get_image(self, reshape=True, out=None):
         """
         Return a screenshot of the window
+
+        Parameters
+        ----------
+        - reshape : (Bool) whether to return the image shaped as an image (see image_shape) or as a line vector
+        - out : (np.array) optional C-contiguous uint8 array with as many elements as images, in which pixels are read
+            directly. It is returned as is (without reshaping) instead of a new array
+
+        Returns
+        -------
+        - (np.array) the screenshot
         """
-        #return pyglet.image.get_buffer_manager().get_color_buffer()
-        # read pixel data from opengl buffer
-        data = ( GLubyte * (3*self.width*self.height) )(0)
-        glReadPixels(0, 0, self.width, self.height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, data)
-        # convert to numpy array
-        nparr = np.fromstring(data,dtype=np.uint8)        
-        if reshape:
-            # reshape as image
-            nparr=nparr.reshape(self.width,self.height,3)
+        shape = self.image_shape
+        size = int(np.prod(shape))
+        if self.skip_unchanged_frames and self._image_version is not None and self._image_version == self._frame_version:
+            # the frame has not changed since the last read, return a copy of the last image
+            if out is None:
+                return self._last_image.reshape(shape if reshape else [1,size]).copy()
+            out.reshape(-1)[...] = self._last_image
+            return out
+        if out is None:
+            if reshape:
+                # shape as image
+                out = np.empty(shape, dtype=np.uint8)
+            else:
+                # shape as line vector
+                out = np.empty([1,size], dtype=np.uint8)
+        elif out.dtype != np.uint8 or out.size != size or not out.flags['C_CONTIGUOUS']:
+            raise ValueError('out must be a C-contiguous uint8 array of ' + str(size) + ' elements')
+        # read pixel data from opengl buffer directly into the numpy array memory
+        self._read_pixels(out.ctypes.data)
+        if self.skip_unchanged_frames:
+            if self._last_image is None or self._last_image.size != size:
+                self._last_image = np.empty([size], dtype=np.uint8)
+            self._last_image[...] = out.reshape(-1)
+            self._image_version = self._frame_version
+        return out
+
+    def get_depth(self, out=None):
+        """
+        Return the depth of the pixels of the last drawn frame, as distances to the camera plane
+
+        Parameters
+        ----------
+        - out : (np.array) optional C-contiguous float32 array of width*height elements in which depths are read
+
+        Returns
+        -------
+        - (np.array) float32 depths shaped as channel_shape, between near and far planes (see clip_planes)
+        """
+        if out is None:
+            out = np.empty(self.channel_shape, dtype=np.float32)
+        elif out.dtype != np.float32 or out.size != self.width*self.height or not out.flags['C_CONTIGUOUS']:
+            raise ValueError('out must be a C-contiguous float32 array of width*height elements')
+        glReadPixels(0, 0, self.width, self.height, GL_DEPTH_COMPONENT, GL_FLOAT, out.ctypes.data)
+        # linearize depth buffer values from [0:1] to [near:far]
+        near, far = self.clip_planes()
+        if self.perspective:
+            # inverse of the perspective projection : z = near*far / (far - d*(far-near))
+            np.multiply(out, near-far, out=out)
+            np.add(out, far, out=out)
+            np.divide(near*far, out, out=out)
         else:
-            # reshape as line vector
-            nparr=nparr.reshape(1,self.width*self.height*3)
-        return copy.copy(nparr) # important to copy returned np.arrays !
+            # orthogonal projection is linear
+            np.multiply(out, far-near, out=out)
+            np.add(out, near, out=out)
+        # float32 rounding can put pixels of the far plane (background) slightly beyond it
+        np.clip(out, near, far, out=out)
+        return out
+
+    def get_segmentation(self, out=None):
+        """
+        Return the block types of the pixels of the last drawn frame (see SEGMENTATION_IDS).
+        The fixed-function pipeline writes a single color per pixel, so identifiers are not written by the textured draw
+        of the frame : shown blocks are drawn again in a separate pass with flat colors, one draw call per block, over the
+        depth buffer of the last drawn frame (which hides the same surfaces as in the frame).
+        Warning : the color buffer is overwritten, get_image must be called before
+
+        Parameters
+        ----------
+        - out : (np.array) optional C-contiguous uint8 array of width*height elements in which identifiers are read
+
+        Returns
+        -------
+        - (np.array) uint8 block type identifiers shaped as channel_shape
+        """
+        if out is None:
+            out = np.empty(self.channel_shape, dtype=np.uint8)
+        elif out.dtype != np.uint8 or out.size != self.width*self.height or not out.flags['C_CONTIGUOUS']:
+            raise ValueError('out must be a C-contiguous uint8 array of width*height elements')
+        self.switch_to()
+        self.set_3d()
+        # clear colors only, identifiers are written in the red channel
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glClearColor(*CLEAR_COLOR)
+        glDisable(GL_DITHER)
+        glDepthFunc(GL_LEQUAL) # keep the surfaces of the last drawn frame
+        for block, vertex_list in self.shown.items():
+            glColor3ub(SEGMENTATION_IDS[block.block_type], 0, 0)
+            vertex_list.draw(GL_QUADS)
+        glDepthFunc(GL_LESS)
+        glEnable(GL_DITHER)
+        glColor3d(1, 1, 1)
+        glReadPixels(0, 0, self.width, self.height, GL_RED, GL_UNSIGNED_BYTE, out.ctypes.data)
+        # the frame is not the drawn one anymore
+        self._frame_version = None
+        return out
    
     def set_2d(self):
         """ Configure OpenGL to draw in 2d.
@@ -196,42 +509,83 @@ class RoundBotWindow(pyglet.window.Window):
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
 
+    def clip_planes(self):
+        """
+        Returns the (near, far) distances of the clipping planes of the 3d projection
+        """
+        return self._clip_planes(self.perspective, self.global_pov)
+
+    @staticmethod
+    def _clip_planes(perspective, global_pov):
+        if perspective:
+            return 0.1, 60.0
+        else:
+            return 0.1, global_pov[1]+5
+
     def set_3d(self, offset_xzangle=0.0):
         """ Configure OpenGL to draw in 3d.
             offset_xzangle : put offset to xOz angle, used for getting several views at each position and fusion them
         """
         width, height = self.get_size()
+        flip = bool(self._image_layout and self._image_layout[0])
+        ortho_width = None if self.perspective else self.ortho_width
+        self._set_3d_camera((0, 0, width, height), self.global_pov, self.perspective, self.current_focal,
+                            self.aspect_ratio, ortho_width, flip, offset_xzangle)
+
+    def _set_3d_camera(self, viewport, global_pov, perspective, focal, aspect_ratio, ortho_width, flip=False, offset_xzangle=0.0, robot=None):
+        """ Configure OpenGL to draw in 3d in the given viewport (x, y, width, height) with the given camera.
+            Subjective views are the ones of the model's robot, or of its robot of given index for a MultiRobotModel
+        """
         glEnable(GL_DEPTH_TEST)
-        glViewport(0, 0, width, height)
+        glViewport(*viewport)
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
-        if self.perspective:
-            gluPerspective(self.current_focal, self.aspect_ratio, 0.1, 60.0)
+        if flip:
+            # render upside down, so that rows are read from the top of the image.
+            # Mirroring reverses the winding of faces, thus culled faces
+            glScalef(1.0, -1.0, 1.0)
+            glFrontFace(GL_CW)
+        else:
+            glFrontFace(GL_CCW)
+        near, far = self._clip_planes(perspective, global_pov)
+        if perspective:
+            gluPerspective(focal, aspect_ratio, near, far)
         else :
             # if not perspective, make orthogonal projection given the global_pov            
-            glOrtho(self.ortho_width, -self.ortho_width, self.ortho_width, -self.ortho_width ,0.1, self.global_pov[1]+5)
+            glOrtho(ortho_width, -ortho_width, ortho_width, -ortho_width, near, far)
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
-        if self.global_pov:
+        if global_pov:
             glRotatef(90, 45, 0, 0) # look down           
-            x,y, z = self.global_pov
+            x,y, z = global_pov
             glTranslatef(-x, -y, -z)
         else:
-            x, y = self.model.robot_rotation
+            if robot is None:
+                rotation, position = self.model.robot_rotation, self.model.robot_position
+            else:
+                rotation, position = self.model.robots_rotation[robot], self.model.robots_position[robot]
+            x, y = rotation
             glRotatef(x+offset_xzangle, 0, 1, 0)
             glRotatef(-y, math.cos(math.radians(x)), 0, math.sin(math.radians(x)))
-            x,y, z = self.model.robot_position
+            x,y, z = position
             glTranslatef(-x, -y, -z)        
 
     def on_draw(self):
         """ Called by pyglet to draw the canvas.
 
         """
+        self._frame_version = None # set by draw() only
         self.switch_to() # set opengl context to this window
         self.clear()
+        if self.static_background and self.global_pov:
+            self.draw_static_background()
+        else:
+            self.set_3d()
+            glColor3d(1, 1, 1)
+            self.batch.draw()
         self.set_3d()
         glColor3d(1, 1, 1)
-        self.batch.draw()
+        self.movable_batch.draw()
         
         self._on_draw()
         
@@ -272,7 +626,7 @@ class RoundBotWindow(pyglet.window.Window):
 
         """
         # Set the color of 'clear', i.e. the sky, in rgba.
-        glClearColor(0.2, 0.2, 0.2, 1)
+        glClearColor(*CLEAR_COLOR)
         # Enable culling (not rendering) of back-facing facets -- facets that aren't
         # visible to you.
         glEnable(GL_CULL_FACE)
@@ -283,6 +637,9 @@ class RoundBotWindow(pyglet.window.Window):
         # as smooth.'
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        # Read and write pixels rows without padding, so that they can be read directly into numpy arrays of any width
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
         #self.setup_fog()
         self.switch_to() # set opengl context to this window
 
@@ -300,6 +657,8 @@ class RoundBotWindow(pyglet.window.Window):
         Note : this function doesn't perform any model updates ! It must be done before
         """
 
+        # views are drawn without draw(), the frame is thus not the one of any scene version
+        self._frame_version = None
         # if global pov is on, don't use multi-view rendering which is only for subjective views
         if self.global_pov:
             self.on_draw()
@@ -318,12 +677,15 @@ class RoundBotWindow(pyglet.window.Window):
             self.clear()
             self.set_3d(xzangle)
             glColor3d(1, 1, 1)
-            self.batch.draw()            
+            self.batch.draw()
+            self.movable_batch.draw()
             glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
         
             rnd = self.get_image(reshape=True)
-            # resize it (streching)
-            rnd = scipy.misc.imresize(rnd, (self.height,w,3)) # warning imresize take x,y and not w,h !
+            # resize it to [height, w] (streching) with nearest neighbours
+            rows = np.arange(self.height) * rnd.shape[0] // self.height
+            columns = np.arange(w) * rnd.shape[1] // w
+            rnd = rnd[rows][:,columns]
             # insert it in multiview_rnd
             multiview_rnd[:,i*w:(i+1)*w,:] = rnd
         # reset self.aspect_ratio and self.current_focal before returning multiview
@@ -331,10 +693,270 @@ class RoundBotWindow(pyglet.window.Window):
         self.current_focal = self.focal
         return multiview_rnd if not as_line else np.reshape(multiview_rnd,[1,self.width*self.height*3])
 
+    def set_cameras(self, cameras):
+        """
+        Sets the cameras rendered together by render_cameras, side by side in one offscreen framebuffer
+
+        Parameters
+        ----------
+        - cameras : (dict) cameras by names, each camera being a dictionnary with keys :
+            - 'size' : (list(int)) [width, height] of its images
+            - 'global_pov' : (Tuple(float,float,float) or Bool or None) global point of view (see __init__), None by default
+            - 'perspective' : (Bool) camera projection mode, True by default (always True without global_pov)
+            - 'focal' : (float) camera projective focal length, the window's focal by default
+            - 'multiview' : (List(float)) angles of subjective views fused side by side in the image (see multiview_render)
+            - 'robot' : (int) for a MultiRobotModel, index of the robot whose subjective view is rendered, None by default (first robot)
+
+        Exceptions
+        ----------
+        - ValueError : if a camera is not valid
+        - Exception : if the framebuffer cannot be built
+        """
+        self._cameras = []
+        x = 0
+        for name in sorted(cameras):
+            camera = cameras[name]
+            width, height = camera['size']
+            focal = camera.get('focal', self.focal)
+            global_pov = camera.get('global_pov', None)
+            perspective = camera.get('perspective', True)
+            multiview = camera.get('multiview', None)
+            robot = camera.get('robot', None)
+            if global_pov == True:
+                # compute global_pov automatically (see automatic_global_pov)
+                perspective = False
+                ortho_width = max(self.model.world_info['width']/2,self.model.world_info['depth']/2)
+                global_pov = (0, ortho_width/np.tan(np.radians(focal/2.0)), 0)
+            elif global_pov:
+                ortho_width = global_pov[1]*np.tan(np.radians(focal/2.0))
+            else:
+                ortho_width = None
+                perspective = True
+            if multiview and global_pov:
+                raise ValueError('camera ' + str(name) + ' : multiview can only be used with subjective views')
+            if multiview:
+                # views are rendered in narrow viewports with the projection used by multiview_render
+                n = len(multiview)
+                w = int(width/n)
+                views = [((x+i*w, 0, w, height), angle, focal/(2*n), 2*n*width/float(height)) for i, angle in enumerate(multiview)]
+            else:
+                views = [((x, 0, width, height), 0.0, focal, width/float(height))]
+            self._cameras.append((name, global_pov, perspective, ortho_width, views, robot, x, width, height))
+            x += width
+        width, height = x, max(camera[-1] for camera in self._cameras)
+        self._camera_buffer = np.empty([height, width, 3], dtype=np.uint8)
+
+        self.switch_to()
+        self._delete_framebuffer(self._camera_framebuffer)
+        self._camera_framebuffer = self._build_framebuffer(width, height)
+
+    def render_cameras(self, as_array=False):
+        """
+        Renders all cameras (see set_cameras) from the window's batches in one pass, and reads them back at once
+
+        Parameters
+        ----------
+        - as_array : (Bool) if True, images are returned as one array instead of a dictionnary
+
+        Returns
+        -------
+        - (OrderedDict) uint8 images of shape [height, width, 3] (rows from the top) by camera names, or if as_array is True
+            (np.array) array of shape [n_cameras, height, width, 3] of images in the order of camera names. This array is
+            a view of the read back buffer, without any copy, which is overwritten by next renders
+
+        Exceptions
+        ----------
+        - ValueError : if as_array is True and cameras have different sizes
+
+        Note : this function doesn't perform any model updates ! It must be done before
+        """
+        self.switch_to()
+        glBindFramebuffer(GL_FRAMEBUFFER, self._camera_framebuffer[0])
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glColor3d(1, 1, 1)
+        for name, global_pov, perspective, ortho_width, views, robot, x, width, height in self._cameras:
+            for viewport, xzangle, focal, aspect_ratio in views:
+                self._set_3d_camera(viewport, global_pov, perspective, focal, aspect_ratio, ortho_width, offset_xzangle=xzangle, robot=robot)
+                self.batch.draw()
+                self.movable_batch.draw()
+        buffer = self._camera_buffer
+        glReadPixels(0, 0, buffer.shape[1], buffer.shape[0], GL_RGB, GL_UNSIGNED_BYTE, buffer.ctypes.data)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        # images are at the bottom of the framebuffer, with rows read from the bottom
+        if as_array:
+            if len(set(camera[-2:] for camera in self._cameras)) > 1:
+                raise ValueError('cameras of different sizes cannot be returned as one array')
+            n, width, height = len(self._cameras), self._cameras[0][-2], self._cameras[0][-1]
+            # cameras are side by side, so that images are split along the width of the buffer
+            return buffer[::-1].reshape([height, n, width, 3]).transpose([1,0,2,3])
+        return OrderedDict([(camera[0], buffer[camera[-1]-1::-1, camera[-3]:camera[-3]+camera[-2]].copy()) for camera in self._cameras])
+
+    def _build_framebuffer(self, width, height):
+        """
+        Builds an offscreen framebuffer of given size with color and depth renderbuffers, in the window's context
+
+        Returns
+        -------
+        - (tuple(GLuint, GLuint*2)) the framebuffer and its renderbuffers
+
+        Exceptions
+        ----------
+        - Exception : if the framebuffer is not complete
+        """
+        framebuffer = GLuint()
+        renderbuffers = (GLuint * 2)()
+        glGenFramebuffers(1, byref(framebuffer))
+        glGenRenderbuffers(2, renderbuffers)
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        for renderbuffer, storage, attachment in zip(renderbuffers, [GL_RGB8, GL_DEPTH_COMPONENT24],
+                                                     [GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT]):
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self._delete_framebuffer((framebuffer, renderbuffers))
+            raise Exception('Cannot build a framebuffer of size ' + str((width, height)) + ' (status ' + str(status) + ')')
+        return framebuffer, renderbuffers
+
+    @staticmethod
+    def _delete_framebuffer(framebuffer):
+        """
+        Deletes a framebuffer built by _build_framebuffer, if not None
+        """
+        if framebuffer is not None:
+            glDeleteFramebuffers(1, byref(framebuffer[0]))
+            glDeleteRenderbuffers(2, framebuffer[1])
+
+    def image_buffers(self):
+        """
+        Returns the host buffers allocated by the window in which images are read back (cameras, render_poses, last image)
+        """
+        buffers = [self._camera_buffer, self._last_image, self._poses_framebuffer[2] if self._poses_framebuffer else None]
+        return [b for b in buffers if b is not None]
+
+    def memory_report(self):
+        """
+        Returns the memory used by the window (see RoundBotEnv.memory_report)
+
+        Returns
+        -------
+        - (OrderedDict) with :
+            'vertex_lists' : number of shown blocks
+            'vertex_bytes' : allocated bytes of the vertex buffers of batches, kept in host memory and copied on the GPU
+            'textures' : number of textures
+            'texture_bytes' : bytes of textures (RGBA) on the GPU
+            'duplicate_texture_bytes' : part of texture_bytes of textures loaded again from an already loaded image
+            'framebuffer_bytes' : bytes of offscreen framebuffers (cameras and render_poses) on the GPU
+            'buffer_bytes' : bytes of host buffers in which images are read back (cameras, render_poses, last image)
+            'background_bytes' : bytes of the cached static background (see draw_static_background)
+        """
+        vertex_bytes = 0
+        for batch in [self.batch, self.movable_batch]:
+            for domains in batch.group_map.values():
+                for domain in domains.values():
+                    vertex_bytes += sum(buffer.size for buffer, _ in domain.buffer_attributes)
+        texture_bytes, duplicate_texture_bytes, loaded = 0, 0, set()
+        for block_type, group in self.texture_groups.items():
+            size = group.texture.width*group.texture.height*4
+            texture_bytes += size
+            if TEXTURE_SOURCES.get(block_type) in loaded:
+                duplicate_texture_bytes += size
+            loaded.add(TEXTURE_SOURCES.get(block_type))
+        # color (RGB8) and depth (24 bits) renderbuffers, padded to 4 bytes per pixel
+        framebuffer_bytes = 0
+        if self._camera_framebuffer is not None:
+            framebuffer_bytes += self._camera_buffer.shape[0]*self._camera_buffer.shape[1]*8
+        if self._poses_framebuffer is not None:
+            framebuffer_bytes += self._poses_framebuffer[2].shape[0]*self._poses_framebuffer[2].shape[1]*8
+        return OrderedDict([('vertex_lists', len(self.shown)),
+                            ('vertex_bytes', vertex_bytes),
+                            ('textures', len(self.texture_groups)),
+                            ('texture_bytes', texture_bytes),
+                            ('duplicate_texture_bytes', duplicate_texture_bytes),
+                            ('framebuffer_bytes', framebuffer_bytes),
+                            ('buffer_bytes', sum(b.nbytes for b in self.image_buffers())),
+                            ('background_bytes', sum(b.nbytes for b in self._background) if self._background else 0),
+                            ])
+
+    def render_poses(self, poses, out=None, max_tiles=64):
+        """
+        Renders the views of the robot at given poses, without updating the model : the robot is moved to each pose
+        (camera and robot block), rendered in a tile of an offscreen framebuffer, and tiles are read back at once.
+        The model's robot is moved back to its pose at the end
+
+        Parameters
+        ----------
+        - poses : (np.array) array of shape [N, 5] of robot positions and rotations [x, y, z, rx, ry] (see Model.position_observation)
+        - out : (np.array) optional uint8 array of shape [N, height, width, 3] in which images are written
+        - max_tiles : (int) maximum number of poses rendered before each read back
+
+        Returns
+        -------
+        - (np.array) uint8 array of shape [N, height, width, 3] of images, with rows from the top. These are the images
+            of get_image with image_layout flip (or without layout, transposed and flipped), in the window's point of view
+
+        Note : global points of view render the robot block at each pose
+        """
+        poses = np.asarray(poses, dtype=float).reshape(-1, 5)
+        width, height = self.get_size()
+        if out is None:
+            out = np.empty([len(poses), height, width, 3], dtype=np.uint8)
+        elif out.shape != (len(poses), height, width, 3) or out.dtype != np.uint8:
+            raise ValueError('out must be a uint8 array of shape ' + str((len(poses), height, width, 3)))
+        # tiles are laid out in a grid of columns and rows fitting in the largest renderbuffer
+        limit = GLint()
+        glGetIntegerv(GL_MAX_RENDERBUFFER_SIZE, byref(limit))
+        columns = max(1, min(len(poses), max_tiles, limit.value // width))
+        rows = max(1, min(-(-min(len(poses), max_tiles) // columns), limit.value // height))
+        self.switch_to()
+        if self._poses_framebuffer is None or self._poses_framebuffer[0] != (columns, rows, width, height):
+            if self._poses_framebuffer is not None:
+                self._delete_framebuffer(self._poses_framebuffer[1])
+            self._poses_framebuffer = ((columns, rows, width, height), self._build_framebuffer(columns*width, rows*height),
+                                       np.empty([rows*height, columns*width, 3], dtype=np.uint8))
+        framebuffer, buffer = self._poses_framebuffer[1][0], self._poses_framebuffer[2]
+
+        model = self.model
+        robot = model.robot_block
+        position, rotation = np.array(model.robot_position), list(model.robot_rotation)
+        ortho_width = None if self.perspective else self.ortho_width
+        aspect_ratio = width / float(height)
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        glColor3d(1, 1, 1)
+        for start in range(0, len(poses), columns*rows):
+            batch_poses = poses[start:start+columns*rows]
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            for i, pose in enumerate(batch_poses):
+                # move the robot to the pose as in RobotBlock._move
+                model.robot_position, model.robot_rotation = pose[:3], list(pose[3:])
+                robot.translate_and_rotate_to(pose[:3], np.array([0.0,-pose[3],0.0]))
+                if robot in self.shown:
+                    self.shown[robot].vertices = robot.vertices
+                viewport = ((i % columns)*width, (i // columns)*height, width, height)
+                self._set_3d_camera(viewport, self.global_pov, self.perspective, self.focal, aspect_ratio, ortho_width)
+                self.batch.draw()
+                self.movable_batch.draw()
+            glReadPixels(0, 0, columns*width, rows*height, GL_RGB, GL_UNSIGNED_BYTE, buffer.ctypes.data)
+            # tiles are ordered by rows from the bottom of the buffer, with image rows read from the bottom
+            tiles = buffer.reshape([rows, height, columns, width, 3])[:,::-1].transpose([0,2,1,3,4])
+            out[start:start+len(batch_poses)] = tiles.reshape([rows*columns, height, width, 3])[:len(batch_poses)]
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+        # move the robot back to its pose
+        model.robot_position, model.robot_rotation = position, rotation
+        robot.translate_and_rotate_to(position, np.array([0.0,-rotation[0],0.0]))
+        if robot in self.shown:
+            self.shown[robot].vertices = robot.vertices
+        return out
+
     def switch_pov(self):
         """
         Switches point of view between subjective and global
         """
+        self.invalidate_static_background()
+        self._frame_version = None
         if not self.global_pov:
             self.global_pov = self.automatic_global_pov()
         else :
@@ -349,13 +971,13 @@ class MainWindow(RoundBotWindow):
         Class of main windows:
     """
 
-    def __init__(self, model, global_pov=None, perspective=True, interactive=False, focal=65.0, *args, **kwargs):
+    def __init__(self, model, global_pov=None, perspective=True, interactive=False, focal=65.0, static_background=False, skip_unchanged_frames=False, *args, **kwargs):
         """
         Parameters
         ----------
         see parent Class RoundBotWindow __init__ parameters
         """
-        super(MainWindow, self).__init__(model, global_pov, perspective, interactive, focal, *args, **kwargs)
+        super(MainWindow, self).__init__(model, global_pov, perspective, interactive, focal, static_background, skip_unchanged_frames, *args, **kwargs)
 
         # set of windows following this one
         self.followers = set()
@@ -392,6 +1014,12 @@ class MainWindow(RoundBotWindow):
         for _ in range(m):
             self.model.update(dt / m)
         # update following windows :
+        self.step_followers(dt)
+
+    def step_followers(self, dt):
+        """
+        Performs a drawing step in all following windows
+        """
         for w in self.followers:
             w.step(dt)
 
@@ -547,12 +1175,12 @@ class SecondaryWindow(RoundBotWindow):
         Class of secondary windows : used to observe model but don't interact with it
     """
 
-    def __init__(self, model, global_pov=None, perspective=True, focal=65.0, *args, **kwargs):
+    def __init__(self, model, global_pov=None, perspective=True, focal=65.0, static_background=False, skip_unchanged_frames=False, *args, **kwargs):
         self.message = ''
          # The label that is displayed in the top left of the canvas.
         self.label = pyglet.text.Label('', font_name='Arial', font_size=18, x=10, y=kwargs['height'] - 10, 
                                         anchor_x='left', anchor_y='top', color=(255, 255, 255, 255))    
-        super(SecondaryWindow, self).__init__(model=model, global_pov=global_pov, perspective=perspective, interactive=False, focal=focal, *args, **kwargs)
+        super(SecondaryWindow, self).__init__(model=model, global_pov=global_pov, perspective=perspective, interactive=False, focal=focal, static_background=static_background, skip_unchanged_frames=skip_unchanged_frames, *args, **kwargs)
 
     def _init(self):
         """
@@ -560,7 +1188,7 @@ class SecondaryWindow(RoundBotWindow):
         """
         self.main_window = None
         # setstart areas and rewards to be shown if they are not already visible in main window
-        for b in list(self.model.start_areas) + list(self.model.reward_blocks) :
+        for b in sorted(list(self.model.start_areas) + list(self.model.reward_blocks), key=lambda b : b.creation_index) :
             if not b.visible :
                 self.show_block(b)
 
@@ -242,7 +242,7 @@ def build_square_1wall_world(model, texture, robot_diameter=2, width=45, depth=4
 
     # Build reward block in the corner
     model.add_block( (n-(wr/2+dwalls/2), bot_height/2.0, -n+(wr/2+dwalls/2), wr, bot_height/3.0, wr, 0.0, 0.0, 0.0),
-                     texture=REWARD, block_type='reward', collision_reward = 1, visible_reward=visible_reward)
+                     texture=REWARD, block_type='reward', collision_reward = 1, visible=visible_reward)
     # Build robot block, set initial height to bot_heigh/2 + small offset to avoid ground collision
     model.add_block( (0, bot_height/2.0+0.1, 0, 2*bot_radius, bot_height, 2*bot_radius, 0.0, 0.0, 0.0),
                      texture=BOT, block_type='robot')
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import json
+from collections import OrderedDict
+
+from gym_round_bot.benchmarks import steps
+from gym_round_bot.benchmarks import results as benchmark_results
+from gym_round_bot.benchmarks import micro
+from gym_round_bot.benchmarks import memory
+
+"""
+    Tests of the benchmarks (see gym_round_bot.benchmarks), with few steps and in the current process
+"""
+
+
+def small_config(**changes):
+    """
+    Returns the base configuration of benchmarks with changed parameters
+    """
+    config = OrderedDict(steps.BASE_CONFIG)
+    config.update(changes)
+    return config
+
+
+def test_configurations_vary_one_parameter():
+    configs = steps.configurations(vary=['texture', 'obssize'])
+    assert configs[0] == steps.BASE_CONFIG
+    names = [steps.config_name(config) for config in configs]
+    assert names == ['base', 'texture=graffiti', 'texture=colours', 'obssize=64', 'obssize=256']
+    assert len(steps.configurations(vary=['texture', 'obssize'], full=True)) == 3*3
+
+
+def test_run_matrix(gl):
+    results = steps.run_matrix([small_config(texture='colours')], steps=20, resets=2, warmup=2, isolate=False, verbose=False)
+    assert results[0]['name'] == 'texture=colours'
+    for metric in steps.COMPARED_METRICS:
+        assert results[0][metric] is None or results[0][metric] > 0
+    assert results[0]['step_p50_ms'] <= results[0]['step_p99_ms'] <= results[0]['step_max_ms']
+
+
+def test_compare_flags_regressions():
+    baseline = [{'name' : 'a', 'steps_per_sec' : 100.0, 'step_p50_ms' : 1.0}, {'name' : 'b', 'steps_per_sec' : 100.0}]
+    results = [{'name' : 'a', 'steps_per_sec' : 85.0, 'step_p50_ms' : 1.05}, {'name' : 'b', 'steps_per_sec' : 95.0},
+               {'name' : 'c', 'steps_per_sec' : 1.0}]
+    regressions = benchmark_results.compare(results, baseline, metrics=steps.COMPARED_METRICS, tolerance=0.1)
+    assert [(r['name'], r['metric']) for r in regressions] == [('a', 'steps_per_sec')]
+
+
+def test_compare_reports_configurations_not_compared():
+    baseline = [{'name' : 'a', 'steps_per_sec' : 100.0}, {'name' : 'b', 'steps_per_sec' : 100.0},
+                {'name' : 'c', 'steps_per_sec' : 100.0}, {'name' : 'd', 'skipped' : 'ImportError : no display'}]
+    results = [{'name' : 'a', 'steps_per_sec' : 100.0}, {'name' : 'b', 'skipped' : 'ValueError : unknown world'},
+               {'name' : 'd', 'skipped' : 'ImportError : no display'}]
+    regressions = benchmark_results.compare(results, baseline, metrics=steps.COMPARED_METRICS, tolerance=0.1)
+    # configurations skipped in the baseline too are not reported
+    assert [(r['name'], r['reason']) for r in regressions] == [('b', 'skipped : ValueError : unknown world'),
+                                                               ('c', 'missing from results')]
+    assert all(r['metric'] is None for r in regressions)
+    benchmark_results.print_regressions(regressions, 'baseline.json')
+
+
+def test_run_matrix_skips_failing_configurations(gl):
+    configs = [small_config(world='nowhere'), small_config(texture='colours')]
+    results = steps.run_matrix(configs, steps=5, resets=1, warmup=1, isolate=False, verbose=False)
+    assert 'nowhere' in results[0]['skipped']
+    assert 'skipped' not in results[1] and results[1]['steps_per_sec'] > 0
+
+
+def test_micro_benchmarks():
+    cases = [case for case in micro.benchmarks() if case[0] in ['rotation_matrices', 'collide extra_blocks=0 speed=2.0']]
+    results = micro.run_benchmarks(cases, min_time=0.01, repeat=2, verbose=False)
+    assert [result['name'] for result in results] == ['collide extra_blocks=0 speed=2.0', 'rotation_matrices']
+    for result in results:
+        assert result['ns_per_op'] > 0 and result['number'] >= 1
+        assert result['peak_bytes'] is None or result['peak_bytes'] >= 0
+
+
+def test_micro_benchmarks_skip_failing_operations():
+    def failing():
+        def op():
+            raise RuntimeError('failed op')
+        return op, {}
+    cases = [('failing', failing)] + [case for case in micro.benchmarks() if case[0] == 'rotation_matrices']
+    results = micro.run_benchmarks(cases, min_time=0.01, repeat=2, verbose=False)
+    assert results[0]['skipped'] == 'RuntimeError : failed op'
+    assert results[1]['ns_per_op'] > 0
+
+
+def test_memory_benchmark(gl):
+    result = memory.run_memory_benchmark(small_config(texture='colours'), n_envs=2, n_steps=2)
+    assert len(result['rss_mb']) == 3
+    assert result['report_total_mb'] > 0
+
+
+def test_memory_benchmark_skips_failing_configurations(tmpdir, monkeypatch):
+    monkeypatch.setattr(steps, 'configurations', lambda full, vary : [small_config(world='nowhere')])
+    path = os.path.join(str(tmpdir), 'memory.json')
+    assert memory.main(['--envs', '1', '--steps', '1', '--json', path]) == 0
+    with open(path) as f:
+        results = json.load(f)
+    assert 'nowhere' in results[0]['skipped']
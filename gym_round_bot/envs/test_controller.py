@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import numpy as np
+import pytest
+
+from gym_round_bot.envs import round_bot_model
+from gym_round_bot.envs import round_bot_controller
+
+"""
+    Tests of the controllers (see round_bot_controller)
+"""
+
+
+@pytest.mark.parametrize('name', ['Theta', 'Theta2', 'XZ'])
+def test_action_tables_match_actions_mapping(name):
+    controller = round_bot_controller.make(name, speed=2, dtheta=15, xzrange=[2,1], speedrange=2, thetarange=2)
+    model = round_bot_model.Model(world={'name':'square','size':[20,20]}, texture='colours', random_start_pos=False)
+    controller.model = model
+    mapping = controller.actions_mapping
+    actions = sorted(mapping)
+    indices = controller.actions_to_indices(np.array(actions))
+    assert indices.tolist() == [mapping[action] for action in actions]
+    assert sorted(indices.tolist()) == list(range(controller.num_actions))
+
+    # tables hold the effects of actions performed one by one by the controller
+    strafes, speeds, dthetas = controller.action_tables(indices)
+    for action, strafe, speed, dtheta in zip(actions, strafes, speeds, dthetas):
+        model.strafe = [0.0, 0.0]
+        model.rolling_speed = 0.0
+        model.robot_rotation = np.array([0.0, 0.0])
+        controller.step(action)
+        assert np.allclose(model.strafe, strafe)
+        assert np.isclose(model.rolling_speed, speed)
+        assert np.isclose(model.robot_rotation[0], dtheta)
+
+
+def test_gaussian_noise_blocks_match_draws():
+    noise = round_bot_controller.GaussianNoise(block_size=3, seed=7)
+    samples = [noise(2.0) for i in range(10)]
+    # samples are drawn in blocks of the same generator, in order
+    rng = np.random.RandomState(7)
+    expected = np.concatenate([rng.standard_normal(3) for i in range(4)])[:10]
+    assert np.allclose(samples, 2.0*expected)
+    noise.seed(7)
+    assert noise(1.0) == expected[0]
+
+
+def test_gaussian_noise_defaults_to_global_generator():
+    np.random.seed(5)
+    noise = round_bot_controller.GaussianNoise(block_size=4)
+    samples = [noise(1.0) for i in range(6)]
+    np.random.seed(5)
+    expected = np.concatenate([np.random.standard_normal(4) for i in range(2)])[:6]
+    assert np.allclose(samples, expected)
+    # unseeded controllers built after the same global seed perform the same noisy actions
+    actions = []
+    for i in range(2):
+        np.random.seed(6)
+        controller = round_bot_controller.make('Theta', speed=2, noise_ratio=0.1)
+        actions.append([controller.noise(1.0) for j in range(3)])
+    assert actions[0] == actions[1]
+
+
+def test_gaussian_noise_sample_matches_calls():
+    calls = round_bot_controller.GaussianNoise(block_size=5, seed=3)
+    sampled = round_bot_controller.GaussianNoise(block_size=5, seed=3)
+    std = np.array([[1.0, 2.0], [0.5, 0.0], [3.0, 1.0]])
+    for i in range(4):
+        # samples not consumed before a refill are kept, whatever the number of samples asked
+        expected = np.array([calls(s) for s in std.ravel()]).reshape(std.shape)
+        assert np.allclose(sampled.sample(std), expected)
+        assert np.isclose(sampled(1.5), calls(1.5))
+
+
+def test_fixed_point_controller_sets_array_rotations():
+    controller = round_bot_controller.make('XZF', speed=1, xzrange=[1,1], fixed_point=[0,0])
+    model = round_bot_model.Model(world={'name':'square','size':[20,20]}, texture='colours', random_start_pos=False)
+    controller.model = model
+    model.robot_position = np.array([3.0, model.robot_position[1], 3.0])
+    controller.step((2,1))
+    # rotations are arrays, as those of other controllers, so that they can be changed in place
+    assert isinstance(model.robot_rotation, np.ndarray)
+    assert np.isclose(model.robot_rotation[0], 90+np.degrees(np.arctan2(-3.0, -3.0)))
+    model.change_robot_rotation(10.0, 0.0)
+    assert np.isclose(model.robot_rotation[0], 90+np.degrees(np.arctan2(-3.0, -3.0))+10.0)
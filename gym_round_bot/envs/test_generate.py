@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import numpy as np
+
+from gym_round_bot import generate
+
+"""
+    Tests of the offline dataset generator (see gym_round_bot.generate)
+"""
+
+
+def small_config(**overrides):
+    """
+    Returns the configuration of a small dataset of colours images
+    """
+    return generate.make_config(texture='colours', obssize=16, episodes=4, episode_length=6, **overrides)
+
+
+def load_arrays(out):
+    """
+    Returns copies of the arrays of a dataset by name
+    """
+    return dict((name, np.array(array)) for name, array in generate._open_arrays(out, 'r').items())
+
+
+def test_generate_and_resume(tmpdir, gl):
+    out = os.path.join(str(tmpdir), 'dataset')
+    config = small_config(policy='sticky')
+    manifest = generate.generate(config, out, verbose=False)
+    assert manifest['completed'] == 4
+    arrays = load_arrays(out)
+    assert arrays['observations'].shape == (4, 7, 16, 16, 3)
+    assert arrays['completed'].all()
+    assert np.all(arrays['lengths'] == 6)
+    assert manifest['frames'] == 4*7
+
+    # an interrupted generation only plays the episodes which are not completed
+    completed = np.load(os.path.join(out, 'completed.npy'), mmap_mode='r+')
+    completed[[1, 3]] = False
+    completed.flush()
+    del completed
+    for name in ['observations', 'positions']:
+        array = np.load(os.path.join(out, name + '.npy'), mmap_mode='r+')
+        array[[1, 3]] = 0
+        array.flush()
+        del array
+    manifest = generate.generate(config, out, verbose=False)
+    assert manifest['completed'] == 4
+    resumed = load_arrays(out)
+    for name in arrays:
+        assert np.array_equal(resumed[name], arrays[name])
+
+
+def test_workers_do_not_change_datasets(tmpdir, gl):
+    outs = [os.path.join(str(tmpdir), 'workers_' + str(workers)) for workers in [1, 3]]
+    for out, workers in zip(outs, [1, 3]):
+        generate.generate(small_config(), out, workers=workers, verbose=False)
+    first, second = load_arrays(outs[0]), load_arrays(outs[1])
+    for name in first:
+        assert np.array_equal(first[name], second[name])
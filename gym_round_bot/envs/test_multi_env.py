@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import numpy as np
+import pytest
+
+from gym_round_bot.envs import round_bot_model
+from gym_round_bot.envs import round_bot_controller
+
+"""
+    Tests of the multi-robot model and env (see round_bot_multi_env) against the single robot ones
+"""
+
+
+@pytest.fixture
+def make_multi_env(gl):
+    """
+    Returns a function building a MultiRoundBotEnv with the given set_metadata options (colours texture and small
+    observations by default). Tests using it are skipped if no OpenGL context can be created
+    """
+    from gym_round_bot.envs import round_bot_multi_env
+    envs = []
+
+    def make(**metadata):
+        metadata.setdefault('texture', 'colours')
+        round_bot_multi_env.set_metadata(**metadata)
+        env = round_bot_multi_env.MultiRoundBotEnv()
+        envs.append(env)
+        return env
+
+    yield make
+    # windows are closed at once rather than when envs are collected
+    for env in envs:
+        env._window.close()
+        env._window = None
+
+
+def test_single_robot_matches_env(make_env, make_multi_env, random_actions):
+    # XZ controllers do not randomize start rotations, which are drawn differently by the models
+    make_controller = lambda : round_bot_controller.make('XZ', speed=3, xzrange=[1,1])
+    single = make_env(controller=make_controller(), random_start=False, obssize=[24,16], image_layout={'flip':True})
+    multi = make_multi_env(n_robots=1, controller=make_controller(), random_start=False, obssize=[24,16])
+    observation, observations = single.reset(), multi.reset()
+    rewards = []
+    for action in [None] + random_actions(single.controller, 30, seed=19):
+        if action is not None:
+            observation, reward = single.step(action)[:2]
+            observations, robots_rewards = multi.step((action,))[:2]
+            # the model of the env keeps the reward of its last motion when the robot does not move
+            assert robots_rewards[0] == (reward if action != (1,1) else 0.0)
+            rewards.append(reward)
+        positions, rotations = multi.ground_truth
+        assert np.allclose(positions[0], single.ground_truth[0])
+        assert np.allclose(rotations[0], single.ground_truth[1])
+        # subjective views are rendered by a camera with rows from the top, as flipped images
+        assert np.array_equal(observations[0], observation)
+    # the robot crashed into walls
+    assert min(rewards) < 0
+
+
+def test_robots_stop_at_contact():
+    model = round_bot_model.MultiRobotModel(n_robots=2, world={'name':'square','size':[20,20]}, texture='colours',
+                                            random_start_pos=False)
+    model.reset()
+    width = model.robot_block.dimensions[0]
+    depths = np.copy(model.robots_position[:,2])
+    # robots are placed side by side along x, and move towards each other
+    assert model.robots_position[0,0] < model.robots_position[1,0]
+    for i in range(5):
+        model.set_robots_commands(np.array([[0.0, 1.0], [0.0, -1.0]]), np.ones(2), np.zeros(2))
+        model.update(1.0)
+        assert model.robots_position[1,0] - model.robots_position[0,0] >= width
+    assert np.all(model.robots_collided)
+    assert np.allclose(model.robots_position[:,2], depths)
+
+
+def test_trigger_buttons_raise(make_multi_env):
+    with pytest.raises(ValueError, match='trigger buttons'):
+        round_bot_model.MultiRobotModel(n_robots=2, texture='colours', trigger_button=True)
+    with pytest.raises(ValueError, match='trigger buttons'):
+        make_multi_env(trigger_button=True)
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import numpy as np
+import pytest
+
+from gym_round_bot.envs import round_bot_observation
+from gym_round_bot.envs import round_bot_controller
+from gym_round_bot.envs import round_bot_window
+
+"""
+    Tests of the observation helpers (see round_bot_observation) and of the env options using them
+"""
+
+
+def test_frame_stack_order():
+    stack = round_bot_observation.FrameStack(3, (2,), np.int64)
+    assert np.array_equal(stack.reset(np.array([0,0])), [[0,0]]*3)
+    for i in range(1, 8):
+        stacked = stack.append(np.array([i,-i]))
+        # oldest to newest, the reset frame filling the stack at first
+        expected = [[max(j,0),-max(j,0)] for j in range(i-2, i+1)]
+        assert np.array_equal(stacked, expected)
+    # frames written in place before append
+    stack.next_frame[...] = [8,-8]
+    assert np.array_equal(stack.append(), [[6,-6],[7,-7],[8,-8]])
+    kept = stack.materialize()
+    stack.append(np.array([9,-9]))
+    assert np.array_equal(kept, [[6,-6],[7,-7],[8,-8]])
+
+
+def test_env_frame_stack(make_env, reset, random_actions):
+    env = make_env(frame_stack=3)
+    raw = make_env()
+    stacked = reset(env)
+    frame = np.copy(reset(raw))
+    assert np.array_equal(stacked, [frame]*3)
+    frames = [frame]*3
+    for action in random_actions(env.controller, 10, seed=2):
+        stacked = env.step(action)[0]
+        frames = frames[1:] + [np.copy(raw.step(action)[0])]
+        assert np.array_equal(stacked, frames)
+
+
+def test_pipeline_matches_numpy():
+    frame = np.random.RandomState(0).randint(0, 256, size=(20,24,3)).astype(np.uint8)
+    pipeline = round_bot_observation.ObservationPipeline([('crop',(2,18,4,20)), ('resize',(8,4)), ('grayscale',),
+                                                          ('normalize','float16'), ('channel_first',)], frame.shape)
+    # nearest neighbours of the cropped frame
+    expected = frame[2:18, 4:20][np.arange(8)*16//8][:, np.arange(4)*16//4]
+    expected = np.round(np.dot(expected.astype(float), [0.299, 0.587, 0.114]))
+    expected = (expected*2.0/255 - 1.0)[np.newaxis]
+    output = pipeline(frame)
+    assert output.shape == pipeline.output_shape == (1,8,4)
+    assert output.dtype == np.float16
+    # luminances rounded differently differ by one level
+    assert np.allclose(output, expected, atol=2.0/255 + 1e-3)
+
+
+def test_env_pipeline_matches_pipeline(make_env, reset, random_actions):
+    steps = [('crop',(0,12,2,16)), ('resize',(6,7)), ('grayscale',), ('normalize','float32',0.0,1.0)]
+    env = make_env(observation_pipeline=steps)
+    raw = make_env()
+    frame = reset(raw)
+    pipeline = round_bot_observation.ObservationPipeline(steps, frame.shape)
+    assert np.array_equal(reset(env), pipeline(frame))
+    for action in random_actions(env.controller, 10, seed=9):
+        assert np.array_equal(env.step(action)[0], pipeline(raw.step(action)[0]))
+
+
+def test_observation_cache_matches_render(make_env, reset, random_actions):
+    make_controller = lambda : round_bot_controller.make('XZ', speed=1, xzrange=[1,1])
+    cached = make_env(controller=make_controller(), random_start=False, observation_cache=2**20)
+    uncached = make_env(controller=make_controller(), random_start=False)
+    assert np.array_equal(reset(cached), reset(uncached))
+    # random lattice moves come back to already rendered poses
+    for action in random_actions(cached.controller, 40, seed=10):
+        assert np.array_equal(cached.step(action)[0], uncached.step(action)[0])
+    assert cached.observation_cache_stats()['hits'] > 0
+
+
+def test_observation_cache_invalidation(make_env, reset):
+    cached = make_env(global_pov=True, random_start=False, observation_cache=2**20)
+    uncached = make_env(global_pov=True, random_start=False)
+    reset(cached)
+    reset(uncached)
+    # null actions (1,1) render the same pose again
+    first = np.copy(cached.step((1,1))[0])
+    hits = cached.observation_cache_stats()['hits']
+    assert np.array_equal(cached.step((1,1))[0], first)
+    assert cached.observation_cache_stats()['hits'] == hits + 1
+
+    # hiding the ground changes the rendered scene of the same pose, in both envs
+    for env in [cached, uncached]:
+        model = env._model
+        ground = max(model.visible_blocks, key=lambda b : b.dimensions[0]*b.dimensions[2])
+        model.hide_block(ground)
+    observation = cached.step((1,1))[0]
+    assert not np.array_equal(observation, first)
+    assert np.array_equal(observation, uncached.step((1,1))[0])
+
+
+def test_depth_matches_distances_to_walls(make_env, random_actions):
+    env = make_env(controller=round_bot_controller.make('XZ', speed=1, xzrange=[1,1]), random_start=False,
+                   observation_channels=['depth'])
+    near, far = env._window.clip_planes()
+    depth = env.reset()
+    for action in [None] + random_actions(env.controller, 20, seed=9):
+        if action is not None:
+            depth = env.step(action)[0]
+        assert depth.shape == (16, 16, 1) and depth.dtype == np.float32
+        # the background is at the far plane, which bounds the observation space
+        assert near <= depth.min() and depth.max() == far == env.observation_space.high.max()
+        # the robot looks to -z, at the wall whose inner face is at -9.5
+        (x, y, z), rotation = env.ground_truth
+        assert np.isclose(depth[8,8,0], 9.5+z, atol=1e-3)
+
+
+def test_channels_match_rgb_observations(make_env, reset, random_actions):
+    channels = make_env(global_pov=True, observation_channels=['rgb', 'depth', 'segmentation'])
+    plain = make_env(global_pov=True)
+    ids = round_bot_window.SEGMENTATION_IDS
+    observation, expected = reset(channels), reset(plain)
+    for action in [None] + random_actions(plain.controller, 10, seed=10):
+        if action is not None:
+            observation, expected = channels.step(action)[0], plain.step(action)[0]
+        # rgb is read before the segmentation pass overwrites the colors of the frame
+        assert np.array_equal(observation['rgb'], expected)
+        segmentation, depth = observation['segmentation'], observation['depth']
+        assert set(np.unique(segmentation)) == set([ids['brick'], ids['start'], ids['robot']])
+        # the robot is seen from above, over the ground
+        assert depth[segmentation == ids['robot']].max() < depth[segmentation == ids['brick']].max()
+
+
+def test_palette_indexer():
+    palette = np.array([[0,0,0], [255,0,0], [0,128,255], [10,20,30]], dtype=np.uint8)
+    indexer = round_bot_observation.PaletteIndexer(palette)
+    frame = palette[np.array([[3,0],[1,2]])]
+    assert np.array_equal(indexer(frame), [[3,0],[1,2]])
+    # colors out of the palette are mapped to the nearest one
+    assert np.array_equal(indexer(np.array([[[250,5,5], [12,18,33]]], dtype=np.uint8)), [[1,3]])
+
+
+def test_env_palette_observations(make_env, reset, random_actions):
+    env = make_env(palette_observations=True, distractors=True)
+    for action in [None] + random_actions(env.controller, 10, seed=11):
+        observation = reset(env) if action is None else env.step(action)[0]
+        # rendered colors are exactly colors of the palette
+        assert np.array_equal(env.palette[observation], env._window.get_image())
+    with pytest.raises(ValueError, match='at most 256 rendered colors'):
+        make_env(palette_observations=True, trigger_button=True)
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import numpy as np
+import pytest
+
+from gym_round_bot.envs import round_bot_controller
+
+"""
+    Tests of set_metadata options of RoundBotEnv against the equivalent plain env
+"""
+
+
+def fast_controller():
+    """
+    Returns a Theta controller fast enough to crash into the walls of the square world in a few steps
+    """
+    return round_bot_controller.make(name='Theta', dtheta=30, speed=3, int_actions=False, xzrange=[1,1], thetarange=1)
+
+
+@pytest.mark.parametrize('normalize_rewards', [False, True])
+def test_action_repeat_matches_single_steps(make_env, reset, random_actions, normalize_rewards):
+    repeated = make_env(controller=fast_controller(), action_repeat=3, normalize_rewards=normalize_rewards)
+    single = make_env(controller=fast_controller())
+    reset(repeated)
+    reset(single)
+    rewards = []
+    for action in random_actions(repeated.controller, 20, seed=6):
+        observation, reward, done, info = repeated.step(action)
+        expected = 0.0
+        for i in range(3):
+            expected_observation, single_reward = single.step(action)[:2]
+            expected += single_reward
+        # rewards are summed over repetitions, then normalized like the rewards of single steps
+        if normalize_rewards:
+            expected /= single._model.max_reward
+        assert np.array_equal(observation, expected_observation)
+        assert np.allclose(repeated.ground_truth[0], single.ground_truth[0])
+        assert np.isclose(reward, expected)
+        rewards.append(reward)
+    assert np.any(rewards)
+    if normalize_rewards:
+        assert np.all(np.abs(rewards) <= 3)
+
+
+def test_action_repeat_accepts_numpy_integers(make_env):
+    assert make_env(action_repeat=np.int64(2))._action_repeat == 2
+    with pytest.raises(ValueError):
+        make_env(action_repeat=0)
+
+
+def test_spaces_are_shared_and_read_only(make_env):
+    env = make_env()
+    for space, copy in [(env.observation_space, env.copy_observation_space()), (env.action_space, env.copy_action_space())]:
+        array = space.high if hasattr(space, 'high') else space.nvec
+        with pytest.raises(ValueError):
+            array[...] = 0
+        # copies are modifiable without changing the shared space
+        copied = copy.high if hasattr(copy, 'high') else copy.nvec
+        copied[...] = 0
+        assert np.any(array != 0)
+    assert env.observation_space is env.observation_space
+    assert env.action_space is env.controller.action_space
+
+
+def test_skip_unchanged_frames_matches_full_render(make_env, reset, random_actions):
+    skipping = make_env(skip_unchanged_frames=True)
+    full = make_env()
+    reset(skipping)
+    reset(full)
+    # null actions (1,1) leave the scene unchanged
+    actions = [action for a in random_actions(full.controller, 10, seed=7) for action in [a, (1,1), (1,1)]]
+    skipped = 0
+    for i, action in enumerate(actions):
+        if i == len(actions)//2:
+            # hiding a block changes the scene without moving the robot
+            for env in [skipping, full]:
+                env._model.hide_block(max(env._model.visible_blocks, key=lambda b : b.dimensions[0]*b.dimensions[2]))
+        version = skipping._model.scene_version
+        observation = skipping.step(action)[0]
+        skipped += skipping._model.scene_version == version
+        assert np.array_equal(observation, full.step(action)[0])
+    assert skipped > 0
+
+
+def test_ranges_match_distances_to_walls(make_env, random_actions):
+    env = make_env(controller=round_bot_controller.make('XZ', speed=1, xzrange=[1,1]), random_start=False,
+                   position_observations='ranges', range_rays=4)
+    ranges = env.reset()
+    for action in [None] + random_actions(env.controller, 30, seed=8):
+        if action is not None:
+            ranges = env.step(action)[0]
+        (x, y, z), rotation = env.ground_truth
+        assert rotation[0] == 0.0
+        # rays point to +z, -x, -z and +x in the square world whose walls inner faces are at -9.5 and 9.5
+        assert np.allclose(ranges, [[9.5-z, 9.5+x, 9.5+z, 9.5-x]])
+    assert env._window is None
+
+
+@pytest.mark.parametrize('options, message', [
+    (dict(cameras={'top':{'size':[16,16]}}, frame_stack=2), 'cameras cannot be used with frame_stack'),
+    (dict(observation_atlas='missing_atlas', observation_cache=2**20), 'observation_atlas cannot be used with winsize or observation_cache'),
+    (dict(palette_observations=True, texture='graffiti'), 'palette_observations can only be used with colours texture'),
+    (dict(palette_observations=True, image_layout={'grayscale':True}), 'palette_observations need rgb images with channels last'),
+    (dict(observation_channels=['depth', 'rgb'], frame_stack=2), 'observations with several channels cannot be used with frame_stack'),
+    (dict(observation_cache=2**20, position_observations='one'), 'observation_cache can only be used with image observations'),
+    (dict(frame_stack=2.5), 'frame_stack must be None or an int >= 1')])
+def test_incompatible_options_raise(make_env, options, message):
+    # options are checked before anything is loaded, e.g. the missing atlas
+    with pytest.raises(ValueError, match=message):
+        make_env(**options)
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import json
+import numpy as np
+
+from gym_round_bot.envs import round_bot_perf
+from gym_round_bot.envs import round_bot_controller
+
+"""
+    Tests of the instrumentation of the env : step phases timing and traces, physics counters and memory report
+"""
+
+
+def test_phase_timer_excludes_nested_phases(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(round_bot_perf, 'clock', lambda : now[0])
+    timer = round_bot_perf.PhaseTimer(window=10)
+    def inner():
+        now[0] += 2.0
+    inner = timer.wrap('inner', inner)
+    def outer():
+        now[0] += 1.0
+        inner()
+        now[0] += 1.0
+    outer = timer.wrap('outer', outer)
+    def step(action):
+        outer()
+        inner()
+        return None, 0.0, False, {}
+    step = timer.wrap_step(step)
+    for i in range(3):
+        step(None)
+    stats = timer.stats()
+    assert [stats[phase]['count'] for phase in ['inner', 'outer', 'step']] == [6, 3, 3]
+    assert stats['outer']['mean'] == 2.0
+    assert stats['inner']['max'] == 2.0
+    assert stats['step']['mean'] == 6.0
+
+
+def test_env_perf_stats(make_env, reset, random_actions):
+    env = make_env(perf_stats=True)
+    reset(env)
+    assert env.get_perf_stats(reset=True)['reset']['count'] == 1
+    for action in random_actions(env.controller, 5, seed=15):
+        env.step(action)
+    stats = env.get_perf_stats(reset=True)
+    for phase in ['step', 'act', 'update', 'draw', 'readback']:
+        assert stats[phase]['count'] == 5
+        assert 0.0 <= stats[phase]['p50'] <= stats[phase]['p99'] <= stats[phase]['max']
+    assert 'reset' not in stats
+
+
+def test_traces_are_valid_json(tmpdir, make_env, reset, random_actions):
+    envs = [make_env(trace_path=os.path.join(str(tmpdir), 'trace_{env}.json')) for i in range(2)]
+    paths = [os.path.join(str(tmpdir), 'trace_' + str(env.id) + '.json') for env in envs]
+    for env in envs:
+        reset(env)
+        for action in random_actions(env.controller, 5, seed=16):
+            env.step(action)
+        env.close_trace()
+    for env, path in zip(envs, paths):
+        with open(path) as f:
+            events = json.load(f)
+        steps = [e for e in events if e['name'] == 'step']
+        assert len(steps) == 5
+        assert all(e['ph'] == 'X' and e['tid'] == env.id and e['dur'] >= 0 for e in steps)
+    merged = os.path.join(str(tmpdir), 'merged.json')
+    round_bot_perf.merge_traces(paths, merged)
+    with open(merged) as f:
+        events = json.load(f)
+    assert set(e['tid'] for e in events if e['name'] == 'step') == set(env.id for env in envs)
+
+
+def test_perf_info_is_stable(make_env, reset, random_actions):
+    env = make_env(perf_stats=1, perf_stats_info=True)
+    reset(env)
+    actions = random_actions(env.controller, 3, seed=17)
+    info = env.step(actions[0])[3]
+    durations = dict(info['perf'])
+    assert 'act' in durations and 'draw' in durations
+    # next steps and resets do not change the durations handed out with a step
+    env.step(actions[1])
+    reset(env)
+    assert info['perf'] == durations
+    # perf_stats=1 keeps the last duration only
+    env.step(actions[2])
+    stats = env.get_perf_stats()
+    assert stats['step']['count'] == 3
+    assert stats['step']['histogram'].sum() == 1
+
+
+def test_physics_counters(make_env, reset):
+    env = make_env(controller=round_bot_controller.make('XZ', speed=1, xzrange=[1,1]), random_start=False)
+    reset(env)
+    totals = env.get_physics_counters()['total']
+    # the robot moves towards a wall at 9.5 and is stopped by it
+    for i in range(15):
+        env.step((2,1))
+        counters = env.get_physics_counters()
+        for name, value in counters['step'].items():
+            totals[name] += value
+        assert counters['total'] == totals
+    assert totals['sub_motions'] >= 15
+    assert totals['block_tests'] > 0
+    assert totals['contacts'] > 0
+    assert env.ground_truth[0][2] < 9.5
+
+
+def test_memory_report(make_env, reset):
+    plain = make_env(obssize=[32,32])
+    stacked = make_env(obssize=[32,32], frame_stack=4)
+    cached = make_env(obssize=[32,32], observation_cache=2**20)
+    reports = []
+    for env in [plain, stacked, cached]:
+        reset(env)
+        env.step((1,1))
+        report = env.memory_report()
+        categories = ['model_blocks', 'vertex_data', 'textures', 'framebuffers', 'observation_buffers', 'caches']
+        assert list(report)[:len(categories)] == categories
+        assert report['total'] == sum(report[c] for c in categories)
+        assert report['details']['windows'] == 1
+        reports.append(report)
+    # the frame stack holds at least 4 frames of 32x32x3 bytes
+    assert reports[1]['observation_buffers'] - reports[0]['observation_buffers'] >= 4*32*32*3
+    assert reports[2]['caches'] == cached.observation_cache_stats()['nbytes'] > 0
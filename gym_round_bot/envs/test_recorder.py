@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import pytest
+import numpy as np
+from collections import OrderedDict
+
+from gym_round_bot.envs import round_bot_recorder
+
+"""
+    Tests of the trajectory recorder and reader (see round_bot_recorder)
+"""
+
+
+def test_round_trip_across_chunks(tmpdir):
+    path = os.path.join(str(tmpdir), 'run')
+    fields = OrderedDict([('observations', ((4,3), np.uint8)), ('rewards', ((), np.float32))])
+    # chunks and blocks smaller than the recording and not multiple of each other
+    recorder = round_bot_recorder.TrajectoryRecorder(path, fields, chunk_size=7, block_size=3, max_blocks=2)
+    rng = np.random.RandomState(0)
+    observations = rng.randint(0, 256, size=(25,4,3)).astype(np.uint8)
+    rewards = rng.standard_normal(25).astype(np.float32)
+    for observation, reward in zip(observations, rewards):
+        recorder.append(observation, reward)
+    recorder.close()
+
+    reader = round_bot_recorder.TrajectoryReader(path)
+    assert len(reader) == 25
+    assert reader.chunk_rows == [7, 7, 7, 4]
+    for i in [0, 6, 7, 13, 24, -1]:
+        row = reader[i]
+        assert np.array_equal(row['observations'], observations[i])
+        assert row['rewards'] == rewards[i]
+    indices = np.array([24, 0, 7, 6, 15, 15])
+    rows = reader[indices]
+    assert np.array_equal(rows['observations'], observations[indices])
+    assert np.array_equal(rows['rewards'], rewards[indices])
+    rows = reader[5:20:2]
+    assert np.array_equal(rows['observations'], observations[5:20:2])
+
+
+def test_env_recording(tmpdir, make_env, reset, random_actions):
+    path = os.path.join(str(tmpdir), 'env')
+    env = make_env(record_path=path, record_chunk_size=8)
+    observations, actions = [np.copy(reset(env))], random_actions(env.controller, 20, seed=1)
+    positions = [env.ground_truth[0]]
+    for action in actions:
+        observations.append(np.copy(env.step(action)[0]))
+        positions.append(env.ground_truth[0])
+    env.close_recorder()
+
+    reader = round_bot_recorder.TrajectoryReader(path)
+    assert len(reader) == 21
+    rows = reader[:]
+    assert np.array_equal(rows['observations'], np.array(observations))
+    assert np.array_equal(rows['actions'][1:], np.array(actions, dtype=np.float32))
+    assert np.allclose(rows['positions'], np.array(positions))
+    assert rows['firsts'][0] and not np.any(rows['firsts'][1:])
+
+
+def test_recorded_observations_match_recorded_poses(tmpdir, make_env, reset, random_actions):
+    path = os.path.join(str(tmpdir), 'env')
+    env = make_env(record_path=path, image_layout={'flip':True})
+    actions = random_actions(env.controller, 10, seed=18)
+    for episode in range(2):
+        reset(env, seed=episode)
+        for action in actions:
+            env.step(action)
+    env.close_recorder()
+    rows = round_bot_recorder.TrajectoryReader(path)[:]
+    assert np.count_nonzero(rows['firsts']) == 2
+    # reset rows hold the frame of their reset pose, not of the previous episode
+    images = env.render_poses(np.concatenate([rows['positions'], rows['rotations']], axis=1))
+    difference = np.abs(images.astype(int) - rows['observations'].astype(int))
+    assert difference.max() <= 1
+    assert np.count_nonzero(difference) <= 0.001*difference.size
+
+
+def test_step_before_reset_raises(tmpdir, make_env):
+    env = make_env(record_path=os.path.join(str(tmpdir), 'env'))
+    with pytest.raises(ValueError, match='reset must be called before step'):
+        env.step((1,1))
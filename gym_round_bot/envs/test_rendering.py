@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import numpy as np
+import pytest
+
+from gym_round_bot.envs import round_bot_controller
+
+"""
+    Tests comparing the renderings of the different rendering paths of the env to the renderings of steps
+"""
+
+
+def play(env, reset, actions):
+    """
+    Returns the copies of the observations of a seeded episode and the robot poses [x, y, z, rx, ry] of its frames
+    """
+    observations = [np.copy(reset(env))]
+    poses = [np.concatenate(env.ground_truth)]
+    for action in actions:
+        observations.append(np.copy(env.step(action)[0]))
+        poses.append(np.concatenate(env.ground_truth))
+    return np.array(observations), np.array(poses)
+
+
+def top_down(image, width, height):
+    """
+    Returns an image read without image_layout ([width, height, 3], rows from the bottom) as [height, width, 3] with rows from the top
+    """
+    return image.reshape(height, width, 3)[::-1]
+
+
+def assert_close_images(images, expected):
+    """
+    Asserts that images are equal, but for rasterization differences of one level on a few pixels
+    """
+    difference = np.abs(images.astype(int) - expected.astype(int))
+    assert difference.max() <= 1
+    assert np.count_nonzero(difference) <= 0.001*difference.size
+
+
+def test_atlas_matches_live_render(tmpdir, make_env, reset, random_actions):
+    path = os.path.join(str(tmpdir), 'atlas')
+    make_controller = lambda : round_bot_controller.make('XZ', speed=1, xzrange=[1,1])
+    live = make_env(controller=make_controller(), random_start=False)
+    # the poses reachable in a few actions are enumerated first
+    live.bake_observation_atlas(path, max_poses=1000)
+    baked = make_env(controller=make_controller(), random_start=False, observation_atlas=path)
+    actions = random_actions(live.controller, 10, seed=3)
+    observations, poses = play(live, reset, actions)
+    baked_observations, baked_poses = play(baked, reset, actions)
+    assert np.array_equal(baked_poses, poses)
+    assert baked._observation_atlas.misses == 0
+    assert np.array_equal(baked_observations, observations)
+
+
+def test_atlas_raises_on_poses_not_baked(tmpdir, make_env, reset, random_actions):
+    path = os.path.join(str(tmpdir), 'atlas')
+    make_controller = lambda : round_bot_controller.make('XZ', speed=1, xzrange=[1,1])
+    live = make_env(controller=make_controller(), random_start=False)
+    live.bake_observation_atlas(path, max_poses=5)
+    actions = [(2,1)]*10
+    exact = make_env(controller=make_controller(), random_start=False, observation_atlas=path)
+    reset(exact)
+    with pytest.raises(KeyError, match='not in the observation atlas'):
+        for action in actions:
+            exact.step(action)
+    # approximate atlases read the nearest baked pose instead
+    approximate = make_env(controller=make_controller(), random_start=False, observation_atlas=path,
+                           observation_atlas_approximate=True)
+    reset(approximate)
+    for action in actions:
+        approximate.step(action)
+    assert approximate._observation_atlas.misses > 0
+
+
+def test_same_scene_renders_identically(make_env, reset, random_actions):
+    # the global point of view renders the coplanar tops of crossing walls
+    first = make_env(obssize=[64,64], global_pov=True)
+    second = make_env(obssize=[64,64], global_pov=True)
+    actions = random_actions(first.controller, 10, seed=12)
+    assert np.array_equal(play(first, reset, actions)[0], play(second, reset, actions)[0])
+
+
+def test_static_background_matches_full_render(make_env, reset, random_actions):
+    metadata = dict(obssize=[64,64], global_pov=True, random_start=False)
+    for image_layout in [None, {'flip':True}]:
+        full = make_env(image_layout=image_layout, **metadata)
+        composited = make_env(image_layout=image_layout, static_background=True, **metadata)
+        actions = random_actions(full.controller, 20, seed=5)
+        assert np.array_equal(play(composited, reset, actions)[0], play(full, reset, actions)[0])
+
+
+@pytest.mark.parametrize('layout', [{'flip':True}, {'channel_first':True}, {'flip':True, 'channel_first':True},
+                                    {'grayscale':True}, {'flip':True, 'grayscale':True, 'channel_first':True}])
+def test_image_layouts_match_default_buffer(make_env, reset, random_actions, layout):
+    width, height = 24, 16
+    env = make_env(obssize=[width, height], image_layout=layout)
+    default = make_env(obssize=[width, height])
+    actions = random_actions(env.controller, 10, seed=13)
+    images, expected = play(env, reset, actions)[0], play(default, reset, actions)[0]
+    expected = np.array([top_down(image, width, height) for image in expected])
+    if not layout.get('flip'):
+        expected = expected[:,::-1]
+    if layout.get('grayscale'):
+        expected = np.round(np.dot(expected.astype(float), [0.299, 0.587, 0.114]))[...,np.newaxis]
+    if layout.get('channel_first'):
+        expected = expected.transpose(0, 3, 1, 2)
+    assert images.shape == expected.shape
+    # the scene is rendered upside down when flipped, and luminances may be rounded differently
+    assert_close_images(images, expected)
+
+
+def test_cameras_match_single_env_renders(make_env, reset, random_actions):
+    cameras = {'ego':{'size':[24,16]}, 'top':{'size':[16,16], 'global_pov':True}}
+    env = make_env(cameras=cameras)
+    ego = make_env(obssize=[24,16])
+    top = make_env(obssize=[16,16], global_pov=True)
+    actions = random_actions(env.controller, 10, seed=14)
+    # images of cameras are overwritten by next steps
+    copy = lambda observation : dict((name, np.copy(image)) for name, image in observation.items())
+    observations = [copy(reset(env))] + [copy(env.step(action)[0]) for action in actions]
+    observations = dict((name, np.array([o[name] for o in observations])) for name in cameras)
+    for name, single, (width, height) in [('ego', ego, [24,16]), ('top', top, [16,16])]:
+        expected = np.array([top_down(image, width, height) for image in play(single, reset, actions)[0]])
+        assert_close_images(observations[name], expected)
+
+
+def test_render_poses_match_steps(make_env, reset, random_actions):
+    env = make_env(obssize=[32,32], image_layout={'flip':True})
+    observations, poses = play(env, reset, random_actions(env.controller, 30, seed=4))
+    assert_close_images(env.render_poses(poses), observations)
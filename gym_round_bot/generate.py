@@ -0,0 +1,384 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Cressot Loic
+    ISIR - CNRS / Sorbonne Université
+    02/2018
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import importlib
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+
+from gym_round_bot.envs.round_bot_perf import clock
+
+"""
+    This file generates offline datasets of episodes of RoundBotEnv played by a random or scripted policy, with episodes
+    sharded across a pool of processes which write directly into preallocated memory-mapped arrays :
+
+        python -m gym_round_bot.generate --out dataset --episodes 10000 --episode-length 100 --workers 8
+        python -m gym_round_bot.generate --out dataset --config config.json
+
+    A dataset directory holds :
+        - manifest.json : configuration of the dataset (see DEFAULT_CONFIG), shapes and dtypes of arrays, number of
+            completed episodes and frames, and the throughput of the last run
+        - <field>.npy : (np.array) one memory-mappable array by field (see FIELDS), of shape [episodes, steps]+field_shape,
+            where steps is episode_length+1 for observations, positions and rotations (the first one is given by the reset)
+            and episode_length for actions, rewards and dones
+        - lengths.npy : (np.array(int32)) number of steps of each episode, which ends early when the env returns done
+        - completed.npy : (np.array(bool)) whether each episode is completely written
+
+    Episode i is played with seed seed+i whichever the worker playing it, so that datasets do not depend on the number of
+    workers. An episode is marked completed only once its rows are flushed : running the same command again after an
+    interruption resumes the generation with the episodes which are not completed.
+"""
+
+# default configuration of datasets, which a JSON configuration file and command line options override
+DEFAULT_CONFIG = OrderedDict([('world', 'square'),
+                              ('world_size', 20),
+                              ('texture', 'minecraft'),
+                              ('controller', OrderedDict([('name', 'Theta'), ('dtheta', 20), ('speed', 1),
+                                                          ('xzrange', [2,2]), ('thetarange', 2)])), # kwargs of round_bot_controller.make
+                              ('obssize', 64),
+                              ('policy', 'random'), # 'random', 'sticky' or 'module:function' (see make_policy)
+                              ('episodes', 100),
+                              ('episode_length', 100),
+                              ('seed', 0),
+                              ('env', OrderedDict()), # other kwargs of round_bot_env.set_metadata
+                              ])
+
+# fields of datasets after observations, with their shapes (None for the action shape) and dtypes
+FIELDS = OrderedDict([('actions', (None, np.float32)),
+                      ('rewards', ((), np.float32)),
+                      ('dones', ((), np.bool_)),
+                      ('positions', ((3,), np.float64)),
+                      ('rotations', ((2,), np.float64)),
+                      ])
+
+# probability of repeating the previous action with the sticky policy
+STICKY_PROBABILITY = 0.9
+
+# state of worker processes, set by _init_worker
+_worker = {}
+
+
+def make_config(path=None, **overrides):
+    """
+    Returns a dataset configuration
+
+    Parameters
+    ----------
+    - path : (str) path of a JSON file of configuration values overriding DEFAULT_CONFIG, or None
+    - overrides : values overriding DEFAULT_CONFIG and the file's values, ignored if None
+
+    Exceptions
+    ----------
+    - ValueError : raised if a configuration key is unknown
+    """
+    config = OrderedDict(DEFAULT_CONFIG)
+    values = OrderedDict()
+    if path:
+        with open(path) as f:
+            values.update(json.load(f, object_pairs_hook=OrderedDict))
+    values.update((key, value) for key, value in overrides.items() if value is not None)
+    for key, value in values.items():
+        if key not in config:
+            raise ValueError('unknown dataset configuration key ' + key + ', keys are : ' + str(list(config.keys())))
+        if key == 'controller' and not isinstance(value, dict):
+            # only a controller name is given, other controller kwargs are kept
+            value = OrderedDict(config['controller'], name=value)
+        config[key] = value
+    return config
+
+
+def make_env(config):
+    """
+    Builds a RoundBotEnv with a dataset configuration and a new controller
+    """
+    # imported here so that the main process does not create any OpenGL context before forking workers
+    from gym_round_bot.envs import round_bot_env
+    from gym_round_bot.envs import round_bot_controller
+    metadata = dict(config['env'])
+    metadata.update(world={'name' : config['world'], 'size' : [config['world_size']]*2},
+                    texture=config['texture'],
+                    controller=round_bot_controller.make(**config['controller']),
+                    obssize=[config['obssize']]*2)
+    round_bot_env.set_metadata(**metadata)
+    return round_bot_env.RoundBotEnv()
+
+
+def make_policy(name, controller, rng):
+    """
+    Returns a policy playing an episode
+
+    Parameters
+    ----------
+    - name : (str) 'random' for uniformly random actions, 'sticky' for random actions repeated with probability
+        STICKY_PROBABILITY (longer straight motions), or 'module:function' for a scripted policy, where
+        function(controller, rng) returns the policy of an episode
+    - controller : (round_bot_controller.Controller) controller of the env
+    - rng : (np.random.RandomState) random generator of the episode
+
+    Returns
+    -------
+    - (function) policy returning the action to perform given the current observation
+
+    Exceptions
+    ----------
+    - ValueError : raised if name is not a known policy nor of the form 'module:function'
+    """
+    if name in ['random', 'sticky']:
+        space = controller.action_space
+        if controller.discrete and getattr(controller, 'int_actions', False):
+            random_action = lambda : int(rng.randint(controller.num_actions))
+        elif controller.discrete:
+            random_action = lambda : tuple(int(rng.randint(n_values)) for n_values in space.nvec)
+        else:
+            random_action = lambda : rng.uniform(space.low, space.high)
+        if name == 'random':
+            return lambda observation : random_action()
+        last_action = [random_action()]
+        def sticky_policy(observation):
+            if rng.uniform() >= STICKY_PROBABILITY:
+                last_action[0] = random_action()
+            return last_action[0]
+        return sticky_policy
+    elif ':' in name:
+        module, function = name.split(':')
+        return getattr(importlib.import_module(module), function)(controller, rng)
+    raise ValueError('unknown policy ' + name + ', policies are random, sticky or module:function')
+
+
+def _probe(config):
+    """
+    Returns the shape and dtype of observations and the shape of actions of envs built with a configuration
+    (run in a worker process, see make_env)
+    """
+    env = make_env(config)
+    observation = env.reset()
+    if isinstance(observation, dict):
+        raise ValueError('datasets cannot be generated with dictionnary observations (cameras, several observation_channels)')
+    action = make_policy('random', env.controller, np.random.RandomState(0))(observation)
+    return np.shape(observation), np.asarray(observation).dtype.str, np.shape(np.atleast_1d(action))
+
+
+def _open_arrays(out, mode):
+    """
+    Returns the memory-mapped arrays of a dataset by name (see module description)
+    """
+    with open(os.path.join(out, 'manifest.json')) as f:
+        manifest = json.load(f, object_pairs_hook=OrderedDict)
+    return OrderedDict((name, np.load(os.path.join(out, name + '.npy'), mmap_mode=mode)) for name in manifest['fields'])
+
+
+def _create_dataset(out, config, observation_shape, observation_dtype, action_shape):
+    """
+    Preallocates the arrays of a dataset and writes its manifest
+    """
+    episodes, length = config['episodes'], config['episode_length']
+    fields = OrderedDict([('observations', ([episodes, length+1]+list(observation_shape), np.dtype(observation_dtype)))])
+    for name, (shape, dtype) in FIELDS.items():
+        steps = length+1 if name in ['positions', 'rotations'] else length
+        fields[name] = ([episodes, steps]+list(action_shape if shape is None else shape), np.dtype(dtype))
+    fields['lengths'] = ([episodes], np.dtype(np.int32))
+    fields['completed'] = ([episodes], np.dtype(np.bool_))
+    if not os.path.isdir(out):
+        os.makedirs(out)
+    for name, (shape, dtype) in fields.items():
+        # files are sparse until rows are written
+        array = np.lib.format.open_memmap(os.path.join(out, name + '.npy'), mode='w+', dtype=dtype, shape=tuple(shape))
+        array.flush()
+        del array
+    manifest = OrderedDict([('config', config),
+                            ('fields', OrderedDict((name, {'shape' : shape, 'dtype' : dtype.str}) for name, (shape, dtype) in fields.items())),
+                            ('completed', 0),
+                            ('frames', 0),
+                            ('frames_per_sec', None),
+                            ])
+    write_manifest(out, manifest)
+    return manifest
+
+
+def load_manifest(out):
+    """
+    Returns the manifest of a dataset (see module description)
+    """
+    with open(os.path.join(out, 'manifest.json')) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def write_manifest(out, manifest):
+    """
+    Writes the manifest of a dataset, atomically so that an interruption never leaves a partial manifest
+    """
+    path = os.path.join(out, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    getattr(os, 'replace', os.rename)(path + '.tmp', path)
+
+
+def _init_worker(config, out):
+    """
+    Builds the env of a worker process and opens the arrays of the dataset
+    """
+    _worker['config'] = config
+    _worker['env'] = make_env(config)
+    _worker['arrays'] = _open_arrays(out, 'r+')
+
+
+def play_episode(env, config, arrays, episode):
+    """
+    Plays an episode and writes its rows in the arrays of a dataset, then marks it completed
+
+    Parameters
+    ----------
+    - env : (RoundBotEnv) env built with config (see make_env)
+    - config : (OrderedDict) configuration of the dataset
+    - arrays : (OrderedDict) memory-mapped arrays of the dataset, opened in r+ mode
+    - episode : (int) index of the episode
+
+    Returns
+    -------
+    - (int) number of frames of the episode (steps and reset)
+    """
+    seed = config['seed'] + episode
+    random.seed(seed)
+    np.random.seed(seed)
+    env.seed(seed)
+    rng = np.random.RandomState(seed)
+    observations, actions, rewards, dones = arrays['observations'], arrays['actions'], arrays['rewards'], arrays['dones']
+    positions, rotations = arrays['positions'], arrays['rotations']
+
+    observation = env.reset()
+    observations[episode, 0] = observation
+    positions[episode, 0], rotations[episode, 0] = env.ground_truth
+    policy = make_policy(config['policy'], env.controller, rng)
+    steps = 0
+    while steps < config['episode_length']:
+        action = policy(observation)
+        observation, reward, done, info = env.step(action)
+        actions[episode, steps] = np.atleast_1d(action)
+        rewards[episode, steps] = reward
+        dones[episode, steps] = done
+        steps += 1
+        observations[episode, steps] = observation
+        positions[episode, steps], rotations[episode, steps] = env.ground_truth
+        if done:
+            break
+    arrays['lengths'][episode] = steps
+    for name, array in arrays.items():
+        if name != 'completed':
+            array.flush()
+    # rows are on disk before the episode is marked completed
+    arrays['completed'][episode] = True
+    arrays['completed'].flush()
+    return steps + 1
+
+
+def _play_episode(episode):
+    return episode, play_episode(_worker['env'], _worker['config'], _worker['arrays'], episode)
+
+
+def generate(config, out, workers=1, overwrite=False, verbose=True):
+    """
+    Generates a dataset, or resumes its generation if out already holds a dataset of the same configuration
+
+    Parameters
+    ----------
+    - config : (OrderedDict) configuration of the dataset (see make_config)
+    - out : (str) path of the dataset directory
+    - workers : (int) number of worker processes playing episodes
+    - overwrite : (Bool) whether to overwrite a dataset of another configuration in out
+    - verbose : (Bool) whether to print the progress and throughput of the generation
+
+    Returns
+    -------
+    - (OrderedDict) manifest of the dataset
+
+    Exceptions
+    ----------
+    - ValueError : raised if out holds a dataset of another configuration and overwrite is False
+    """
+    config = json.loads(json.dumps(config), object_pairs_hook=OrderedDict) # as saved in the manifest
+    if os.path.exists(os.path.join(out, 'manifest.json')):
+        manifest = load_manifest(out)
+        if manifest['config'] != config and not overwrite:
+            raise ValueError(out + ' holds a dataset of another configuration, use overwrite to replace it')
+    else:
+        manifest = None
+    if manifest is None or manifest['config'] != config:
+        # envs are only built in worker processes
+        pool = multiprocessing.Pool(processes=1)
+        try:
+            shapes = pool.apply(_probe, (config,))
+        finally:
+            pool.terminate()
+        manifest = _create_dataset(out, config, *shapes)
+
+    completed = np.load(os.path.join(out, 'completed.npy'), mmap_mode='r')
+    pending = [int(episode) for episode in np.flatnonzero(~completed)]
+    del completed
+    if verbose and len(pending) < config['episodes']:
+        print('resuming ' + out + ' : ' + str(config['episodes'] - len(pending)) + ' episodes already completed')
+
+    frames = 0
+    start = last_report = clock()
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=(config, out))
+    try:
+        for i, (episode, episode_frames) in enumerate(pool.imap_unordered(_play_episode, pending)):
+            frames += episode_frames
+            now = clock()
+            if verbose and (now - last_report >= 5.0 or i+1 == len(pending)):
+                last_report = now
+                print('episodes %d/%d  frames %d  %.1f frames/s' % (config['episodes'] - len(pending) + i+1, config['episodes'],
+                                                                    frames, frames/(now - start)))
+    finally:
+        pool.terminate()
+        pool.join()
+        # the manifest is updated with completed episodes, even after an interruption
+        duration = clock() - start
+        arrays = _open_arrays(out, 'r')
+        manifest['completed'] = int(np.sum(arrays['completed']))
+        manifest['frames'] = int(np.sum(arrays['lengths'][arrays['completed']]) + manifest['completed'])
+        manifest['frames_per_sec'] = frames/duration if frames else manifest['frames_per_sec']
+        del arrays
+        write_manifest(out, manifest)
+    return manifest
+
+
+def main(argv=None):
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(prog='python -m gym_round_bot.generate',
+                                     description='Generates datasets of RoundBotEnv episodes in memory-mapped arrays with a pool of processes')
+    parser.add_argument('--out', required=True, help='dataset directory, where an interrupted generation is resumed')
+    parser.add_argument('--config', default=None, help='path of a JSON file of configuration values (see DEFAULT_CONFIG)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+    parser.add_argument('--episodes', type=int, default=None, help='number of episodes')
+    parser.add_argument('--episode-length', type=int, default=None, help='maximum number of steps of episodes')
+    parser.add_argument('--world', default=None, help='name of the world')
+    parser.add_argument('--world-size', type=int, default=None, help='size of the world')
+    parser.add_argument('--texture', default=None, help='texture of the world')
+    parser.add_argument('--controller', default=None, help='name of the controller')
+    parser.add_argument('--obssize', type=int, default=None, help='width and height of observations')
+    parser.add_argument('--policy', default=None, help='random, sticky or module:function')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the first episode')
+    parser.add_argument('--overwrite', action='store_true', help='replace a dataset of another configuration')
+    args = parser.parse_args(argv)
+
+    config = make_config(args.config, world=args.world, world_size=args.world_size, texture=args.texture,
+                         controller=args.controller, obssize=args.obssize, policy=args.policy, episodes=args.episodes,
+                         episode_length=args.episode_length, seed=args.seed)
+    manifest = generate(config, args.out, workers=args.workers, overwrite=args.overwrite)
+    return 0 if manifest['completed'] == config['episodes'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())